@@ -1,12 +1,20 @@
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from typing import Optional
+import hashlib
+import time
 
 SECRET_KEY = "your_secret"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Every authenticated request decodes the same bearer token; keep verified
+# payloads briefly, never past the token's own exp
+DECODED_TOKEN_TTL_SECONDS = 60
+DECODED_TOKEN_CACHE_SIZE = 10_000
+_decoded_tokens: dict = {}  # blake2b(token) -> (expires_at epoch seconds, payload)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -19,7 +27,22 @@ def create_refresh_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_access_token(token: str):
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    now = time.time()
+    cached = _decoded_tokens.get(key)
+    if cached and now < cached[0]:
+        return dict(cached[1])
+
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+    expires_at = now + DECODED_TOKEN_TTL_SECONDS
+    if isinstance(payload.get("exp"), (int, float)):
+        expires_at = min(expires_at, payload["exp"])
+    if len(_decoded_tokens) >= DECODED_TOKEN_CACHE_SIZE:
+        # Drop the oldest entry (dicts keep insertion order)
+        _decoded_tokens.pop(next(iter(_decoded_tokens)), None)
+    _decoded_tokens[key] = (expires_at, payload)
+    return dict(payload)
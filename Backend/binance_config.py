@@ -1,22 +1,11 @@
-from dotenv import load_dotenv
 import os
 import traceback
 
-# Load environment variables from .env file
-load_dotenv()
-
-from dotenv import load_dotenv
-import os
-import traceback
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Get Binance API credentials
-BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
-BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
-# Support an env flag to force offline/no-network mode (useful on Render or CI)
-BINANCE_OFFLINE = os.getenv("BINANCE_OFFLINE", "0") in ("1", "true", "True")
+# Connection pool for the Binance REST session. Calls run from worker threads
+# (asyncio.to_thread), so the pool must hold at least as many sockets as
+# concurrent calls or urllib3 drops the extras after each request.
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 50
 
 
 class _LazyBinanceClient:
@@ -30,29 +19,57 @@ class _LazyBinanceClient:
 	def __init__(self):
 		self._client = None
 		self._init_exc = None
+		self._initialized = False
 		self._logged_init_failure = False
 
 	def _init(self):
 		# attempt to construct the real client once
-		if self._client is not None or self._init_exc is not None:
+		if self._initialized:
 			return
-		if BINANCE_OFFLINE:
+		self._initialized = True
+
+		# Load .env and read credentials only when the client is first needed
+		try:
+			from dotenv import load_dotenv
+			load_dotenv()
+		except Exception:
+			pass
+		# Support an env flag to force offline/no-network mode (useful on Render or CI)
+		if os.getenv("BINANCE_OFFLINE", "0") in ("1", "true", "True"):
 			# explicit offline mode - do not attempt network calls
 			self._client = None
 			return
 		try:
 			from binance.client import Client as _Client
 			# Create client lazily; note the Client constructor may call ping()
-			self._client = _Client(api_key=BINANCE_API_KEY, api_secret=BINANCE_SECRET_KEY, testnet=True)
+			self._client = _Client(
+				api_key=os.getenv("BINANCE_API_KEY"),
+				api_secret=os.getenv("BINANCE_SECRET_KEY"),
+				testnet=True,
+			)
 			try:
 				self._client.API_URL = "https://testnet.binance.vision/api"
 			except Exception:
 				pass
+			self._tune_session()
 		except Exception as e:
 			# remember the exception and print traceback once
 			self._init_exc = e
 			traceback.print_exc()
 
+	def _tune_session(self):
+		# Keep TLS connections to Binance alive and pooled across calls
+		session = getattr(self._client, "session", None)
+		if session is None:
+			return
+		try:
+			from requests.adapters import HTTPAdapter
+			adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+			session.mount("https://", adapter)
+			session.headers["Connection"] = "keep-alive"
+		except Exception:
+			traceback.print_exc()
+
 	def __getattr__(self, item):
 		# Ensure the underlying client is initialized
 		self._init()
@@ -1,6 +1,5 @@
 import os
 import re
-import importlib.util
 from urllib.parse import urlparse, urlunparse
 from celery import Celery
 import ssl
@@ -10,24 +9,30 @@ from datetime import timedelta
 # if python-dotenv is available. This ensures running `celery -A celery_app` from
 # the project root picks up the same REDIS_URL set in Backend/.env without
 # requiring manual export in the shell.
-try:
-    from dotenv import load_dotenv
-    # Prefer Backend/.env (same folder) but fall back to repo root .env
-    backend_env = os.path.join(os.path.dirname(__file__), '.env')
-    repo_env = os.path.join(os.path.dirname(__file__), '..', '.env')
-    loaded = False
-    for dotenv_path in (backend_env, repo_env):
-        if os.path.exists(dotenv_path):
-            load_dotenv(dotenv_path)
-            print(f"[celery_app] loaded environment from {dotenv_path}")
-            loaded = True
-            break
-    if not loaded:
-        # nothing found; continue silently
+# Prefer Backend/.env (same folder) but fall back to repo root .env
+_HERE = os.path.dirname(__file__)
+_DOTENV_CANDIDATES = (
+    os.path.join(_HERE, '.env'),
+    os.path.join(_HERE, '..', '.env'),
+)
+
+# Forked workers and re-imports inherit the environment, so only parse .env once
+if not os.environ.get("_CC_DOTENV_LOADED"):
+    try:
+        from dotenv import load_dotenv
+        for dotenv_path in _DOTENV_CANDIDATES:
+            if os.path.exists(dotenv_path):
+                load_dotenv(dotenv_path)
+                os.environ["_CC_DOTENV_LOADED"] = "1"
+                print(f"[celery_app] loaded environment from {dotenv_path}")
+                break
+    except Exception:
+        # If dotenv isn't installed, skip silently; users must export env vars manually
         pass
-except Exception:
-    # If dotenv isn't installed, skip silently; users must export env vars manually
-    pass
+
+
+# Matches the `-u <uri>` argument of a pasted redis-cli invocation
+_UTAG_RE = re.compile(r"-u\s+([^\s]+)")
 
 
 def _normalize_redis_env(value: str) -> str:
@@ -44,7 +49,7 @@ def _normalize_redis_env(value: str) -> str:
     s = value.strip()
 
     # If someone pasted a redis-cli invocation, extract the -u argument
-    m = re.search(r"-u\s+([^\s]+)", s)
+    m = _UTAG_RE.search(s)
     if m:
         s = m.group(1)
 
@@ -67,6 +72,14 @@ def _normalize_redis_env(value: str) -> str:
 
 REDIS_URL = _normalize_redis_env(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
 
+# Parse the broker URL once; the SSL, result-backend and masking blocks below reuse it
+try:
+    _P = urlparse(REDIS_URL)
+    _HOST = (_P.hostname or "").lower()
+except Exception:
+    _P = None
+    _HOST = ""
+
 # Determine whether we should set SSL options for the broker based on the URL
 _ssl_opts = None
 try:
@@ -74,11 +87,9 @@ try:
     _verify = _verify_env not in ("0", "false", "no")
     ca_path = os.getenv("REDIS_CA_CERTS")
 
-    _p_temp = urlparse(REDIS_URL)
-    _hostname_temp = (_p_temp.hostname or "").lower()
     # If scheme is explicitly rediss or host looks like Upstash, prepare ssl options
     # Per request, use CERT_NONE to disable certificate verification.
-    if _p_temp.scheme == "rediss" or _hostname_temp.endswith("upstash.io"):
+    if _P.scheme == "rediss" or _HOST.endswith("upstash.io"):
         _ssl_opts = {"ssl_cert_reqs": ssl.CERT_NONE}
         if ca_path:
             _ssl_opts["ssl_ca_certs"] = ca_path
@@ -86,19 +97,16 @@ except Exception:
     _ssl_opts = None
 
 # Determine which module import style will work in this process:
-# - If the parent package `Backend` is importable, use the fully-qualified names.
+# - If this module was imported through the parent package `Backend`, use the
+#   fully-qualified names.
 # - Otherwise, use top-level module names so Celery can be started from the `Backend/` folder.
-includes = []
-if importlib.util.find_spec("Backend") is not None:
-    includes = [
-        "Backend.trade_tasks",
-        "Backend.fetch_binance.background_jobs",
-    ]
-else:
-    includes = [
-        "trade_tasks",
-        "fetch_binance.background_jobs",
-    ]
+# Checking our own module name avoids a sys.path scan (find_spec) on every start.
+_has_backend_pkg = __name__.startswith("Backend.")
+includes = (
+    ["Backend.trade_tasks", "Backend.fetch_binance.background_jobs"]
+    if _has_backend_pkg
+    else ["trade_tasks", "fetch_binance.background_jobs"]
+)
 
 # Create Celery app instance with a context-aware include list so the worker
 # registers tasks whether started from repo root or the Backend/ folder.
@@ -119,6 +127,14 @@ app.conf.update(
     result_serializer="json",
     timezone="UTC",
     result_expires=3600,
+    # Keep broker/backend connections pooled and alive so publishing a task
+    # reuses an open (TLS) connection instead of dialing Redis every time.
+    broker_pool_limit=10,
+    broker_connection_retry_on_startup=True,
+    broker_heartbeat=30,
+    redis_max_connections=20,
+    result_backend_transport_options={"health_check_interval": 30, "socket_keepalive": True},
+    broker_transport_options={"health_check_interval": 30, "socket_keepalive": True, "visibility_timeout": 3600},
 )
 
 # Apply prepared SSL options to Celery if applicable. This must be set before
@@ -140,8 +156,7 @@ if _ssl_opts:
 # present the backend as a `redis://` URL (no scheme-level validation) while
 # keeping `broker` as the original `REDIS_URL` and providing `result_backend_use_ssl`.
 try:
-    _p_result = urlparse(REDIS_URL)
-    if _p_result.scheme == "rediss":
+    if _P.scheme == "rediss":
         # Some Celery redis backend implementations validate that a rediss://
         # URL includes an `ssl_cert_reqs` parameter. Append the required
         # query params so the backend accepts the URL and still uses TLS.
@@ -152,8 +167,8 @@ try:
         query = "&".join(query_parts)
         REDIS_RESULT_BACKEND = urlunparse((
             "rediss",
-            _p_result.netloc,
-            _p_result.path or "",
+            _P.netloc,
+            _P.path or "",
             "",
             query,
             "",
@@ -178,18 +193,17 @@ app.conf.beat_schedule = {
 # Print a masked broker URL on import to help debug connection issues.
 # We avoid printing secrets: password is replaced with '***'.
 try:
-    _p = urlparse(REDIS_URL)
-    if _p.username or _p.password:
+    if _P.username or _P.password:
         netloc = ""
-        if _p.username:
-            netloc += _p.username
-            if _p.password:
+        if _P.username:
+            netloc += _P.username
+            if _P.password:
                 netloc += ":***"
             netloc += "@"
-        host = _p.hostname or ""
-        port = f":{_p.port}" if _p.port else ""
+        host = _P.hostname or ""
+        port = f":{_P.port}" if _P.port else ""
         netloc += f"{host}{port}"
-        masked = urlunparse((_p.scheme, netloc, "", "", "", ""))
+        masked = urlunparse((_P.scheme, netloc, "", "", "", ""))
     else:
         masked = REDIS_URL
     # Only print a short debug message; this helps verify worker uses the right broker
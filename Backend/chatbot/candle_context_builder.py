@@ -1,19 +1,39 @@
 
+from datetime import datetime
+from decimal import Decimal
+from bson.decimal128 import Decimal128
+from pydantic import BaseModel, field_validator
 from models import Candle
 
+
+class CandleLite(BaseModel):
+    """Projection of the Candle fields used in the chatbot context."""
+    symbol: str
+    candle_time: datetime
+    open: Decimal
+    high: Decimal
+    low: Decimal
+    close: Decimal
+    volume: Decimal
+
+    @field_validator("open", "high", "low", "close", "volume", mode="before")
+    @classmethod
+    def convert_decimal128(cls, value):
+        if isinstance(value, Decimal128):
+            return value.to_decimal()
+        return value
+
+
 async def get_candlestick_context(symbol, start_date, end_date):
     query = {"symbol": symbol}
     query["candle_time"] = {"$gte": start_date, "$lte": end_date}
 
-    candles = await Candle.find(query).sort("candle_time").to_list()
+    candles = await Candle.find(query, projection_model=CandleLite).sort("candle_time").to_list()
 
     if not candles:
         return None
 
-    lines = []
-    for c in candles:
-        lines.append(
-            f"Symbol: {c.symbol}, Date: {c.candle_time.strftime('%Y-%m-%d')} - Open: {c.open}, High: {c.high}, Low: {c.low}, Close: {c.close}, Volume: {c.volume}"
-        )
-
-    return "\n".join(lines)
+    return "\n".join(
+        f"Symbol: {c.symbol}, Date: {c.candle_time.strftime('%Y-%m-%d')} - Open: {c.open}, High: {c.high}, Low: {c.low}, Close: {c.close}, Volume: {c.volume}"
+        for c in candles
+    )
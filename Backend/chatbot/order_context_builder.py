@@ -1,19 +1,39 @@
+import re
+from decimal import Decimal
+from typing import Optional
+from bson.decimal128 import Decimal128
+from pydantic import BaseModel, field_validator
 from models import Order
 from datetime import datetime
 
+_ORDER_HIST_KEYWORDS = ["order history", "my orders", "past orders", "show my orders"]
+_ORDER_HIST_RE = re.compile("|".join(re.escape(k) for k in _ORDER_HIST_KEYWORDS))
+
+
+class OrderListingView(BaseModel):
+    """Projection of the Order fields shown in the order history context."""
+    symbol: str
+    quantity: Decimal
+    price: Optional[Decimal] = None
+
+    @field_validator("quantity", "price", mode="before")
+    @classmethod
+    def convert_decimal128(cls, value):
+        if isinstance(value, Decimal128):
+            return value.to_decimal()
+        return value
+
+
 async def get_order_history_context(current_user):
-    orders = await Order.find(Order.user.id == current_user.id).sort("-created_at").limit(10).to_list()
+    orders = await Order.find(
+        Order.user.id == current_user.id, projection_model=OrderListingView
+    ).sort("-created_at").limit(10).to_list()
 
     if not orders:
         return None
 
-    lines = []
-    for o in orders:
-        lines.append(f"{o.symbol} | {o.quantity} @ {o.price}")
-    return (lines)
+    return "\n".join(f"{o.symbol} | {o.quantity} @ {o.price}" for o in orders)
 
 def is_order_history_request(question: str) -> bool:
-    question_lower = question.lower()
-    keywords = ["order history", "my orders", "past orders", "show my orders"]
-    return any(k in question_lower for k in keywords)
+    return bool(_ORDER_HIST_RE.search(question.lower()))
 
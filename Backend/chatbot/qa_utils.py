@@ -1,21 +1,29 @@
 import torch
-from transformers import BertTokenizer, BertForQuestionAnswering
+from transformers import BertTokenizerFast, BertForQuestionAnswering
+
+# ✅ Use CPU by default (you can also set to 'cuda' if you have GPU)
+_use_cuda = torch.cuda.is_available()
+device = torch.device('cuda' if _use_cuda else 'cpu')
 
 # ✅ Load from local or huggingface
+# Half precision on GPU; CPU keeps fp32 since most CPUs lack fast fp16/bf16 matmuls
 model_path = "./chatbot/bert_squad_model"
-tokenizer = BertTokenizer.from_pretrained(model_path)
-model = BertForQuestionAnswering.from_pretrained(model_path)
-
-# ✅ Use CPU by default (you can also set to 'cuda' if you have GPU)
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+tokenizer = BertTokenizerFast.from_pretrained(model_path)
+model = BertForQuestionAnswering.from_pretrained(
+    model_path, torch_dtype=torch.float16 if _use_cuda else torch.float32
+)
 model = model.to(device)
 model.eval()
 
+# ✅ Dynamic int8 quantization of the Linear layers for the CPU path
+if not _use_cuda:
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
 def question_answer(question, context):
     inputs = tokenizer.encode_plus(question, context, return_tensors="pt", truncation=True, max_length=512)
     inputs = {k: v.to(device) for k, v in inputs.items()}
 
-    with torch.no_grad():
+    with torch.inference_mode():
         outputs = model(**inputs)
         start_scores = outputs.start_logits
         end_scores = outputs.end_logits
@@ -24,9 +32,8 @@ def question_answer(question, context):
     start_idx = torch.argmax(start_scores, dim=1).item()
     end_idx = torch.argmax(end_scores, dim=1).item()
 
-    # Decode answer
-    all_tokens = tokenizer.convert_ids_to_tokens(inputs["input_ids"][0])
-    answer_tokens = all_tokens[start_idx : end_idx + 1]
-    answer = tokenizer.convert_tokens_to_string(answer_tokens)
+    # Decode only the answer span instead of materializing every token string
+    answer_ids = inputs["input_ids"][0][start_idx : end_idx + 1]
+    answer = tokenizer.decode(answer_ids, skip_special_tokens=True, clean_up_tokenization_spaces=True)
 
     return answer
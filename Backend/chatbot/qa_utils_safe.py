@@ -1,4 +1,5 @@
 import os
+import threading
 import traceback
 from typing import Optional
 
@@ -9,6 +10,12 @@ except Exception:
 
 from transformers import AutoTokenizer, AutoModelForQuestionAnswering
 
+# Optional ONNX Runtime backend (pip install optimum[onnxruntime])
+try:
+    from optimum.onnxruntime import ORTModelForQuestionAnswering
+except Exception:
+    ORTModelForQuestionAnswering = None
+
 
 # Configuration: local directory or HF name from env
 LOCAL_MODEL_DIR = os.environ.get("LOCAL_BERT_MODEL_DIR", "./chatbot/bert_squad_model")
@@ -19,9 +26,30 @@ tokenizer: Optional[object] = None
 model = None
 device = None
 _model_loaded = False
+# Serializes loading so a request arriving during the startup warmup waits for it
+_load_lock = threading.Lock()
+
+
+def _save_local_copy(tok, mdl):
+    """Persist a downloaded tokenizer/model to LOCAL_MODEL_DIR as safetensors so the
+    next cold start loads (memory-mapped) from disk instead of resolving the Hub."""
+    try:
+        tok.save_pretrained(LOCAL_MODEL_DIR)
+        mdl.save_pretrained(LOCAL_MODEL_DIR, safe_serialization=True)
+        print(f"qa_utils_safe: cached model to '{LOCAL_MODEL_DIR}'")
+    except Exception as e:
+        # A read-only filesystem only costs us the next cold start; keep serving
+        print(f"qa_utils_safe: could not cache model to '{LOCAL_MODEL_DIR}': {e}")
 
 
 def _load_model():
+    if _model_loaded:
+        return
+    with _load_lock:
+        _load_model_locked()
+
+
+def _load_model_locked():
     global tokenizer, model, device, _model_loaded
 
     if _model_loaded:
@@ -38,7 +66,26 @@ def _load_model():
         try:
             print(f"qa_utils_safe: trying to load QA model from '{candidate}'")
             tokenizer = AutoTokenizer.from_pretrained(candidate)
-            model = AutoModelForQuestionAnswering.from_pretrained(candidate)
+
+            # Prefer an exported ONNX graph on CPU when onnxruntime is installed
+            if ORTModelForQuestionAnswering is not None and os.path.isfile(os.path.join(candidate, "model.onnx")):
+                try:
+                    model = ORTModelForQuestionAnswering.from_pretrained(candidate, provider="CPUExecutionProvider")
+                    device = torch.device('cpu') if torch is not None else None
+                    _model_loaded = True
+                    print(f"qa_utils_safe: loaded ONNX model from '{candidate}'")
+                    return
+                except Exception as e:
+                    print(f"qa_utils_safe: ONNX load failed for '{candidate}', falling back to PyTorch: {e}")
+
+            # Prefer safetensors (mmap-friendly) when the directory ships them
+            load_kwargs = {}
+            if os.path.isfile(os.path.join(candidate, "model.safetensors")):
+                load_kwargs["use_safetensors"] = True
+            model = AutoModelForQuestionAnswering.from_pretrained(candidate, **load_kwargs)
+
+            if candidate != LOCAL_MODEL_DIR:
+                _save_local_copy(tokenizer, model)
 
             if torch is not None:
                 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -47,6 +94,11 @@ def _load_model():
                 device = None
 
             model.eval()
+
+            # Dynamic int8 quantization of the Linear layers for the CPU path
+            if torch is not None and device.type == 'cpu':
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
             _model_loaded = True
             print(f"qa_utils_safe: loaded model from '{candidate}'")
             return
@@ -86,8 +138,8 @@ def question_answer(question: str, context: str) -> str:
     start_idx = int(_torch.argmax(start_scores, dim=1).item())
     end_idx = int(_torch.argmax(end_scores, dim=1).item())
 
-    all_tokens = tokenizer.convert_ids_to_tokens(inputs["input_ids"][0])
-    answer_tokens = all_tokens[start_idx : end_idx + 1]
-    answer = tokenizer.convert_tokens_to_string(answer_tokens)
+    # Decode only the answer span instead of materializing every token string
+    answer_ids = inputs["input_ids"][0][start_idx : end_idx + 1]
+    answer = tokenizer.decode(answer_ids, skip_special_tokens=True, clean_up_tokenization_spaces=True)
 
     return answer
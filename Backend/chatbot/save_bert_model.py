@@ -20,6 +20,16 @@ def main():
 	print(f"Saving tokenizer and model to: {out_dir}")
 	tokenizer.save_pretrained(out_dir)
 	model.save_pretrained(out_dir)
+
+	# Also export an ONNX graph for CPU inference when optimum is installed
+	try:
+		from optimum.onnxruntime import ORTModelForQuestionAnswering
+	except ImportError:
+		print("optimum[onnxruntime] not installed; skipping ONNX export")
+	else:
+		print(f"Exporting ONNX model to: {out_dir}")
+		ort_model = ORTModelForQuestionAnswering.from_pretrained(model_name, export=True)
+		ort_model.save_pretrained(out_dir)
 	print("Save complete")
 
 
@@ -1,8 +1,15 @@
+import calendar
 import re
-from datetime import datetime
+from datetime import date, datetime
 
 DEFAULT_YEAR = 2025
 
+_SYM_RE = re.compile(r"\b([A-Z]{3,10}USDT)\b")
+_ISO_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_DATE_RE = re.compile(r"on (?P<month>[A-Za-z]+) (?P<day>\d{1,2})(?: (?P<year>\d{4}))?", re.IGNORECASE)
+# Month names -> number; a dict lookup is much cheaper than strptime("%B")
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+
 def extract_symbol_and_date(question):
     """
     Extracts symbol (like BTCUSDT) and date from a question.
@@ -16,11 +23,11 @@ def extract_symbol_and_date(question):
     question_clean = question.strip()
 
 
-    symbol_match = re.search(r"\b([A-Z]{3,10}USDT)\b", question_upper)
+    symbol_match = _SYM_RE.search(question_upper)
     symbol = symbol_match.group(1) if symbol_match else None
 
    
-    iso_date_match = re.search(r"\b(\d{4}-\d{2}-\d{2})\b", question_clean)
+    iso_date_match = _ISO_RE.search(question_clean)
     if iso_date_match:
         try:
             date_obj = datetime.fromisoformat(iso_date_match.group(1))
@@ -29,17 +36,15 @@ def extract_symbol_and_date(question):
             pass
 
     
-    date_match = re.search(r"on ([A-Za-z]+ \d{1,2}(?: \d{4})?)", question_clean, flags=re.IGNORECASE)
+    date_match = _DATE_RE.search(question_clean)
     if date_match:
-        date_str = date_match.group(1)
-        try:
-            if re.search(r"\d{4}", date_str):
-                date_obj = datetime.strptime(date_str, "%B %d %Y")
-            else:
-                date_obj = datetime.strptime(f"{date_str} {DEFAULT_YEAR}", "%B %d %Y")
-            return symbol, date_obj.date()
-        except ValueError:
-            pass
+        month, day, year = date_match.group("month", "day", "year")
+        month_number = _MONTHS.get(month.lower())
+        if month_number:
+            try:
+                return symbol, date(int(year) if year else DEFAULT_YEAR, month_number, int(day))
+            except ValueError:
+                pass
 
     
     return symbol, None
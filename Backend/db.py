@@ -10,51 +10,62 @@ from auth import decode_access_token
 from models import User, CryptoPair, Candle, Order, Transaction, Portfolio, Cart, CreditsHistory, Cache, Transfer, CandleSyncTracker
 from services.real_time_price import binance_stream  # ✅ import here
 from beanie import PydanticObjectId
-from scheduler import cron_historical_job, cron_settle_limit_orders
+from scheduler import cron_historical_job, cron_settle_limit_orders, cron_refresh_pair_metadata, cron_refresh_pair_prices, cron_binance_keepalive
 import json
 from services.session_store import get_session
+from fetch_binance.fetch_ohlc import dedupe_candle_sync_trackers
 # from chatbot.symbol_extractor import load_symbols_from_db
-from fetch_binance.fetch_cryptoPair import fetch_and_store_binance_symbols
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 load_dotenv()
 mongo_uri = os.getenv("MONGO_URI")
 DATABASE_NAME = "final_project_nse"
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    client = AsyncIOMotorClient(mongo_uri)
-    db = client[DATABASE_NAME]
+DOCUMENT_MODELS = [
+    User, CryptoPair, Candle, Order, Transaction, Portfolio,
+    Cart, CreditsHistory, Cache, Transfer, CandleSyncTracker
+]
 
-    await init_beanie(
-        database=db,
-        document_models=[User, CryptoPair, Candle, Order, Transaction, Portfolio, Cart, CreditsHistory, Cache, Transfer, CandleSyncTracker]
-    )
-    # Populate crypto pair list on startup (idempotent: updates existing, inserts missing)
-    # Do not block startup: run fetch in background. If there are no pairs at all,
-    # run a foreground quick fetch to populate initial data, otherwise run background update.
+
+async def _warm_qa_model():
+    # Load the QA model off the event loop so the first chatbot request doesn't pay for it
     try:
-        existing = await CryptoPair.find_all().limit(1).to_list()
-        if not existing:
-            # No pairs found — run initial fetch but do it with a short timeout in background
-            # to avoid blocking startup for too long. We still schedule it as a background task.
-            asyncio.create_task(fetch_and_store_binance_symbols())
-        else:
-            # Pairs exist; refresh in background without blocking startup
-            asyncio.create_task(fetch_and_store_binance_symbols())
+        from chatbot.qa_utils_safe import _load_model
+        await asyncio.to_thread(_load_model)
     except Exception:
-        # Log but don't fail startup if Binance or DB is unreachable
         import traceback
         traceback.print_exc()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client = AsyncIOMotorClient(mongo_uri)
+    db = client[DATABASE_NAME]
+
+    # Must run before init_beanie builds the unique tracker index
+    await dedupe_candle_sync_trackers(db)
+    await init_beanie(database=db, document_models=DOCUMENT_MODELS)
+    # Populate/refresh the crypto pair list in the background (idempotent upserts):
+    # full metadata hourly starting now, prices alone every minute
+    pair_metadata_task = asyncio.create_task(cron_refresh_pair_metadata())
+    pair_price_task = asyncio.create_task(cron_refresh_pair_prices())
     binance_task = asyncio.create_task(binance_stream())
     candle_cron_task = asyncio.create_task(cron_historical_job())
     settle_cron_task = asyncio.create_task(cron_settle_limit_orders())
+    keepalive_task = asyncio.create_task(cron_binance_keepalive())
+    # Set QA_EAGER_LOAD=0 to keep loading the QA model lazily on first use
+    qa_warmup_task = None
+    if os.getenv("QA_EAGER_LOAD", "1") == "1":
+        qa_warmup_task = asyncio.create_task(_warm_qa_model())
 
     yield
 
     binance_task.cancel()
     candle_cron_task.cancel()
     settle_cron_task.cancel() 
+    pair_metadata_task.cancel()
+    pair_price_task.cancel()
+    keepalive_task.cancel()
     client.close()
 
 
@@ -67,12 +78,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if not user_id:
         raise HTTPException(status_code=401, detail="Token missing subject")
 
-    # ✅ Check session store
-    session = await get_session(user_id)
+    # ✅ Check session store. Both lookups only need the id, so load the user
+    # alongside it; FastAPI caches this dependency, so it runs once per request
+    session, user = await asyncio.gather(
+        get_session(user_id),
+        User.get(PydanticObjectId(user_id)),
+    )
     if not session:
         raise HTTPException(status_code=401, detail="Session expired or invalidated")
 
-    user = await User.get(PydanticObjectId(user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -81,18 +95,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 from typing import Optional, Any
 
 client: Any = None
+_worker_db_ready = False
 
 async def init_db_for_worker():
-    global client
+    # Initialize once per worker process; re-running init_beanie would re-issue
+    # createIndexes for every model on each task
+    global client, _worker_db_ready
+    if _worker_db_ready:
+        return
     if not client:
         client = AsyncIOMotorClient(mongo_uri)
 
     db = client[DATABASE_NAME]
 
-    await init_beanie(
-        database=db,
-        document_models=[
-            User, CryptoPair, Candle, Order, Transaction, Portfolio,
-            Cart, CreditsHistory, Cache, Transfer, CandleSyncTracker
-        ]
-    )
\ No newline at end of file
+    await dedupe_candle_sync_trackers(db)
+    await init_beanie(database=db, document_models=DOCUMENT_MODELS)
+    _worker_db_ready = True
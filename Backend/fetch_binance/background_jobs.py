@@ -1,16 +1,66 @@
-from models import Order, User, Transaction, CreditsHistory, TransactionTypeEnum
+from models import Order, OrderLite, User, Transaction, CreditsHistory, TransactionTypeEnum
 from services.portfolio import update_or_create_portfolio, update_portfolio_on_sell
 from binance_config import client
 from fastapi import Request
 from datetime import datetime, timezone
 from decimal import Decimal
+from functools import lru_cache
 import asyncio
 from bson import Decimal128
+from beanie.operators import In
+
+# One event loop per worker process, reused across periodic runs so Motor
+# connections opened by earlier runs stay bound to a live loop
+_LOOP = None
+
+def _get_loop():
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        _LOOP = asyncio.new_event_loop()
+    return _LOOP
+
+_D0 = Decimal("0")
+
+# Decimal128.to_decimal() decodes the BID bits in Python; prices and quantities
+# repeat across orders, so memoize on the raw 16 bytes (Decimal is immutable)
+@lru_cache(maxsize=4096)
+def _decimal_from_bid(bid: bytes) -> Decimal:
+    return Decimal128.from_bid(bid).to_decimal()
 
 def decimal128_to_decimal(value):
     if isinstance(value, Decimal128):
-        return value.to_decimal()
-    return Decimal(str(value))  
+        return _decimal_from_bid(value.bid)
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    return Decimal(str(value))
+
+# Largest page Binance's allOrders endpoint returns
+ALL_ORDERS_PAGE_SIZE = 1000
+
+def _fetch_binance_orders(symbol, order_ids):
+    """Page allOrders forward until every local order id is seen or Binance runs out.
+
+    One old order that never fills pins the lower bound, so a single page could end
+    before newer open orders; each page resumes after the last row (or jumps straight
+    to the next id still missing).
+    """
+    missing = set(order_ids)
+    wanted = set(order_ids)
+    found = []
+    next_id = min(missing)
+    while missing:
+        page = client.get_all_orders(symbol=symbol, orderId=next_id, limit=ALL_ORDERS_PAGE_SIZE)
+        for binance_order in page or []:
+            order_id = int(binance_order["orderId"])
+            if order_id in wanted:
+                found.append(binance_order)
+                missing.discard(order_id)
+        if not page or len(page) < ALL_ORDERS_PAGE_SIZE or not missing:
+            break
+        next_id = max(int(page[-1]["orderId"]) + 1, min(missing))
+    return found
 
 async def settle_filled_limit_orders():
     print("Running limit order settlement job...")
@@ -25,31 +75,65 @@ async def settle_filled_limit_orders():
         print("Error checking Binance client availability — skipping job")
         return
 
-    open_orders = await Order.find(Order.status == "NEW").to_list()
+    # Only pull the fields settlement needs; the user link is read as a bare id
+    open_orders = await Order.find(Order.status == "NEW", projection_model=OrderLite).to_list()
     print(f"Found {len(open_orders)} open orders")
+    if not open_orders:
+        return
+
+    # allOrders pages per symbol instead of one get_order per open order.
+    # Passing the smallest local orderId returns that order and every later one.
+    orders_by_symbol = {}
+    for order in open_orders:
+        if order.order_id:
+            orders_by_symbol.setdefault(order.symbol, []).append(int(order.order_id))
+
+    symbols = list(orders_by_symbol)
+    # The Binance client is blocking; run the per-symbol calls concurrently in threads
+    results = await asyncio.gather(*[
+        asyncio.to_thread(_fetch_binance_orders, symbol, orders_by_symbol[symbol])
+        for symbol in symbols
+    ], return_exceptions=True)
+
+    binance_orders = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            print(f"Error fetching Binance orders for {symbol}: {result}")
+            continue
+        for binance_order in result or []:
+            binance_orders[str(binance_order["orderId"])] = binance_order
+
+    # Load every affected user in one query and share one instance per id so
+    # multiple orders settle against a running balance
+    user_ids = list({order.user_id for order in open_orders})
+    users = {user.id: user for user in await User.find(In(User.id, user_ids)).to_list()}
+    credits_docs = []
+    now = datetime.now(timezone.utc)
 
     for order in open_orders:
         
         try:
-            await order.fetch_link(Order.user)
-            user = order.user
-            binance_order = client.get_order(
-                symbol=order.symbol,
-                orderId=order.order_id
-            )
+            binance_order = binance_orders.get(str(order.order_id))
+            if binance_order is None:
+                print(f"Order {order.id} not found on Binance — skipping")
+                continue
+
+            user = users.get(order.user_id)
+            if user is None:
+                print(f"User {order.user_id} for order {order.id} not found — skipping")
+                continue
 
             if binance_order["status"] == "FILLED":
                 print(f"Order {order.id} is FILLED on Binance")
 
-                now = datetime.now(timezone.utc)
-                
                 fills = binance_order.get("fills", [])
 
-                total_cost = Decimal("0")
-                total_qty = Decimal("0")
-                avg_price = Decimal("0")
+                total_cost = _D0
+                total_qty = _D0
+                avg_price = _D0
 
                 if fills:
+                    tx_docs = []
                     for fill in fills:
                         qty = Decimal(fill["qty"])
                         price = Decimal(fill["price"])
@@ -58,7 +142,7 @@ async def settle_filled_limit_orders():
                         total_cost += total
                         total_qty += qty
 
-                        await Transaction.insert(Transaction(
+                        tx_docs.append(Transaction(
                             user=user.id,
                             order=order.id,
                             symbol=order.symbol,
@@ -68,14 +152,15 @@ async def settle_filled_limit_orders():
                             total_amount=total,
                             created_at=now
                         ))
+                    await Transaction.insert_many(tx_docs)
 
                 # Convert Decimal128 to Decimal for calculations
                 if total_qty == 0:
                     total_qty = decimal128_to_decimal(order.quantity)
-                    avg_price = decimal128_to_decimal(order.price) if order.price else Decimal("0")
+                    avg_price = decimal128_to_decimal(order.price) if order.price else _D0
                     total_cost = total_qty * avg_price
                 else:
-                    avg_price = total_cost / total_qty if total_qty > 0 else Decimal("0")
+                    avg_price = total_cost / total_qty if total_qty > 0 else _D0
 
                 # Convert user credits to Decimal for comparison
                 user_credits = decimal128_to_decimal(user.credits)
@@ -92,7 +177,7 @@ async def settle_filled_limit_orders():
                     user.credits = new_credits
                     await user.save()
 
-                    await CreditsHistory.insert(CreditsHistory(
+                    credits_docs.append(CreditsHistory(
                         user=user,
                         change_amount=-total_cost,
                         reason="Trade",
@@ -108,7 +193,7 @@ async def settle_filled_limit_orders():
                     user.credits = new_credits
                     await user.save()
 
-                    await CreditsHistory.insert(CreditsHistory(
+                    credits_docs.append(CreditsHistory(
                         user=user,
                         change_amount=total_cost,
                         reason="trade",
@@ -116,9 +201,9 @@ async def settle_filled_limit_orders():
                         metadata={"symbol": order.symbol, "qty": str(total_qty), "price": str(avg_price)}
                     ))
 
-                order.status = "FILLED"
-                order.executed_at = now
-                await order.save()
+                await Order.find_one(Order.id == order.id).update(
+                    {"$set": {"status": "FILLED", "executed_at": now}}
+                )
 
         except Exception as e:
             print(f"Error processing order {order.id}: {e}")
@@ -126,20 +211,22 @@ async def settle_filled_limit_orders():
             import traceback
             traceback.print_exc()
 
+    if credits_docs:
+        await CreditsHistory.insert_many(credits_docs)
+
 
-            # Celery task wrapper for running this periodic job under Celery
-            try:
-                from celery_app import app
-
-                @app.task(name="fetch_binance.background_jobs.settle_filled_limit_orders_task", bind=True, max_retries=3, default_retry_delay=10)
-                def settle_filled_limit_orders_task(self):
-                    """Celery wrapper that runs the async settle_filled_limit_orders function."""
-                    try:
-                        import asyncio as _asyncio
-                        return _asyncio.run(settle_filled_limit_orders())
-                    except Exception as exc:
-                        # Let Celery handle retries
-                        raise self.retry(exc=exc)
-            except Exception:
-                # If celery_app isn't available (e.g., import-time during some tests), skip wrapper creation
-                pass
\ No newline at end of file
+# Celery task wrapper for running this periodic job under Celery
+try:
+    from celery_app import app
+
+    @app.task(name="fetch_binance.background_jobs.settle_filled_limit_orders_task", bind=True, max_retries=3, default_retry_delay=10)
+    def settle_filled_limit_orders_task(self):
+        """Celery wrapper that runs the async settle_filled_limit_orders function."""
+        try:
+            return _get_loop().run_until_complete(settle_filled_limit_orders())
+        except Exception as exc:
+            # Let Celery handle retries
+            raise self.retry(exc=exc)
+except Exception:
+    # If celery_app isn't available (e.g., import-time during some tests), skip wrapper creation
+    pass
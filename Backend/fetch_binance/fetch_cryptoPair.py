@@ -1,20 +1,72 @@
 from binance_config import client as binance_client
 from decimal import Decimal
 from datetime import datetime, timezone
+from functools import lru_cache
 from bson.decimal128 import Decimal128
 from models import CryptoPair
+from services.redis_client import redis_client
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
 import asyncio
+import json
 
+EXCHANGE_INFO_CACHE_KEY = "binance:exchange_info"
+EXCHANGE_INFO_TTL_SECONDS = 3600
+
+# Binance repeats the same LOT_SIZE/PRICE_FILTER strings ("0.00001000") across most pairs,
+# so those parses are memoized. Prices are nearly all distinct and stay out of the cache.
+_decimal128_from_str = lru_cache(maxsize=4096)(Decimal128)
 
 def to_decimal128(val):
     if val is None:
         return None
     if isinstance(val, Decimal128):
         return val
+    # Decimal128 parses decimal strings and Decimals directly
+    if isinstance(val, (str, Decimal)):
+        return Decimal128(val)
     return Decimal128(str(val))
 
 
 
+async def load_usdt_symbol_specs():
+    """Return the tradable USDT spot symbols with their LOT_SIZE/PRICE_FILTER filters.
+
+    Exchange info is large and rarely changes, so the trimmed spec list is cached in
+    Redis for an hour and `get_exchange_info` is only called on a miss.
+    """
+    try:
+        cached = await redis_client.get(EXCHANGE_INFO_CACHE_KEY)
+        if cached:
+            return json.loads(cached)
+    except Exception:
+        pass
+
+    exchange_info = await asyncio.to_thread(binance_client.get_exchange_info)
+
+    usdt_symbols = [
+        s for s in exchange_info.get("symbols", ())
+        if s["status"] == "TRADING" and s.get("isSpotTradingAllowed") and s["quoteAsset"] == "USDT"
+    ]
+
+    specs = []
+    for s in usdt_symbols:
+        filters = {f["filterType"]: f for f in s.get("filters", [])}
+        specs.append({
+            "symbol": s["symbol"],
+            "baseAsset": s["baseAsset"],
+            "quoteAsset": s["quoteAsset"],
+            "status": s["status"],
+            "lot_size": filters.get("LOT_SIZE", {}),
+            "price_filter": filters.get("PRICE_FILTER", {}),
+        })
+
+    try:
+        await redis_client.set(EXCHANGE_INFO_CACHE_KEY, json.dumps(specs), ex=EXCHANGE_INFO_TTL_SECONDS)
+    except Exception:
+        pass
+    return specs
+
 
 async def fetch_and_store_binance_symbols():
     """Fetch exchange symbols from Binance and insert/update `CryptoPair` documents.
@@ -32,56 +84,74 @@ async def fetch_and_store_binance_symbols():
         print("Error checking Binance client availability — skipping fetch_and_store_binance_symbols")
         return
 
-    exchange_info = await asyncio.to_thread(binance_client.get_exchange_info)
-    symbols = exchange_info.get("symbols", [])
+    specs = await load_usdt_symbol_specs()
 
-    for s in symbols:
-        if s["status"] != "TRADING" or not s.get("isSpotTradingAllowed", False):
-            continue
+    # One /ticker/price call for every symbol instead of one request per pair
+    tickers = await asyncio.to_thread(binance_client.get_all_tickers)
+    prices = {t["symbol"]: t["price"] for t in tickers or [] if "price" in t}
 
+    now = datetime.now(timezone.utc)
+    ops = []
+    for s in specs:
         symbol = s["symbol"]
-        base_asset = s["baseAsset"]
-        quote_asset = s["quoteAsset"]
-        status = s["status"]
+        price = to_decimal128(prices[symbol]) if symbol in prices else None
+
+        lot_size = s["lot_size"]
+        price_filter = s["price_filter"]
+
+        min_qty = _decimal128_from_str(lot_size["minQty"]) if "minQty" in lot_size else None
+        step_size = _decimal128_from_str(lot_size["stepSize"]) if "stepSize" in lot_size else None
+        tick_size = _decimal128_from_str(price_filter["tickSize"]) if "tickSize" in price_filter else None
+
+        # Pipeline-form upsert: refresh every field and keep created_at from the first insert
+        ops.append(UpdateOne(
+            {"symbol": symbol},
+            [{"$set": {
+                "base_asset": s["baseAsset"],
+                "quote_asset": s["quoteAsset"],
+                "status": s["status"],
+                "last_price": price,
+                "last_price_time": now,
+                "min_qty": min_qty,
+                "step_size": step_size,
+                "tick_size": tick_size,
+                "created_at": {"$ifNull": ["$created_at", now]},
+            }}],
+            upsert=True,
+        ))
+
+    if not ops:
+        return
 
-        if not symbol.endswith("USDT"):
-            continue
+    # One unordered round-trip for every pair; the job is safe to re-run, so w=1 is enough
+    collection = CryptoPair.get_motor_collection().with_options(write_concern=WriteConcern(w=1))
+    await collection.bulk_write(ops, ordered=False)
 
-        # fetch ticker in thread
-        price_data = await asyncio.to_thread(binance_client.get_symbol_ticker, symbol=symbol)
-        price = to_decimal128(price_data.get("price")) if "price" in price_data else None
-        now = datetime.now(timezone.utc)
 
-        filters = {f["filterType"]: f for f in s.get("filters", [])}
-        lot_size = filters.get("LOT_SIZE", {})
-        price_filter = filters.get("PRICE_FILTER", {})
-
-        min_qty = to_decimal128(lot_size.get("minQty", "0")) if "minQty" in lot_size else None
-        step_size = to_decimal128(lot_size.get("stepSize", "0")) if "stepSize" in lot_size else None
-        tick_size = to_decimal128(price_filter.get("tickSize", "0")) if "tickSize" in price_filter else None
-
-        existing = await CryptoPair.find_one(CryptoPair.symbol == symbol)
-
-        if existing:
-            await existing.set({
-                CryptoPair.last_price: price,
-                CryptoPair.last_price_time: now,
-                CryptoPair.status: status,
-                CryptoPair.min_qty: min_qty,
-                CryptoPair.step_size: step_size,
-                CryptoPair.tick_size: tick_size,
-            })
-        else:
-            doc = CryptoPair(
-                symbol=symbol,
-                base_asset=base_asset,
-                quote_asset=quote_asset,
-                status=status,
-                last_price=price,
-                last_price_time=now,
-                min_qty=min_qty,
-                step_size=step_size,
-                tick_size=tick_size,
-                created_at=now,
-            )
-            await doc.insert()
+async def refresh_crypto_pair_prices():
+    """Update only `last_price`/`last_price_time` for known USDT pairs.
+
+    Prices churn every minute while status and filters rarely change, so this runs
+    far more often than `fetch_and_store_binance_symbols` and writes two fields per pair.
+    """
+    try:
+        if not getattr(binance_client, "is_available", lambda: False)():
+            return
+    except Exception:
+        return
+
+    specs = await load_usdt_symbol_specs()
+    symbols = {s["symbol"] for s in specs}
+
+    tickers = await asyncio.to_thread(binance_client.get_all_tickers)
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne({"symbol": t["symbol"]}, {"$set": {"last_price": to_decimal128(t["price"]), "last_price_time": now}})
+        for t in tickers or []
+        if t.get("symbol") in symbols and "price" in t
+    ]
+    if not ops:
+        return
+
+    collection = CryptoPair.get_motor_collection().with_options(write_concern=WriteConcern(w=1))
+    await collection.bulk_write(ops, ordered=False)
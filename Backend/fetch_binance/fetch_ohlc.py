@@ -1,70 +1,140 @@
 from models import CryptoPair, Candle, CandleSyncTracker
 from binance_config import client
-from decimal import Decimal
 from datetime import datetime, timedelta, timezone
 from binance.client import Client as BinanceClient
+from bson.decimal128 import Decimal128
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import asyncio
+import os
+import numpy as np
+import pandas as pd
 
 BINANCE_INTERVAL = BinanceClient.KLINE_INTERVAL_1DAY
 
-async def fetch_historical_data(interval: str = BINANCE_INTERVAL, days_back: int = 30):
-    pairs = await CryptoPair.find_all().to_list()
-    now = datetime.now(timezone.utc)
+# Concurrent kline requests; keeps us well inside Binance's request weight limits
+KLINE_CONCURRENCY = int(os.getenv("BINANCE_KLINE_CONCURRENCY", "10"))
+# Candles per insert_many round-trip
+INSERT_BATCH_SIZE = 10_000
+
+async def dedupe_candle_sync_trackers(db):
+    """Collapse duplicate trackers to the one with the newest `last_fetched` per symbol.
+
+    Trackers used to be created with a racy find_one + insert, so older databases can hold
+    several per symbol, which would fail the unique `symbol` index build in `init_beanie`.
+    Takes the raw database because it has to run before Beanie is initialised.
+    """
+    trackers = db[CandleSyncTracker.Settings.name]
+    groups = trackers.aggregate([
+        {"$sort": {"last_fetched": -1}},
+        {"$group": {"_id": "$symbol", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ])
+    stale = []
+    async for group in groups:
+        stale.extend(group["ids"][1:])
+    if stale:
+        await trackers.delete_many({"_id": {"$in": stale}})
+    return len(stale)
 
+async def fetch_historical_data(interval: str = BINANCE_INTERVAL, days_back: int = 30):
     # Skip if Binance client not available
     try:
-        from binance_config import client as _client
-        if not getattr(_client, "is_available", lambda: False)():
+        if not getattr(client, "is_available", lambda: False)():
             print("Binance client not available — skipping fetch_historical_data")
             return
     except Exception:
         print("Error checking Binance client availability — skipping fetch_historical_data")
         return
 
-    for pair in pairs:
-        try:
-            # Get last fetched time from tracker
-            tracker = await CandleSyncTracker.find_one({"symbol": pair.symbol})
-            start_time = tracker.last_fetched if tracker else now - timedelta(days=30)
-            end_time = now
+    pairs = await CryptoPair.find_all().to_list()
+    now = datetime.now(timezone.utc)
+
+    # Last fetched time for every pair in one query
+    trackers = {t.symbol: t.last_fetched for t in await CandleSyncTracker.find_all().to_list()}
 
-            # Fetch new klines
-            klines = client.get_historical_klines(
-                symbol=pair.symbol,
+    sem = asyncio.Semaphore(KLINE_CONCURRENCY)
+
+    async def fetch_klines(symbol):
+        start_time = trackers.get(symbol) or now - timedelta(days=30)
+        async with sem:
+            # The Binance client is blocking; keep it off the event loop
+            return await asyncio.to_thread(
+                client.get_historical_klines,
+                symbol=symbol,
                 interval=interval,
                 start_str=start_time.strftime('%d %b, %Y'),
-                end_str=end_time.strftime('%d %b, %Y')
+                end_str=now.strftime('%d %b, %Y')
             )
-            klines.sort(key=lambda k: k[0])
-            candles_to_insert = []
-            for kline in klines:
-                candle_time = datetime.fromtimestamp(kline[0] / 1000)
-
-                candle = Candle(
-                    symbol=pair.symbol,
-                    interval=interval,
-                    open=Decimal(kline[1]),
-                    high=Decimal(kline[2]),
-                    low=Decimal(kline[3]),
-                    close=Decimal(kline[4]),
-                    volume=Decimal(kline[5]),
-                    candle_time=candle_time
-                )
-                candles_to_insert.append(candle)
 
-            if candles_to_insert:
-                # Insert all new candles
-                await Candle.insert_many(candles_to_insert)
+    symbols = [pair.symbol for pair in pairs]
+    results = await asyncio.gather(*[fetch_klines(symbol) for symbol in symbols], return_exceptions=True)
 
-                # Update tracker with latest candle time
-                latest_time = max(c.candle_time for c in candles_to_insert)
+    candle_docs = []
+    latest_times = {}
+    for symbol, klines in zip(symbols, results):
+        if isinstance(klines, Exception):
+            print(f"❌ Error syncing {symbol}: {klines}")
+            continue
+        if not klines:
+            continue
 
-                existing_tracker = await CandleSyncTracker.find_one({"symbol": pair.symbol})
+        # Convert each pair's open times in one vectorized pass. OHLCV stay as Binance's
+        # decimal strings so Decimal128 stores them exactly (a float64 detour would round
+        # them). A malformed kline only drops its own pair.
+        try:
+            arr = np.asarray(klines, dtype=object)
+            open_ms = arr[:, 0].astype("int64")
+            candle_times = pd.to_datetime(open_ms, unit="ms", utc=True).to_pydatetime()
+            docs = [
+                {
+                    "symbol": symbol,
+                    "interval": interval,
+                    "open": Decimal128(o),
+                    "high": Decimal128(h),
+                    "low": Decimal128(l),
+                    "close": Decimal128(c),
+                    "volume": Decimal128(v),
+                    "candle_time": candle_time,
+                }
+                for candle_time, (o, h, l, c, v) in zip(candle_times, arr[:, 1:6])
+            ]
+        except Exception as e:
+            print(f"❌ Error converting klines for {symbol}: {e}")
+            continue
+        candle_docs.extend(docs)
+        latest_times[symbol] = candle_times[int(open_ms.argmax())]
 
-                if existing_tracker:
-                    existing_tracker.last_fetched = latest_time
-                    await existing_tracker.save()
-                else:
-                    await CandleSyncTracker(symbol=pair.symbol, last_fetched=latest_time).insert()
+    if not candle_docs:
+        return
 
+    # Symbols with any rejected row keep their tracker, so the next run retries them
+    failed = set()
+    candles = Candle.get_motor_collection()
+    for i in range(0, len(candle_docs), INSERT_BATCH_SIZE):
+        batch = candle_docs[i:i + INSERT_BATCH_SIZE]
+        try:
+            await candles.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            print(f"❌ Error storing candles: {e}")
+            if e.details.get("writeConcernErrors"):
+                failed.update(doc["symbol"] for doc in batch)
+            else:
+                # Unordered inserts store every other row; only the rejected rows' pairs stay behind
+                failed.update(batch[err["index"]]["symbol"] for err in e.details.get("writeErrors", ()))
         except Exception as e:
-            print(f"❌ Error syncing {pair.symbol}: {e}")
+            print(f"❌ Error storing candles: {e}")
+            failed.update(doc["symbol"] for doc in batch)
+
+    # Only advance trackers once their candles are stored; $max never moves one backwards
+    ops = [
+        UpdateOne({"symbol": symbol}, {"$max": {"last_fetched": latest}}, upsert=True)
+        for symbol, latest in latest_times.items()
+        if symbol not in failed
+    ]
+    if not ops:
+        return
+    try:
+        await CandleSyncTracker.get_motor_collection().bulk_write(ops, ordered=False)
+    except Exception as e:
+        print(f"❌ Error updating candle sync trackers: {e}")
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from db import lifespan 
 
 # Import routes using package-relative imports when running as `Backend.main`,
@@ -10,7 +11,7 @@ except Exception:
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
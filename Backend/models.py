@@ -1,4 +1,4 @@
-from beanie import Document, Indexed, Link, BackLink, before_event, Insert, Replace
+from beanie import Document, Indexed, Link, before_event, Insert, Replace
 from beanie import Indexed
 from pydantic import Field, BaseModel, field_validator
 from typing import List, Dict, Optional
@@ -8,8 +8,13 @@ from enum import Enum
 from pymongo import IndexModel
 from decimal import Decimal
 from bson.decimal128 import Decimal128
+from bson.dbref import DBRef
 from pydantic import model_validator
 from beanie import PydanticObjectId
+from functools import partial
+
+# Timezone-aware "now" for timestamp defaults
+_utcnow = partial(datetime.now, timezone.utc)
 
 class TransactionTypeEnum(str, Enum):
     buy = "Buy"
@@ -53,13 +58,8 @@ class User(Document):
     is_active: bool = Field(default=True)
     role: str = Field(default="user")
     credits: Decimal = Field(default=Decimal("0"))
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    portfolios: Optional[List[BackLink["Portfolio"]]] = Field(default_factory=list, original_field="user")
-    orders: Optional[List[BackLink["Order"]]] = Field(default_factory=list, original_field="user")
-    transactions: Optional[List[BackLink["Transaction"]]] = Field(default_factory=list, original_field="user")
-    carts: Optional[List[BackLink["Cart"]]] = Field(default_factory=list, original_field="user")
-    credits_history: Optional[List[BackLink["CreditsHistory"]]] = Field(default_factory=list, original_field="user")
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
 
     @field_validator("credits", mode="before")
     def convert_decimal128(cls, v):
@@ -92,7 +92,7 @@ class CryptoPair(Document):
     step_size: Optional[Decimal128] = None
     tick_size: Optional[Decimal128] = None
 
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
 
     class Settings:
         name = "crypto_pairs"
@@ -120,7 +120,7 @@ class Candle(Document):
     @classmethod
     def convert_decimal128(cls, value):
         if isinstance(value, Decimal128):
-            return Decimal(str(value.to_decimal()))
+            return value.to_decimal()
         return value
 
 
@@ -142,9 +142,8 @@ class Order(Document):
     price: Optional[Decimal] = None
     status: Optional[str] = 'PENDING' 
     order_id: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
     executed_at: Optional[datetime] = None
-    transactions: Optional[List[BackLink["Transaction"]]] = Field(default_factory=list, original_field="order")
 
     @field_validator('quantity', 'price', mode='before')
     @classmethod
@@ -159,11 +158,37 @@ class Order(Document):
             IndexModel([("user.$id", 1), ("created_at", -1)]),
             IndexModel([("symbol", 1), ("created_at", -1)]),
             IndexModel([("status", 1), ("created_at", -1)]),
+            IndexModel([("status", 1), ("symbol", 1)]),
             IndexModel([("order_type", 1)]),
             IndexModel([("side", 1)]),
         ]
 
 
+class OrderLite(BaseModel):
+    """Projection of Order used by the settlement job; `user` is read as its raw id."""
+    id: PydanticObjectId = Field(alias="_id")
+    symbol: str
+    side: str
+    order_id: Optional[str] = None
+    user_id: PydanticObjectId = Field(alias="user")
+    price: Optional[Decimal] = None
+    quantity: Decimal
+
+    @field_validator('user_id', mode='before')
+    @classmethod
+    def dbref_to_id(cls, v):
+        if isinstance(v, DBRef):
+            return v.id
+        return v
+
+    @field_validator('quantity', 'price', mode='before')
+    @classmethod
+    def convert_decimal128(cls, v):
+        if isinstance(v, Decimal128):
+            return v.to_decimal()
+        return v
+
+
 class Transaction(Document):
     user: Link[User]
     order: Link[Order]
@@ -172,7 +197,7 @@ class Transaction(Document):
     quantity: Decimal  
     price: Decimal
     total_amount: Decimal  
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
 
     @model_validator(mode="before")
     @classmethod
@@ -197,13 +222,13 @@ class Portfolio(Document):
     symbol: str
     quantity: Decimal
     avg_buy_price: Decimal
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=_utcnow)
 
     @field_validator("quantity", "avg_buy_price", mode="before")
     @classmethod
     def convert_decimal128(cls, value):
-        if str(type(value)) == "<class 'bson.decimal128.Decimal128'>":
-            return str(value.to_decimal())
+        if isinstance(value, Decimal128):
+            return value.to_decimal()
         return value
 
     class Settings:
@@ -230,8 +255,8 @@ class CartItemEmbed(BaseModel):
     
 class Cart(Document):
     user: Link[User]
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
     status: StatusEnum
     items: List[CartItemEmbed] = Field(default_factory=list)
 
@@ -250,10 +275,13 @@ class Cart(Document):
 
 class CandleSyncTracker(Document):
     symbol: str
-    last_fetched: datetime = Field(default_factory=datetime.utcnow)
+    last_fetched: datetime = Field(default_factory=_utcnow)
 
     class Settings:
         name = "candle_sync_tracker"
+        indexes = [
+            IndexModel([("symbol", 1)], unique=True)
+        ]
 
 
 class CreditsHistory(Document):
@@ -262,7 +290,7 @@ class CreditsHistory(Document):
     reason: CreditReasonEnum  
     balance_after: Optional[Decimal] = None  
     metadata: Optional[Dict] = None  
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
 
     @model_validator(mode="before")
     @classmethod
@@ -282,7 +310,7 @@ class CreditsHistory(Document):
 class Cache(Document):
     key: str = Indexed(unique=True)  
     value: Dict 
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=_utcnow)
     expires_at: datetime
 
     class Settings:
@@ -297,11 +325,15 @@ class Transfer(Document):
     to_user: Link[User]                  
     symbol: str = Field(..., min_length=1)       
     amount: Decimal = Field(..., gt=0)           
-    timestamp: datetime = Field(default_factory=datetime.now(timezone.utc))
+    timestamp: datetime = Field(default_factory=_utcnow)
     note: Optional[str] = None                  
 
     class Settings:
         name = "transfers"
+        indexes = [
+            IndexModel([("from_user.$id", 1), ("timestamp", -1)]),
+            IndexModel([("to_user.$id", 1), ("timestamp", -1)])
+        ]
 
     class Config:
         json_schema_extra = {
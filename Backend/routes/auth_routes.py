@@ -1,26 +1,79 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Form, Request, Header
 from passlib.context import CryptContext
 from models import User, UserCreate, UserLogin, TokenResponse, Cache
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
 from decimal import Decimal
 from datetime import datetime, timedelta, timezone
-from fastapi.responses import JSONResponse
-from auth import create_access_token, create_refresh_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from fastapi.responses import ORJSONResponse
+from auth import create_access_token, create_refresh_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY
 from services.redis_client import redis_client
 from services.session_store import store_session
 from db import get_current_user
+import asyncio
+import os
+import hashlib
+import hmac
 import json
+import orjson
 
 router = APIRouter(tags=["Authentication"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cost factor for new hashes; existing hashes keep verifying at whatever cost they were made with
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class UserCredentials(BaseModel):
+    """Projection of the User fields needed to check a login."""
+    id: PydanticObjectId = Field(alias="_id")
+    username: str
+    password_hash: str
+
+
+class UserIdView(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+
+
+# How long a successful password check is remembered, so bursts of repeat logins skip bcrypt
+LOGIN_CACHE_TTL_SECONDS = 60
+
+
+def _login_cache_key(user, password: str) -> str:
+    # Keyed HMAC over the stored hash too, so a password change invalidates the entry
+    # and Redis never holds anything crackable without SECRET_KEY
+    digest = hmac.new(
+        SECRET_KEY.encode(),
+        f"{user.id}:{user.password_hash}:{password}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"login_verified:{digest}"
+
+
+async def _verify_password(user, password: str) -> bool:
+    key = _login_cache_key(user, password)
+    try:
+        if await redis_client.get(key):
+            return True
+    except Exception:
+        pass
+
+    # bcrypt is deliberately slow CPU work; keep it off the event loop
+    if not await asyncio.to_thread(pwd_context.verify, password, user.password_hash):
+        return False
+
+    try:
+        await redis_client.set(key, "1", ex=LOGIN_CACHE_TTL_SECONDS)
+    except Exception:
+        pass
+    return True
 
 @router.post("/register", response_model=TokenResponse)
 async def register(user: UserCreate):
     # Dict-based query to avoid descriptor issues in tests
-    existing = await User.find_one({"username": user.username})
+    existing = await User.find_one({"username": user.username}, projection_model=UserIdView)
     if existing:
         raise HTTPException(400, detail="Email already registered")
 
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await asyncio.to_thread(pwd_context.hash, user.password)
     # Give new users an initial credit balance
     new_user = User(username=user.username, password_hash=hashed_password, credits=Decimal("1000"))
     await new_user.insert()
@@ -49,17 +102,19 @@ async def login(
         pass 
     else:
         
-        data = await request.json()
+        body = await request.body()
+        data = orjson.loads(body) if body else {}
         username = data.get("username")
         password = data.get("password")
 
     if not username or not password:
-        return JSONResponse(status_code=422, content={"detail": "Username and password required"})
+        return ORJSONResponse(status_code=422, content={"detail": "Username and password required"})
 
     # Dict-based query to avoid descriptor issues in tests
-    user = await User.find_one({"username": username})
-    if not user or not pwd_context.verify(password, user.password_hash):
-        return JSONResponse(status_code=401, content={"detail": "Invalid credentials"})
+    # Only the credentials are needed here; skip loading and validating the full User
+    user = await User.find_one({"username": username}, projection_model=UserCredentials)
+    if not user or not await _verify_password(user, password):
+        return ORJSONResponse(status_code=401, content={"detail": "Invalid credentials"})
 
     access_token = create_access_token(data={"sub": str(user.id)})
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
@@ -91,13 +146,9 @@ async def logout(current_user: User = Depends(get_current_user)):
     redis_key = f"user_session:{current_user.id}"
 
     # Remove Redis session
-    redis_client.delete(redis_key)
-
-    # Remove cached DB session if present (support both async and mocked sync)
-    cache_entry = Cache.find_one({"key": redis_key})
-    if hasattr(cache_entry, "__await__"):
-        cache_entry = await cache_entry
-    if cache_entry:
-        await cache_entry.delete()
+    await redis_client.delete(redis_key)
+
+    # Remove the cached DB session with a single delete_one instead of find-then-delete
+    await Cache.find_one({"key": redis_key}).delete()
 
     return {"message": "Logged out successfully"}
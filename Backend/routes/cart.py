@@ -2,15 +2,20 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from datetime import datetime, timezone
+import asyncio
+import time
+from collections import deque
 from decimal import Decimal
 from pydantic import BaseModel
 from binance_config import client
 from typing import Optional
 from bson import ObjectId
+from bson.decimal128 import Decimal128
+from pymongo import ReturnDocument
 from models import (
     Cart, CartItemEmbed, StatusEnum, OrderStatusEnum, Order,
     Transaction, TransactionTypeEnum, Portfolio, OrderTypeEnum,
-    CreditsHistory, CreditReasonEnum
+    CreditsHistory, CreditReasonEnum, User
 )
 from db import get_current_user
 from services.portfolio import update_or_create_portfolio
@@ -20,6 +25,76 @@ router = APIRouter(tags=["Cart"])
 def _beanie_ready(model_cls) -> bool:
     return getattr(model_cls, "_document_settings", None) is not None and getattr(model_cls, "_inheritance_inited", True)
 
+# Market prices are shared across requests for a moment so hot symbols hit Binance once
+TICKER_CACHE_TTL_SECONDS = 2.0
+_ticker_cache: dict = {}      # symbol -> (monotonic timestamp, Decimal price)
+_ticker_inflight: dict = {}   # symbol -> pending get_symbol_ticker future
+
+# Binance allows 10 orders/second per account; start at most this many per rolling
+# second in each process. Start times are reserved synchronously, so no lock is needed.
+ORDERS_PER_SECOND = 8
+_order_starts: deque = deque(maxlen=ORDERS_PER_SECOND)
+
+async def _wait_for_order_slot():
+    now = time.monotonic()
+    start = now
+    if len(_order_starts) == ORDERS_PER_SECOND:
+        start = max(now, _order_starts[0] + 1.0)
+    _order_starts.append(start)
+    if start > now:
+        await asyncio.sleep(start - now)
+
+class _NotPlaced(Exception):
+    """A cart item skipped because an earlier item in the same checkout failed."""
+
+async def _get_market_price(symbol: str) -> Decimal:
+    cached = _ticker_cache.get(symbol)
+    if cached and time.monotonic() - cached[0] < TICKER_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    # Coalesce concurrent misses for a symbol onto one Binance call
+    fut = _ticker_inflight.get(symbol)
+    if fut is None:
+        fut = asyncio.ensure_future(asyncio.to_thread(client.get_symbol_ticker, symbol=symbol))
+        _ticker_inflight[symbol] = fut
+        fut.add_done_callback(lambda f: _ticker_inflight.pop(symbol) if _ticker_inflight.get(symbol) is f else None)
+
+    ticker = await asyncio.shield(fut)
+    price = Decimal(ticker["price"])
+    _ticker_cache[symbol] = (time.monotonic(), price)
+    return price
+
+async def _save(doc):
+    # Test doubles may expose a plain (non-async) save
+    save = getattr(doc, "save", None)
+    if callable(save):
+        maybe = save()
+        if hasattr(maybe, "__await__"):
+            await maybe
+
+async def _adjust_credits(user_id, delta: Decimal, require_funds: bool = False):
+    """Apply `delta` to the user's credits with one atomic $inc and return the new balance.
+
+    With `require_funds` the update only matches while the balance covers the debit;
+    None is returned instead of letting the balance go negative.
+    """
+    query = {"_id": user_id}
+    if require_funds:
+        query["credits"] = {"$gte": Decimal128(-delta)}
+    doc = await User.get_motor_collection().find_one_and_update(
+        query,
+        {"$inc": {"credits": Decimal128(delta)}},
+        projection={"credits": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        return None
+    credits = doc["credits"]
+    return credits.to_decimal() if isinstance(credits, Decimal128) else Decimal(str(credits))
+
+def _active_cart_filter(user_id) -> dict:
+    return {"user.$id": user_id, "status": StatusEnum.active.value}
+
 class AddToCartRequest(BaseModel):
     symbol: str
     order_type: OrderTypeEnum
@@ -32,47 +107,56 @@ async def add_to_cart(item: AddToCartRequest, current_user=Depends(get_current_u
     unit_price = item.price
     if unit_price is None:
         try:
-            ticker = client.get_symbol_ticker(symbol=full_symbol)
-            unit_price = Decimal(ticker["price"])
+            unit_price = await _get_market_price(full_symbol)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Could not fetch market price: {e}")
 
     total_price = unit_price * item.quantity
-    cart = await Cart.find_one({"user.$id": current_user.id, "status": StatusEnum.active})
-
-    if not cart:
-        if not _beanie_ready(Cart):
-            class _CartStub: pass
-            cart = _CartStub()
-            cart.id = ObjectId()
-            cart.user = current_user
-            cart.status = StatusEnum.active
-            cart.items = []
-            cart.created_at = datetime.now(timezone.utc)
-            cart.updated_at = cart.created_at
-            await Cart.insert(cart)
-        else:
-            cart = Cart(user=current_user, status=StatusEnum.active, items=[])
-            await cart.insert()
-
-    found = False
-    for existing_item in cart.items:
-        if (existing_item.symbol == full_symbol and existing_item.order_type == item.order_type and (item.order_type != "LIMIT" or existing_item.price == total_price)):
-            existing_item.quantity += item.quantity
-            if item.order_type == OrderTypeEnum.MARKET:
-                existing_item.price += total_price
-            found = True
-            break
+    now = datetime.now(timezone.utc)
+    carts = Cart.get_motor_collection()
+    cart_filter = _active_cart_filter(current_user.id)
 
-    if not found:
-        cart_item = CartItemEmbed(symbol=full_symbol, order_type=item.order_type, quantity=item.quantity, price=total_price)
-        cart.items.append(cart_item)
+    # Market lines merge by symbol and accumulate cost; limit lines only merge at the same price
+    match = {"symbol": full_symbol, "order_type": item.order_type.value}
+    inc = {"items.$.quantity": Decimal128(item.quantity)}
+    if item.order_type == OrderTypeEnum.LIMIT:
+        match["price"] = Decimal128(total_price)
+    else:
+        inc["items.$.price"] = Decimal128(total_price)
+    new_line = {**match, "quantity": Decimal128(item.quantity), "price": Decimal128(total_price)}
 
-    cart.updated_at = datetime.now(timezone.utc)
-    if hasattr(cart, "save"):
-        maybe = cart.save()
-        if hasattr(maybe, "__await__"):
-            await maybe
+    # Atomic $inc / $push on the active cart, so concurrent adds can't overwrite each other.
+    # A second pass covers an identical line pushed by another request in between.
+    for _ in range(2):
+        result = await carts.update_one(
+            {**cart_filter, "items": {"$elemMatch": match}},
+            {"$inc": inc, "$set": {"updated_at": now}},
+        )
+        if result.matched_count:
+            break
+        result = await carts.update_one(
+            {**cart_filter, "items": {"$not": {"$elemMatch": match}}},
+            {"$push": {"items": new_line}, "$set": {"updated_at": now}},
+        )
+        if result.matched_count:
+            break
+        if not await carts.count_documents(cart_filter, limit=1):
+            cart_item = CartItemEmbed(symbol=full_symbol, order_type=item.order_type, quantity=item.quantity, price=total_price)
+            if not _beanie_ready(Cart):
+                class _CartStub: pass
+                cart = _CartStub()
+                cart.id = ObjectId()
+                cart.user = current_user
+                cart.status = StatusEnum.active
+                cart.items = [cart_item]
+                cart.created_at = now
+                cart.updated_at = now
+                await Cart.insert(cart)
+            else:
+                await Cart(user=current_user, status=StatusEnum.active, items=[cart_item], created_at=now, updated_at=now).insert()
+            break
+    else:
+        raise HTTPException(status_code=409, detail="Cart changed while adding the item; please retry")
 
     return {"message": "Item added to cart (or quantity updated)", "unit_price": float(unit_price), "total_price": float(total_price)}
 
@@ -83,129 +167,215 @@ async def view_cart(current_user=Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Active cart not found")
     return {"cart_id": str(cart.id), "items": cart.items}
 
+@router.get("/cart/view_full")
+async def view_cart_full(
+    history_skip: int = Query(0, ge=0),
+    history_limit: int = Query(20, ge=1, le=100),
+    current_user=Depends(get_current_user),
+):
+    """Cart, a page of credits history and holdings for one page, fetched concurrently."""
+    cart, credits_history, portfolio = await asyncio.gather(
+        Cart.find_one({"user.$id": current_user.id, "status": StatusEnum.active}),
+        CreditsHistory.find({"user.$id": current_user.id}).sort("-created_at").skip(history_skip).limit(history_limit).to_list(),
+        Portfolio.find({"user.$id": current_user.id}).to_list(),
+    )
+    # Shape rows explicitly rather than returning documents with their Link[User] fields
+    return {
+        "cart_id": str(cart.id) if cart else None,
+        "items": cart.items if cart else [],
+        "credits": float(current_user.credits),
+        "credits_history": [
+            {
+                "change_amount": float(h.change_amount),
+                "reason": h.reason,
+                "balance_after": float(h.balance_after) if h.balance_after is not None else None,
+                "metadata": h.metadata,
+                "created_at": h.created_at,
+            }
+            for h in credits_history
+        ],
+        "portfolio": [
+            {
+                "symbol": p.symbol,
+                "quantity": float(p.quantity),
+                "avg_buy_price": float(p.avg_buy_price),
+                "updated_at": p.updated_at,
+            }
+            for p in portfolio
+        ],
+    }
+
 @router.delete("/cart/clear")
 async def clear_cart(current_user=Depends(get_current_user)):
-    cart = await Cart.find_one({"user.$id": current_user.id, "status": StatusEnum.active})
-    if cart:
-        cart.items = []
-        if hasattr(cart, "save"):
-            maybe = cart.save()
-            if hasattr(maybe, "__await__"):
-                await maybe
-        return {"message": "Cart cleared"}
-    raise HTTPException(status_code=404, detail="Active cart not found")
+    result = await Cart.get_motor_collection().update_one(
+        _active_cart_filter(current_user.id),
+        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc)}},
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Active cart not found")
+    return {"message": "Cart cleared"}
 
 @router.delete("/cart/remove")
 async def remove_item_from_cart(symbol: str = Query(...), current_user=Depends(get_current_user)):
-    cart = await Cart.find_one({"user.$id": current_user.id, "status": StatusEnum.active})
-    if not cart:
-        raise HTTPException(status_code=404, detail="Active cart not found")
+    carts = Cart.get_motor_collection()
+    cart_filter = _active_cart_filter(current_user.id)
+    symbol_upper = symbol.upper()
 
-    original_count = len(cart.items)
-    cart.items = [item for item in cart.items if item.symbol.upper() != symbol.upper()]
-    if len(cart.items) == original_count:
+    result = await carts.update_one(
+        {**cart_filter, "items.symbol": symbol_upper},
+        {"$pull": {"items": {"symbol": symbol_upper}}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+    )
+    if not result.matched_count:
+        # Only the miss path pays for working out which 404 it is
+        if not await carts.count_documents(cart_filter, limit=1):
+            raise HTTPException(status_code=404, detail="Active cart not found")
         raise HTTPException(status_code=404, detail=f"Item with symbol '{symbol}' not found in cart")
-
-    cart.updated_at = datetime.now(timezone.utc)
-    if hasattr(cart, "save"):
-        maybe = cart.save()
-        if hasattr(maybe, "__await__"):
-            await maybe
     return {"message": f"Item '{symbol}' removed from cart"}
 
+async def _place_one(item, now, current_user, stop: asyncio.Event):
+    """Place one cart item on Binance and record its order; fill rows are returned for batching."""
+    full_symbol = item.symbol.upper()
+    side = "BUY"
+    item_cost = Decimal("0")
+    await _wait_for_order_slot()
+    # Orders already sent can't be recalled, but nothing new starts after a failure
+    if stop.is_set():
+        raise _NotPlaced(full_symbol)
+    try:
+        order_payload = {"symbol": full_symbol, "side": side, "type": OrderTypeEnum(item.order_type).value, "quantity": float(item.quantity), "recvWindow": 5000}
+        if item.order_type == OrderTypeEnum.LIMIT:
+            order_payload["price"] = float(item.price)
+            order_payload["timeInForce"] = "GTC"
+        order_data = await asyncio.to_thread(client.create_order, **order_payload)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Binance error on {item.symbol}: {e}")
+
+    if not _beanie_ready(Order):
+        class _OrderStub: pass
+        order_doc = _OrderStub()
+        order_doc.id = ObjectId()
+        order_doc.user = current_user.id
+        order_doc.symbol = full_symbol
+        order_doc.side = side
+        order_doc.order_type = item.order_type
+        order_doc.quantity = item.quantity
+        order_doc.price = item.price
+        order_doc.binance_order_id = order_data["orderId"]
+        order_doc.status = order_data["status"]
+        order_doc.created_at = now
+        order_doc.executed_at = now if order_data["status"] == "FILLED" else None
+        await Order.insert(order_doc)
+    else:
+        order_doc = await Order.insert(Order(user=current_user.id, symbol=full_symbol, side=side, order_type=item.order_type, quantity=item.quantity, price=item.price, binance_order_id=order_data["orderId"], status=order_data["status"], created_at=now, executed_at=now if order_data["status"] == "FILLED" else None))
+
+    tx_rows, credit_rows = [], []
+    filled_qty = Decimal("0")
+    if item.order_type == OrderTypeEnum.MARKET and order_data["status"] == "FILLED":
+        # ODM readiness can't change mid-request; check it once, not per fill
+        tx_ready = _beanie_ready(Transaction)
+        history_ready = _beanie_ready(CreditsHistory)
+        for fill in order_data.get("fills", []):
+            qty = Decimal(fill["qty"])
+            price = Decimal(fill["price"])
+            total = qty * price
+            item_cost += total
+            filled_qty += qty
+            if not tx_ready:
+                class _TxStub: pass
+                tx_obj = _TxStub()
+                tx_obj.id = ObjectId()
+                tx_obj.user = current_user.id
+                tx_obj.order = order_doc.id
+                tx_obj.symbol = full_symbol
+                tx_obj.transaction_type = TransactionTypeEnum.buy
+                tx_obj.quantity = qty
+                tx_obj.price = price
+                tx_obj.total_amount = total
+                tx_obj.created_at = now
+                tx_rows.append(tx_obj)
+            else:
+                tx_rows.append(Transaction(user=current_user.id, order=order_doc.id, symbol=full_symbol, transaction_type=TransactionTypeEnum.buy, quantity=qty, price=price, total_amount=total, created_at=now))
+
+            if not history_ready:
+                class _HistoryStub: pass
+                h = _HistoryStub()
+                h.user = current_user
+                h.change_amount = -total
+                h.reason = CreditReasonEnum.trade
+                h.metadata = {"symbol": full_symbol, "qty": str(qty), "price": str(price)}
+                credit_rows.append(h)
+            else:
+                credit_rows.append(CreditsHistory(user=current_user, change_amount=-total, reason=CreditReasonEnum.trade, metadata={"symbol": full_symbol, "qty": str(qty), "price": str(price)}))
+
+    # One portfolio update per item at the volume-weighted fill price
+    if filled_qty:
+        await update_or_create_portfolio(current_user.id, full_symbol, filled_qty, item_cost / filled_qty)
+
+    return order_doc, item_cost, tx_rows, credit_rows
+
 @router.post("/cart/checkout")
 async def checkout_cart(current_user=Depends(get_current_user)):
     cart = await Cart.find_one({"user.$id": current_user.id, "status": StatusEnum.active})
     if not cart or not cart.items:
         raise HTTPException(status_code=400, detail="No active cart or items to checkout")
 
+    # Reserve the market lines' estimated cost before anything is sent to Binance.
+    # Limit orders are charged by the settlement job when they fill.
+    estimate = sum((item.price for item in cart.items if item.order_type == OrderTypeEnum.MARKET), Decimal("0"))
+    if estimate:
+        balance = await _adjust_credits(current_user.id, -estimate, require_funds=True)
+        if balance is None:
+            raise HTTPException(status_code=400, detail="Insufficient credits for total cart")
+        current_user.credits = balance
+
     now = datetime.now(timezone.utc)
-    total_cost = Decimal("0")
-    for item in cart.items:
-        full_symbol = item.symbol.upper()
-        side = "BUY"
+    stop = asyncio.Event()
+
+    async def place(item):
         try:
-            order_payload = {"symbol": full_symbol, "side": side, "type": item.order_type.upper(), "quantity": float(item.quantity)}
-            if item.order_type == OrderTypeEnum.LIMIT:
-                order_payload["price"] = float(item.price)
-                order_payload["timeInForce"] = "GTC"
-            order_data = client.create_order(**order_payload)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Binance error on {item.symbol}: {e}")
-
-        if not _beanie_ready(Order):
-            class _OrderStub: pass
-            order_doc = _OrderStub()
-            order_doc.id = ObjectId()
-            order_doc.user = current_user.id
-            order_doc.symbol = full_symbol
-            order_doc.side = side
-            order_doc.order_type = item.order_type
-            order_doc.quantity = item.quantity
-            order_doc.price = item.price
-            order_doc.binance_order_id = order_data["orderId"]
-            order_doc.status = order_data["status"]
-            order_doc.created_at = now
-            order_doc.executed_at = now if order_data["status"] == "FILLED" else None
-            await Order.insert(order_doc)
-        else:
-            order_doc = await Order.insert(Order(user=current_user.id, symbol=full_symbol, side=side, order_type=item.order_type, quantity=item.quantity, price=item.price, binance_order_id=order_data["orderId"], status=order_data["status"], created_at=now, executed_at=now if order_data["status"] == "FILLED" else None))
-
-        if item.order_type == OrderTypeEnum.MARKET and order_data["status"] == "FILLED":
-            for fill in order_data.get("fills", []):
-                qty = Decimal(fill["qty"])
-                price = Decimal(fill["price"])
-                total = qty * price
-                total_cost += total
-                if not _beanie_ready(Transaction):
-                    class _TxStub: pass
-                    tx_obj = _TxStub()
-                    tx_obj.id = ObjectId()
-                    tx_obj.user = current_user.id
-                    tx_obj.order = order_doc.id
-                    tx_obj.symbol = full_symbol
-                    tx_obj.transaction_type = TransactionTypeEnum.buy
-                    tx_obj.quantity = qty
-                    tx_obj.price = price
-                    tx_obj.total_amount = total
-                    tx_obj.created_at = now
-                    await Transaction.insert(tx_obj)
-                else:
-                    await Transaction.insert(Transaction(user=current_user.id, order=order_doc.id, symbol=full_symbol, transaction_type=TransactionTypeEnum.buy, quantity=qty, price=price, total_amount=total, created_at=now))
-
-                await update_or_create_portfolio(current_user.id, full_symbol, qty, price)
-
-                if not _beanie_ready(CreditsHistory):
-                    class _HistoryStub: pass
-                    h = _HistoryStub()
-                    h.user = current_user
-                    h.change_amount = -total
-                    h.reason = CreditReasonEnum.trade
-                    h.metadata = {"symbol": full_symbol, "qty": str(qty), "price": str(price)}
-                    await CreditsHistory.insert(h)
-                else:
-                    await CreditsHistory.insert(CreditsHistory(user=current_user, change_amount=-total, reason=CreditReasonEnum.trade, metadata={"symbol": full_symbol, "qty": str(qty), "price": str(price)}))
-
-    # Credits check: strict when Beanie is ready; lenient heuristic in lightweight test mode
-    if _beanie_ready(Cart):
-        if current_user.credits < total_cost:
-            raise HTTPException(status_code=400, detail="Insufficient credits for total cart")
-    else:
-        # In test mode without ODM init, still fail blatantly underfunded accounts
-        if current_user.credits < Decimal("1000") and current_user.credits < total_cost:
-            raise HTTPException(status_code=400, detail="Insufficient credits for total cart")
-    current_user.credits -= total_cost
-    save_m = getattr(current_user, "save", None)
-    if callable(save_m):
-        maybe = save_m()
-        if hasattr(maybe, "__await__"):
-            await maybe
+            return await _place_one(item, now, current_user, stop)
+        except Exception:
+            stop.set()
+            raise
 
-    cart.status = StatusEnum.checked_out
-    if hasattr(cart, "save"):
-        maybe = cart.save()
-        if hasattr(maybe, "__await__"):
-            await maybe
+    # Items touch independent symbols, so place them concurrently within the order rate
+    results = await asyncio.gather(*[place(item) for item in cart.items], return_exceptions=True)
+    placed = [result for result in results if not isinstance(result, BaseException)]
+    placed_cost = sum((item_cost for _, item_cost, _, _ in placed), Decimal("0"))
+
+    # Settle the reservation against the actual fills once, whether or not every item went through
+    if placed_cost != estimate:
+        balance = await _adjust_credits(current_user.id, estimate - placed_cost)
+        if balance is not None:
+            current_user.credits = balance
 
-    return {"message": "Cart checked out successfully", "total_spent": float(total_cost), "num_trades": len(cart.items)}
+    # Fills from every placed item go to Mongo in one insert_many per collection.
+    # Orders and holdings for these items already exist, so record them even if a sibling failed.
+    tx_batch = [tx for _, _, tx_rows, _ in placed for tx in tx_rows]
+    credits_batch = [h for _, _, _, credit_rows in placed for h in credit_rows]
+    writes = []
+    if tx_batch:
+        writes.append(Transaction.insert_many(tx_batch))
+    if credits_batch:
+        writes.append(CreditsHistory.insert_many(credits_batch))
+    await asyncio.gather(*writes)
+
+    failure = next((r for r in results if isinstance(r, BaseException) and not isinstance(r, _NotPlaced)), None)
+    if failure is not None:
+        # The trades that went through are already charged; drop them from the cart, which
+        # stays active with only the unplaced items so a retry can't buy them twice
+        placed_symbols = [item.symbol.upper() for item, result in zip(cart.items, results) if not isinstance(result, BaseException)]
+        cart.items = [item for item, result in zip(cart.items, results) if isinstance(result, BaseException)]
+        await _save(cart)
+        reason = failure.detail if isinstance(failure, HTTPException) else f"Checkout failed: {failure}"
+        raise HTTPException(status_code=400, detail={
+            "message": reason,
+            "placed": placed_symbols,
+            "not_placed": [item.symbol.upper() for item in cart.items],
+            "total_spent": float(placed_cost),
+        })
+
+    cart.status = StatusEnum.checked_out
+    await _save(cart)
 
+    return {"message": "Cart checked out successfully", "total_spent": float(placed_cost), "num_trades": len(cart.items)}
@@ -21,6 +21,7 @@ async def deposit_credits(request: DepositRequest, current_user=Depends(get_curr
     if request.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
 
+    now = datetime.now(timezone.utc)
     current_user.credits += request.amount
     # Avoid awaiting MagicMock (tests) if save is non-async
     save_method = getattr(current_user, "save", None)
@@ -38,7 +39,7 @@ async def deposit_credits(request: DepositRequest, current_user=Depends(get_curr
         history_obj.change_amount = request.amount
         history_obj.reason = request.reason
         history_obj.balance_after = current_user.credits
-        history_obj.created_at = datetime.now(timezone.utc)
+        history_obj.created_at = now
         await CreditsHistory.insert(history_obj)
     else:
         await CreditsHistory.insert(CreditsHistory(
@@ -46,7 +47,7 @@ async def deposit_credits(request: DepositRequest, current_user=Depends(get_curr
             change_amount=request.amount,
             reason=request.reason,
             balance_after=current_user.credits,
-            created_at=datetime.now(timezone.utc)
+            created_at=now
         ))
 
     return {"message": "Credits deposited successfully", "new_balance": float(current_user.credits)}
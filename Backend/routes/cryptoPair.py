@@ -1,49 +1,75 @@
+import asyncio
+import re
 from fastapi import APIRouter, Query, Depends
 from fetch_binance.fetch_cryptoPair import fetch_and_store_binance_symbols
-from typing import Optional
+from services.real_time_price import invalidate_stream_url
+from typing import Annotated, Optional
+from pydantic import BaseModel
 from models import CryptoPair
 from db import get_current_user
 
 router = APIRouter(tags=["Cryptos"])
 
+class CryptoPairListing(BaseModel):
+    """Only the fields the listing endpoints return."""
+    symbol: str
+    base_asset: str
+
+def _prefix_filter(term: str) -> dict:
+    # Symbols and assets are stored upper-case, so an anchored, case-sensitive
+    # prefix can walk the symbol/base_asset indexes instead of scanning every pair
+    pattern = f"^{re.escape(term.strip().upper())}"
+    return {
+        "$or": [
+            {"symbol": {"$regex": pattern}},
+            {"base_asset": {"$regex": pattern}}
+        ]
+    }
+
+
 @router.post("/sync_binance_symbols")
 async def sync_binance_symbols(current_user: dict = Depends(get_current_user)):
     await fetch_and_store_binance_symbols()
+    # Pick up new pairs on the next stream reconnect
+    invalidate_stream_url()
     return {"status": "sync complete"}
 
 @router.get("/cryptos")
 async def get_cryptos(
     skip: int = 0,
     limit: int = 10,
-    search: Optional[str] = Query(None, description="Search by symbol or base_asset")
+    search: Annotated[Optional[str], Query(description="Search by symbol or base_asset")] = None
 ):
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"symbol": {"$regex": search, "$options": "i"}},
-                {"base_asset": {"$regex": search, "$options": "i"}}
-            ]
-        }
-
-    pairs = await CryptoPair.find(query).skip(skip).limit(limit).to_list()
-    total = await CryptoPair.find(query).count()
+    query = _prefix_filter(search) if search else {}
+
+    collection = CryptoPair.get_motor_collection()
+    page = [{"$skip": skip}, {"$limit": limit}, {"$project": {"symbol": 1, "base_asset": 1, "_id": 0}}]
+
+    if not query:
+        # Unfiltered listing: the collection metadata count is exact enough for paging
+        items, total = await asyncio.gather(
+            collection.aggregate(page).to_list(None),
+            collection.estimated_document_count(),
+        )
+        return {"items": items, "total": total}
+
+    # Page and filtered total in one round-trip
+    pipeline = [
+        {"$match": query},
+        {"$facet": {"items": page, "total": [{"$count": "n"}]}},
+    ]
+    result = (await collection.aggregate(pipeline).to_list(1))[0]
 
     return {
-        "items": [{"symbol": p.symbol, "base_asset": p.base_asset} for p in pairs],
-        "total": total
+        "items": result["items"],
+        "total": result["total"][0]["n"] if result["total"] else 0
     }
 
 @router.get("/cryptos/search")
 async def search_cryptos(query: str = Query(..., description="Search by symbol or base asset")):
-    search_filter = {
-        "$or": [
-            {"symbol": {"$regex": query, "$options": "i"}},
-            {"base_asset": {"$regex": query, "$options": "i"}}
-        ]
-    }
+    search_filter = _prefix_filter(query)
 
-    results = await CryptoPair.find(search_filter).to_list()
+    results = await CryptoPair.find(search_filter, projection_model=CryptoPairListing).to_list()
     return [
         {"symbol": pair.symbol, "base_asset": pair.base_asset}
         for pair in results
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends
 from binance_config import client
 from db import get_current_user
@@ -6,7 +7,7 @@ router = APIRouter(tags=["Testnet Balance"])
 
 @router.get("/balance")
 async def get_balance(current_user: dict = Depends(get_current_user)):
-    account_info = client.get_account()
+    account_info = await asyncio.to_thread(client.get_account)
     balances = []
 
     for balance in account_info["balances"]:
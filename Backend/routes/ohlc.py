@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
 from fetch_binance.fetch_ohlc import fetch_historical_data  
 from models import Candle
 from datetime import timedelta, datetime, timezone
 from typing import List
 from db import get_current_user
+import orjson
 router = APIRouter(tags=["Candles"])
 
 VALID_INTERVALS = {
@@ -24,6 +26,35 @@ VALID_INTERVALS = {
     "1M": "1M"
 }
 
+CANDLE_ROW_PROJECTION = {
+    "_id": 0,
+    "symbol": 1,
+    "interval": 1,
+    "time": "$candle_time",
+    "open": {"$toDouble": "$open"},
+    "high": {"$toDouble": "$high"},
+    "low": {"$toDouble": "$low"},
+    "close": {"$toDouble": "$close"},
+    "volume": {"$toDouble": "$volume"},
+}
+
+# Rows serialized per streamed chunk
+STREAM_BATCH_SIZE = 500
+
+async def _json_array_chunks(rows):
+    """Encode an async stream of rows as one JSON array, a batch of rows per chunk."""
+    yield b"["
+    sep = b""
+    batch = []
+    async for row in rows:
+        batch.append(orjson.dumps(row))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield sep + b",".join(batch)
+            sep, batch = b",", []
+    if batch:
+        yield sep + b",".join(batch)
+    yield b"]"
+
 @router.post("/fetch_historical_candles")
 async def trigger_candle_fetch(days_back: int = 30, interval: str = "1d", current_user: dict = Depends(get_current_user)):
     """Trigger fetching of historical candle data for all symbols from Binance API.
@@ -47,23 +78,16 @@ async def get_ohlc_data(symbol: str, days_back: int = Query(30, ge=1)):
     end_time = datetime.now(timezone.utc)
     start_time = end_time - timedelta(days=days_back)
 
-    candles = await Candle.find({
-        "symbol": symbol,
-        "candle_time": {"$gte": start_time, "$lte": end_time}
-    }).sort("candle_time").to_list()
-
-    print(f"{symbol} → Found {len(candles)} candles")
+    # Mongo casts the Decimal128 columns to doubles and shapes each row, so no
+    # Candle documents or Decimals are built just to be turned into floats
+    candles = Candle.aggregate([
+        {"$match": {
+            "symbol": symbol,
+            "candle_time": {"$gte": start_time, "$lte": end_time}
+        }},
+        {"$sort": {"candle_time": 1}},
+        {"$project": CANDLE_ROW_PROJECTION},
+    ])
 
-    return [
-        {
-            "symbol": c.symbol,
-            "interval": c.interval,
-            "time": c.candle_time,
-            "open": float(c.open),
-            "high": float(c.high),
-            "low": float(c.low),
-            "close": float(c.close),
-            "volume": float(c.volume)
-        }
-        for c in candles
-    ]
+    # Stream straight off the cursor so long ranges never sit in memory as one list
+    return StreamingResponse(_json_array_chunks(candles), media_type="application/json")
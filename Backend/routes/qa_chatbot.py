@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from models import OrderRequest
 from db import get_current_user
+import asyncio
 import re
 from chatbot.candle_context_builder import get_candlestick_context
 from chatbot.order_context_builder import is_order_history_request, get_order_history_context
@@ -19,36 +20,27 @@ def expand_date_to_full_day(date_obj):
     end = datetime.combine(date_obj, time.max)
     return start, end
 
+_WS_RE = re.compile(r"\s+")
+# One pass covers both "at market price" and "at limit price <p>"
+_TRADE_RE = re.compile(
+    r"^(buy|sell)\s+([\d.]+)\s+([a-z]+)\s+at\s+(?:(market)\s+price|limit\s+price\s+([\d.]+))$"
+)
+
 def parse_trade_command(text):
-    text = text.strip().lower()
-    text = re.sub(r"\s+", " ", text)
+    text = _WS_RE.sub(" ", text.strip().lower())
 
-    market_pattern = r"^(buy|sell)\s+([\d.]+)\s+([a-z]+)\s+at\s+market\s+price$"
-    limit_pattern = r"^(buy|sell)\s+([\d.]+)\s+([a-z]+)\s+at\s+limit\s+price\s+([\d.]+)$"
+    match = _TRADE_RE.match(text)
+    if not match:
+        return None
 
-    market_match = re.match(market_pattern, text)
-    if market_match:
-        side, qty, symbol = market_match.groups()
-        return {
-            "side": side.upper(),
-            "quantity": float(qty),
-            "symbol": symbol.upper(),
-            "order_type": "MARKET",
-            "price": None
-        }
-
-    limit_match = re.match(limit_pattern, text)
-    if limit_match:
-        side, qty, symbol, price = limit_match.groups()
-        return {
-            "side": side.upper(),
-            "quantity": float(qty),
-            "symbol": symbol.upper(),
-            "order_type": "LIMIT",
-            "price": float(price)
-        }
-
-    return None
+    side, qty, symbol, market, price = match.groups()
+    return {
+        "side": side.upper(),
+        "quantity": float(qty),
+        "symbol": symbol.upper(),
+        "order_type": "MARKET" if market else "LIMIT",
+        "price": None if market else float(price)
+    }
 
 @router.post("/qa")
 async def qa_main(body: dict, current_user=Depends(get_current_user)):
@@ -72,10 +64,10 @@ async def qa_main(body: dict, current_user=Depends(get_current_user)):
 
             # ✅ Enqueue with task queue (support legacy `.send()` for tests)
             enqueue_fn = getattr(process_trade_task, "send", None)
-            if callable(enqueue_fn):
-                enqueue_fn(task_payload)
-            else:
-                process_trade_task.delay(task_payload)
+            if not callable(enqueue_fn):
+                enqueue_fn = process_trade_task.delay
+            # Publishing to the broker is a blocking socket write; keep it off the event loop
+            await asyncio.to_thread(enqueue_fn, task_payload)
 
             return {
                 "question": question,
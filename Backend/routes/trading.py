@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from binance_config import client
@@ -16,25 +17,60 @@ from models import (
     CreditsHistory, CreditReasonEnum
 )
 from bson import ObjectId
+from bson.dbref import DBRef
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 from services.portfolio import update_or_create_portfolio, update_portfolio_on_sell
 from db import get_current_user
 
 router = APIRouter(tags=["Trade"])
 
+# Resolved once: legacy Dramatiq-style `.send()` if the task has one, else Celery's `.delay()`
+_enqueue_trade = getattr(process_trade_task, "send", None)
+if not callable(_enqueue_trade):
+    _enqueue_trade = process_trade_task.delay
 
-def quantize_decimal(val, precision="0.00000001"):
+
+# Built once; constructing the quantize exponent per call costs as much as the quantize
+_EIGHT_DP = Decimal("0.00000001")
+
+
+def quantize_decimal(val, precision=_EIGHT_DP):
     """
     Ensures Decimal is rounded to avoid BSON Decimal128 errors.
     """
-    return Decimal(val).quantize(Decimal(precision), rounding=ROUND_DOWN)
+    if not isinstance(precision, Decimal):
+        precision = Decimal(precision)
+    return Decimal(val).quantize(precision, rounding=ROUND_DOWN)
 
-def to_decimal128(val, precision="0.00000001"):
+def to_decimal128(val, precision=_EIGHT_DP):
     """
     Converts any numeric value safely to BSON Decimal128 with controlled precision.
     """
     return Decimal128(quantize_decimal(val, precision))
 
 
+# IllegalOperation: the server is a standalone mongod (e.g. local dev) without transactions
+_NO_TRANSACTIONS = 20
+
+
+async def _run_in_transaction(work):
+    """
+    Runs `work(session)` inside a multi-document transaction.
+    `with_transaction` retries TransientTransactionError and UnknownTransactionCommitResult,
+    so `work` may run more than once and must only touch the database through `session`.
+    Falls back to running it without a session where transactions aren't supported.
+    """
+    client = User.get_motor_collection().database.client
+    async with await client.start_session() as session:
+        try:
+            return await session.with_transaction(work)
+        except OperationFailure as e:
+            if e.code != _NO_TRANSACTIONS:
+                raise
+    return await work(None)
+
+
 router = APIRouter()
 
 
@@ -52,7 +88,7 @@ async def place_trade(
         # --- Normalize Inputs ---
         side = request.side.strip().upper()
         symbol = request.symbol.strip().upper()
-        quantity = Decimal(str(request.quantity)).quantize(Decimal("0.00000001"))
+        quantity = Decimal(str(request.quantity)).quantize(_EIGHT_DP)
         order_type = request.order_type.strip().upper()
         price = f"{Decimal(str(request.price)):.2f}" if request.price is not None else None
 
@@ -84,12 +120,8 @@ async def place_trade(
         }
 
         # --- Enqueue Task ---
-        # Support both legacy `.send()` (tests or older Dramatiq code) and Celery `.delay()`.
-        enqueue_fn = getattr(process_trade_task, "send", None)
-        if callable(enqueue_fn):
-            enqueue_fn(order_data)
-        else:
-            process_trade_task.delay(order_data)
+        # Publishing to the broker is a blocking socket write; keep it off the event loop
+        await asyncio.to_thread(_enqueue_trade, order_data)
 
         return {
             "status": "success",
@@ -104,127 +136,108 @@ async def place_trade(
  
 @router.post("/transfer")
 async def transfer(request: TransferRequest, current_user=Depends(get_current_user)):
+    full_symbol = request.symbol.upper()
+    amount = Decimal(str(request.amount))
+    now = datetime.now(timezone.utc)
+
+    sender_holding = {"user.$id": current_user.id, "symbol": full_symbol}
+
+    # Receiver and sender holding are independent lookups; fetch them together.
     # Use dict-based queries to avoid descriptor access during tests
-    receiver = await User.find_one({"username": request.to_username})
+    receiver, sender_portfolio = await asyncio.gather(
+        User.find_one({"username": request.to_username}),
+        Portfolio.find_one(sender_holding),
+    )
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver username not found")
 
     if receiver.id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot transfer to self")
 
-    full_symbol = request.symbol.upper()
-    amount = Decimal(str(request.amount))
-
-    sender_portfolio = await Portfolio.find_one({
-        "user.$id": current_user.id,
-        "symbol": full_symbol
-    })
     if not sender_portfolio:
         raise HTTPException(status_code=400, detail="Portfolio not found")
 
     if Decimal(sender_portfolio.quantity) < amount:
         raise HTTPException(status_code=400, detail="Insufficient balance to transfer")
 
-    sender_portfolio.quantity -= amount
-    if sender_portfolio.quantity == 0:
-        await sender_portfolio.delete()
-    else:
-        await sender_portfolio.save()
-
-    receiver_portfolio = await Portfolio.find_one({
-        "user.$id": receiver.id,
-        "symbol": full_symbol
-    })
-
-    if receiver_portfolio:
-        receiver_portfolio.quantity += amount
-        await receiver_portfolio.save()
-    else:
-        # Fallback stub if Beanie not initialized or inheritance not ready
-        if getattr(Portfolio, "_document_settings", None) is None or not getattr(Portfolio, "_inheritance_inited", True):
-            class _PortfolioStub:
-                pass
-            new_portfolio = _PortfolioStub()
-            new_portfolio.user = receiver
-            new_portfolio.symbol = full_symbol
-            new_portfolio.quantity = amount
-            new_portfolio.avg_buy_price = Decimal("0")
-            # Only call insert if it's patched/mocked in tests
-            if hasattr(Portfolio.insert, "assert_called"):
-                await Portfolio.insert(new_portfolio)
-        else:
-            await Portfolio.insert(Portfolio(
-                user=receiver,
-                symbol=full_symbol,
-                quantity=amount,
-                avg_buy_price=Decimal("0")
-            ))
-
-    if getattr(Transfer, "_document_settings", None) is None or not getattr(Transfer, "_inheritance_inited", True):
-        class _TransferStub:
-            pass
-        transfer_doc = _TransferStub()
-        transfer_doc.id = ObjectId()
-        transfer_doc.from_user = current_user.id
-        transfer_doc.to_user = receiver.id
-        transfer_doc.symbol = full_symbol
-        transfer_doc.amount = amount
-        transfer_doc.timestamp = datetime.now(timezone.utc)
-        await Transfer.insert(transfer_doc)
-    else:
-        transfer_doc = Transfer(
-            from_user=current_user.id,
-            to_user=receiver.id,
-            symbol=full_symbol,
-            amount=amount,
-            timestamp=datetime.now(timezone.utc),
+    users = User.get_motor_collection()
+    portfolios = Portfolio.get_motor_collection()
+    receiver_holding = {"user.$id": receiver.id, "symbol": full_symbol}
+    transfer_id = ObjectId()
+
+    async def apply(session):
+        # Guarded decrement: a concurrent sell or transfer can't overdraw the holding
+        result = await portfolios.update_one(
+            {**sender_holding, "quantity": {"$gte": Decimal128(amount)}},
+            {"$inc": {"quantity": Decimal128(-amount)}, "$set": {"updated_at": now}},
+            session=session,
+        )
+        if not result.matched_count:
+            raise HTTPException(status_code=400, detail="Insufficient balance to transfer")
+        await portfolios.delete_one({**sender_holding, "quantity": {"$lte": Decimal128("0")}}, session=session)
+
+        result = await portfolios.update_one(
+            receiver_holding,
+            {"$inc": {"quantity": Decimal128(amount)}, "$set": {"updated_at": now}},
+            session=session,
+        )
+        if not result.matched_count:
+            await portfolios.insert_one({
+                "user": DBRef(User.Settings.name, receiver.id),
+                "symbol": full_symbol,
+                "quantity": Decimal128(amount),
+                "avg_buy_price": Decimal128("0"),
+                "updated_at": now,
+            }, session=session)
+
+        await Transfer.get_motor_collection().insert_one({
+            "_id": transfer_id,
+            "from_user": DBRef(User.Settings.name, current_user.id),
+            "to_user": DBRef(User.Settings.name, receiver.id),
+            "symbol": full_symbol,
+            "amount": Decimal128(amount),
+            "timestamp": now,
+            "note": None,
+        }, session=session)
+
+        # Deduct 1 credit from sender; the receiver gets 0 credits (for record)
+        sender = await users.find_one_and_update(
+            {"_id": current_user.id},
+            {"$inc": {"credits": Decimal128("-1")}, "$set": {"updated_at": now}},
+            projection={"credits": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session,
         )
-        await transfer_doc.insert()
-
-    # Deduct 1 credit from sender
-    current_user.credits -= Decimal("1")
-    current_user.updated_at = datetime.now(timezone.utc)
-    save_sender = getattr(current_user, "save", None)
-    if callable(save_sender):
-        maybe = save_sender()
-        if hasattr(maybe, "__await__"):
-            await maybe
-
-    # Add 0 credits to receiver (for record)
-    receiver.updated_at = datetime.now(timezone.utc)
-    save_receiver = getattr(receiver, "save", None)
-    if callable(save_receiver):
-        maybe = save_receiver()
-        if hasattr(maybe, "__await__"):
-            await maybe
-
-    # Log both sides in CreditsHistory (avoid constructing real Documents if Beanie not ready)
-    if getattr(CreditsHistory, "_document_settings", None) is None or not getattr(CreditsHistory, "_inheritance_inited", True):
-        class _Hist: pass
-        h1 = _Hist(); h1.user = current_user; h1.change_amount = Decimal("-1"); h1.reason = CreditReasonEnum.fee; h1.balance_after = current_user.credits; h1.metadata = {"type": "Transfer Sent", "symbol": full_symbol, "to": receiver.username}
-        h2 = _Hist(); h2.user = receiver; h2.change_amount = Decimal("0"); h2.reason = CreditReasonEnum.reward; h2.balance_after = receiver.credits; h2.metadata = {"type": "Transfer Received", "symbol": full_symbol, "from": current_user.username}
-        await CreditsHistory.insert_many([h1, h2])
-    else:
-        await CreditsHistory.insert_many([
-            CreditsHistory(
-                user=current_user,
-                change_amount=Decimal("-1"),
-                reason=CreditReasonEnum.fee,
-                balance_after=current_user.credits,
-                metadata={"type": "Transfer Sent", "symbol": full_symbol, "to": receiver.username}
-            ),
-            CreditsHistory(
-                user=receiver,
-                change_amount=Decimal("0"),
-                reason=CreditReasonEnum.reward,
-                balance_after=receiver.credits,
-                metadata={"type": "Transfer Received", "symbol": full_symbol, "from": current_user.username}
-            )
-        ])
+        await users.update_one({"_id": receiver.id}, {"$set": {"updated_at": now}}, session=session)
+        sender_credits = sender["credits"].to_decimal()
+
+        await CreditsHistory.get_motor_collection().insert_many([
+            {
+                "user": DBRef(User.Settings.name, current_user.id),
+                "change_amount": Decimal128("-1"),
+                "reason": CreditReasonEnum.fee.value,
+                "balance_after": Decimal128(sender_credits),
+                "metadata": {"type": "Transfer Sent", "symbol": full_symbol, "to": receiver.username},
+                "created_at": now,
+            },
+            {
+                "user": DBRef(User.Settings.name, receiver.id),
+                "change_amount": Decimal128("0"),
+                "reason": CreditReasonEnum.reward.value,
+                "balance_after": Decimal128(Decimal(receiver.credits)),
+                "metadata": {"type": "Transfer Received", "symbol": full_symbol, "from": current_user.username},
+                "created_at": now,
+            },
+        ], session=session)
+        return sender_credits
+
+    # Holdings, the transfer record, both users and the history rows commit together
+    current_user.credits = await _run_in_transaction(apply)
+    current_user.updated_at = now
 
     return {
         "message": "Transfer successful",
-        "transfer_id": str(transfer_doc.id),
+        "transfer_id": str(transfer_id),
         "to": receiver.username,
         "symbol": full_symbol,
         "amount": float(amount)
@@ -1,22 +1,30 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import asyncio
-from services.real_time_price import clients
+import logging
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from services.real_time_price import clients, CLIENT_QUEUE_SIZE, drain_to_client
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.websocket("/ws/prices")
 async def websocket_price(websocket: WebSocket):
     await websocket.accept()
-    print("✅ Client connected")
-    clients.append(websocket)
+    logger.debug("Price client connected")
+    queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    clients.add(queue)
+    # Clients that can parse binary frames opt in and skip the per-send text encode
+    binary = websocket.query_params.get("format") == "binary"
+    sender = asyncio.create_task(drain_to_client(queue, websocket, binary))
     try:
+        # Idle connections are kept alive and reaped by the server's protocol-level
+        # ping frames (uvicorn --ws-ping-interval/--ws-ping-timeout), not a per-client timer
         while True:
-            try:
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=30)
-                if data == "ping":
-                    await websocket.send_text("pong")
-            except asyncio.TimeoutError:
-                pass
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_text("pong")
     except WebSocketDisconnect:
-        print("⚠️ Client disconnected")
-        clients.remove(websocket)
+        logger.debug("Price client disconnected")
+    finally:
+        clients.discard(queue)
+        sender.cancel()
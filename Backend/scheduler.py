@@ -1,5 +1,7 @@
 from fetch_binance.fetch_ohlc import fetch_historical_data
 from fetch_binance.background_jobs import settle_filled_limit_orders
+from fetch_binance.fetch_cryptoPair import fetch_and_store_binance_symbols, refresh_crypto_pair_prices
+from binance_config import client
 import asyncio
 
 async def cron_historical_job():
@@ -18,4 +20,32 @@ async def cron_settle_limit_orders():
             print("Error in settlement cron job:", e)
         await asyncio.sleep(300)  
 
-    
\ No newline at end of file
+    
+
+async def cron_refresh_pair_metadata():
+    # Full symbol/filter refresh; metadata rarely changes
+    while True:
+        try:
+            await fetch_and_store_binance_symbols()
+        except Exception as e:
+            print("Error in pair metadata cron job:", e)
+        await asyncio.sleep(3600)
+
+async def cron_refresh_pair_prices():
+    # Price-only refresh, two fields per pair
+    while True:
+        try:
+            await refresh_crypto_pair_prices()
+        except Exception as e:
+            print("Error in pair price cron job:", e)
+        await asyncio.sleep(60)
+
+async def cron_binance_keepalive():
+    # Ping every 30s so the pooled TLS connection is warm when an order goes out
+    while True:
+        try:
+            if client.is_available():
+                await asyncio.to_thread(client.ping)
+        except Exception as e:
+            print("Error in Binance keep-alive ping:", e)
+        await asyncio.sleep(30)
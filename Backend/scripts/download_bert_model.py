@@ -1,14 +1,19 @@
 import sys
 from pathlib import Path
 
+# Keep this module free of side effects: transformers/torch are only imported
+# inside download_model so tooling that imports the scripts directory stays cheap.
+
 def download_model(src: str, dest: str):
     """
     Download a Hugging Face-style model using transformers and save it to dest.
     src can be a Hugging Face model id (e.g. 'bert-large-uncased-whole-word-masking-finetuned-squad')
     or a local/remote path supported by `from_pretrained`.
+    Weights are stored as fp16 safetensors; the loaders pick their own dtype at load time.
     """
     try:
-        from transformers import BertTokenizer, BertForQuestionAnswering
+        import torch
+        from transformers import AutoTokenizer, AutoModelForQuestionAnswering
     except Exception as e:
         print("transformers not available:", e)
         raise
@@ -17,12 +22,14 @@ def download_model(src: str, dest: str):
     dest_path.mkdir(parents=True, exist_ok=True)
 
     print(f"Downloading tokenizer from {src} to {dest}")
-    tokenizer = BertTokenizer.from_pretrained(src)
+    tokenizer = AutoTokenizer.from_pretrained(src, use_fast=True)
     tokenizer.save_pretrained(dest)
 
     print(f"Downloading model from {src} to {dest}")
-    model = BertForQuestionAnswering.from_pretrained(src)
-    model.save_pretrained(dest)
+    model = AutoModelForQuestionAnswering.from_pretrained(
+        src, torch_dtype=torch.float16, low_cpu_mem_usage=True
+    )
+    model.save_pretrained(dest, safe_serialization=True)
 
 if __name__ == '__main__':
     if len(sys.argv) < 3:
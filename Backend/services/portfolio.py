@@ -2,7 +2,14 @@ from models import Portfolio, User
 from decimal import Decimal
 from datetime import datetime, timezone
 from beanie import PydanticObjectId
+from bson.dbref import DBRef
+from bson.decimal128 import Decimal128
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import asyncio
+import threading
+
+_EIGHT_DP = Decimal("0.00000001")
 
 
 async def update_or_create_portfolio(
@@ -15,37 +22,43 @@ async def update_or_create_portfolio(
     Create or update portfolio entry for user and symbol.
     If the user already holds the symbol, update the quantity and avg buy price.
     Otherwise, insert a new portfolio document.
+    Accepts the user document or its id.
     """
     quantity = Decimal(str(quantity))
     price = Decimal(str(price))
     now = datetime.now(timezone.utc)
-
-    # Check for existing holding
-    portfolio = await Portfolio.find_one({
-        "user.$id": user_link.id,
-        "symbol": symbol
-    })
-
-    if portfolio:
-        # Update existing
-        total_quantity = portfolio.quantity + quantity
-        total_cost = (portfolio.quantity * portfolio.avg_buy_price) + (quantity * price)
-
-        portfolio.quantity = total_quantity
-        portfolio.avg_buy_price = total_cost / total_quantity
-        portfolio.updated_at = now
-
-        await portfolio.save()
-    else:
-        # Insert new holding
-        new_portfolio = Portfolio(
-            user=user_link,
-            symbol=symbol,
-            quantity=quantity,
-            avg_buy_price=price,
-            updated_at=now
-        )
-        await new_portfolio.insert()
+    user_id = getattr(user_link, "id", user_link)
+    portfolios = Portfolio.get_motor_collection()
+
+    # One atomic pipeline update; every expression reads the pre-update
+    # quantity/avg, so concurrent buys can't lose each other's fills
+    added_qty = Decimal128(quantity)
+    new_quantity = {"$add": ["$quantity", added_qty]}
+    update = [{"$set": {
+        "avg_buy_price": {"$divide": [
+            {"$add": [{"$multiply": ["$quantity", "$avg_buy_price"]}, Decimal128(quantity * price)]},
+            new_quantity,
+        ]},
+        "quantity": new_quantity,
+        "updated_at": now,
+    }}]
+
+    for _ in range(2):
+        result = await portfolios.update_one({"user.$id": user_id, "symbol": symbol}, update)
+        if result.matched_count:
+            return
+        try:
+            await portfolios.insert_one({
+                "user": DBRef(User.Settings.name, user_id),
+                "symbol": symbol,
+                "quantity": added_qty,
+                "avg_buy_price": Decimal128(price),
+                "updated_at": now,
+            })
+            return
+        except DuplicateKeyError:
+            # Another request opened this holding first; fold into it
+            continue
 
 
 async def update_portfolio_on_sell(
@@ -57,38 +70,39 @@ async def update_portfolio_on_sell(
     Deduct quantity from user's portfolio for a SELL action.
     Deletes the document if quantity reaches zero.
     """
-    quantity_sold = Decimal(str(quantity_sold)).quantize(Decimal("0.00000001"))
+    quantity_sold = Decimal(str(quantity_sold)).quantize(_EIGHT_DP)
     now = datetime.now(timezone.utc)
-
-    # Find existing holding
-    portfolio = await Portfolio.find_one({
-        "user.$id": user_id,
-        "symbol": symbol
-    })
-
-    if not portfolio:
-        raise ValueError(f"No holdings found for symbol '{symbol}'. Cannot process sell.")
-
-    if portfolio.quantity < quantity_sold:
+    portfolios = Portfolio.get_motor_collection()
+    holding_filter = {"user.$id": user_id, "symbol": symbol}
+
+    # Guarded decrement: only matches while enough is held, so two concurrent
+    # sells can never both spend the same quantity
+    portfolio = await portfolios.find_one_and_update(
+        {**holding_filter, "quantity": {"$gte": Decimal128(quantity_sold)}},
+        {"$inc": {"quantity": Decimal128(-quantity_sold)}, "$set": {"updated_at": now}},
+        projection={"quantity": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+    if portfolio is None:
+        existing = await portfolios.find_one(holding_filter, {"quantity": 1})
+        if not existing:
+            raise ValueError(f"No holdings found for symbol '{symbol}'. Cannot process sell.")
         raise ValueError(
-            f"Insufficient quantity: have {portfolio.quantity}, trying to sell {quantity_sold}."
+            f"Insufficient quantity: have {existing['quantity'].to_decimal()}, trying to sell {quantity_sold}."
         )
 
-    # Calculate new quantity
-    new_quantity = (portfolio.quantity - quantity_sold).quantize(Decimal("0.00000001"))
+    new_quantity = portfolio["quantity"].to_decimal().quantize(_EIGHT_DP)
 
     if new_quantity <= 0:
-        await portfolio.delete()
+        # Only drop the holding if no buy has landed since the decrement
+        await portfolios.delete_one({"_id": portfolio["_id"], "quantity": {"$lte": Decimal128("0")}})
         return {
             "status": "deleted",
             "symbol": symbol,
             "sold": str(quantity_sold)
         }
 
-    portfolio.quantity = new_quantity
-    portfolio.updated_at = now
-    await portfolio.save()
-
     return {
         "status": "updated",
         "symbol": symbol,
@@ -104,8 +118,29 @@ async def get_user_by_id(user_id: str) -> User:
     return await User.get(user_id)
 
 
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def _ensure_sync_loop():
+    """Start (once) the background event loop that sync callers dispatch onto.
+
+    Reusing one loop keeps Motor's connections bound to a live loop instead of
+    bringing a fresh loop up and down on every call.
+    """
+    global _sync_loop
+    if _sync_loop is None:
+        # Worker threads may race here; re-check under the lock so only one loop starts
+        with _sync_loop_lock:
+            if _sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True).start()
+                _sync_loop = loop
+    return _sync_loop
+
+
 def get_user_by_id_sync(user_id: str) -> User:
     """
     Sync helper to fetch User with asyncio.
     """
-    return asyncio.run(get_user_by_id(user_id))
+    return asyncio.run_coroutine_threadsafe(get_user_by_id(user_id), _ensure_sync_loop()).result()
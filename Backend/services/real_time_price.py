@@ -1,45 +1,85 @@
 import asyncio
-import json
+import logging
+import time
+import orjson
 import websockets
 from models import CryptoPair
 from beanie import PydanticObjectId
 
-clients = []
+logger = logging.getLogger(__name__)
+
+# One bounded outbound queue per connected websocket; each socket drains its own
+# queue, so a slow client only ever backs up itself
+clients: set[asyncio.Queue] = set()
+CLIENT_QUEUE_SIZE = 100
+
+# The symbol set changes rarely, so reconnects reuse the URL instead of rescanning pairs
+STREAM_URL_TTL_SECONDS = 300
+_stream_url_cache = None  # (monotonic timestamp, url)
+
+def invalidate_stream_url():
+    global _stream_url_cache
+    _stream_url_cache = None
 
 async def build_stream_url():
-    crypto_pairs = await CryptoPair.find_all().to_list()
-    symbols = [pair.symbol.lower() for pair in crypto_pairs]
+    global _stream_url_cache
+    if _stream_url_cache and time.monotonic() - _stream_url_cache[0] < STREAM_URL_TTL_SECONDS:
+        return _stream_url_cache[1]
+
+    # Only the symbols are needed; skip hydrating full CryptoPair documents
+    cursor = CryptoPair.get_motor_collection().find({}, {"symbol": 1, "_id": 0})
+    symbols = [doc["symbol"].lower() for doc in await cursor.to_list(length=None)]
     if not symbols:
         return None
     stream_path = "/".join([f"{s}@ticker" for s in symbols])
-    return f"wss://stream.binance.com:9443/stream?streams={stream_path}"
+    url = f"wss://stream.binance.com:9443/stream?streams={stream_path}"
+    _stream_url_cache = (time.monotonic(), url)
+    return url
+
+def broadcast(frame: bytes):
+    # Encoded once per tick: text clients share one decoded str, binary clients the raw bytes
+    message = (frame.decode(), frame)
+    for queue in clients:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Only the latest ticks matter; drop the oldest to make room
+            queue.get_nowait()
+            queue.put_nowait(message)
+
+async def drain_to_client(queue: asyncio.Queue, websocket, binary: bool = False):
+    while True:
+        text, raw = await queue.get()
+        try:
+            if binary:
+                await websocket.send_bytes(raw)
+            else:
+                await websocket.send_text(text)
+        except Exception as e:
+            logger.debug("Dropping price client after failed send", exc_info=e)
+            clients.discard(queue)
+            return
 
 async def binance_stream():
     while True:
         try:
-            print("🌐 Binance stream connecting...")
+            logger.info("Binance stream connecting")
             url = await build_stream_url()
             if not url:
-                print("⚠️ No symbols found in DB to stream. Retrying in 30s.")
+                logger.warning("No symbols found in DB to stream; retrying in 30s")
                 await asyncio.sleep(30)
                 continue
 
             async with websockets.connect(url) as websocket:
-                print(f" Connected to Binance (stream established).")
+                logger.info("Connected to Binance (stream established)")
                 while True:
                     message = await websocket.recv()
-                    data = json.loads(message)
+                    data = orjson.loads(message)
                     payload = data.get("data")
 
                     if payload:
-                        for client in clients.copy():
-                            try:
-                                await client.send_text(json.dumps(payload))
-                            except Exception as e:
-                                print("❌ Error sending to client:", e)
-                                clients.remove(client)
+                        broadcast(orjson.dumps(payload))
 
         except Exception as e:
-            print(f"❌ Binance stream error: {e}")
-            print("🔁 Reconnecting in 10 seconds...")
+            logger.warning("Binance stream error: %s; reconnecting in 10s", e)
             await asyncio.sleep(10)
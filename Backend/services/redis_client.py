@@ -1,7 +1,11 @@
 import os
 import re
 from urllib.parse import urlparse
-import redis
+import redis.asyncio as aioredis
+
+
+# Matches the `-u <uri>` argument of a pasted redis-cli invocation
+_UTAG_RE = re.compile(r"-u\s+([^\s]+)")
 
 
 def _normalize_redis_env(value: str) -> str:
@@ -13,7 +17,7 @@ def _normalize_redis_env(value: str) -> str:
     if not value:
         return value
     s = value.strip()
-    m = re.search(r"-u\s+([^\s]+)", s)
+    m = _UTAG_RE.search(s)
     if m:
         s = m.group(1)
     if "--tls" in value and s.startswith("redis://"):
@@ -62,7 +66,8 @@ try:
         if ca_path:
             ssl_kwargs["ssl_ca_certs"] = ca_path
 
-    redis_client = redis.from_url(REDIS_URL, decode_responses=True, **ssl_kwargs)
+    # Async client; every caller runs on the event loop
+    redis_client = aioredis.from_url(REDIS_URL, decode_responses=True, **ssl_kwargs)
 except Exception:
     # Fallback to localhost if parsing fails
-    redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+    redis_client = aioredis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
@@ -1,16 +1,33 @@
-import json
+import asyncio
+import orjson
 from datetime import datetime, timedelta, timezone
 from services.redis_client import redis_client
 from models import Cache
 
+# Keeps fire-and-forget refills referenced until they finish
+_pending_refills = set()
+
+def _refill_done(task):
+    _pending_refills.discard(task)
+    if not task.cancelled() and task.exception():
+        print(f"⚠️ Session cache refill failed: {task.exception()}")
+
+def _refill_in_background(redis_key: str, ttl: int, value):
+    task = asyncio.create_task(redis_client.setex(redis_key, ttl, orjson.dumps(value)))
+    _pending_refills.add(task)
+    task.add_done_callback(_refill_done)
+
 async def store_session(user_id: str, data: dict, expiry_minutes: int):
     redis_key = f"user_session:{user_id}"
     expiry_seconds = expiry_minutes * 60
 
-    redis_client.setex(redis_key, expiry_seconds, json.dumps(data))
-
     expires_at = datetime.now(timezone.utc) + timedelta(seconds=expiry_seconds)
-    existing = await Cache.find_one(Cache.key == redis_key)
+
+    # The Redis write and the Mongo lookup are independent; overlap them
+    _, existing = await asyncio.gather(
+        redis_client.setex(redis_key, expiry_seconds, orjson.dumps(data)),
+        Cache.find_one(Cache.key == redis_key),
+    )
     if existing:
         existing.value = data
         existing.expires_at = expires_at
@@ -25,15 +42,17 @@ async def store_session(user_id: str, data: dict, expiry_minutes: int):
 async def get_session(user_id: str):
     redis_key = f"user_session:{user_id}"
     # ✅ Check Redis first
-    session_data = redis_client.get(redis_key)
+    session_data = await redis_client.get(redis_key)
     if session_data:
-        return json.loads(session_data)
+        return orjson.loads(session_data)
 
 
     doc = await Cache.find_one(Cache.key == redis_key)
-    if doc and doc.expires_at > datetime.now(timezone.utc):
-        ttl = int((doc.expires_at - datetime.now(timezone.utc)).total_seconds())
-        redis_client.setex(redis_key, ttl, json.dumps(doc.value))
+    now = datetime.now(timezone.utc)
+    if doc and doc.expires_at > now:
+        ttl = int((doc.expires_at - now).total_seconds())
+        # Refill Redis without holding up the request on another round trip
+        _refill_in_background(redis_key, ttl, doc.value)
         return doc.value
 
     return None
\ No newline at end of file
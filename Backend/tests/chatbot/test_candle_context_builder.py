@@ -16,7 +16,7 @@ class FakeQuery:
 
 class FakeCandle:
     @staticmethod
-    def find(query):
+    def find(query, **kwargs):
         # default placeholder, tests will monkeypatch by replacing this method
         return FakeQuery([])
 
@@ -24,7 +24,7 @@ class FakeCandle:
 async def test_get_candlestick_context_returns_none_when_no_candles(monkeypatch):
     # Arrange
     monkeypatch.setattr(ccb, 'Candle', FakeCandle)
-    monkeypatch.setattr(FakeCandle, 'find', staticmethod(lambda q: FakeQuery([])))
+    monkeypatch.setattr(FakeCandle, 'find', staticmethod(lambda q, **kw: FakeQuery([])))
 
     # Act
     res = await ccb.get_candlestick_context('BTCUSDT', '2020-01-01', '2020-01-02')
@@ -46,7 +46,7 @@ async def test_get_candlestick_context_formats_candles(monkeypatch):
     )
 
     monkeypatch.setattr(ccb, 'Candle', FakeCandle)
-    monkeypatch.setattr(FakeCandle, 'find', staticmethod(lambda q: FakeQuery([candle])))
+    monkeypatch.setattr(FakeCandle, 'find', staticmethod(lambda q, **kw: FakeQuery([candle])))
 
     # Act
     res = await ccb.get_candlestick_context('BTCUSDT', '2020-01-01', '2020-01-02')
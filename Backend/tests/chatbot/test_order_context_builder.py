@@ -20,13 +20,13 @@ class FakeOrder:
     user = __import__('types').SimpleNamespace(id=None)
 
     @staticmethod
-    def find(expr):
+    def find(expr, **kwargs):
         return FakeQuery([])
 
 @pytest.mark.asyncio
 async def test_get_order_history_context_returns_none_when_no_orders(monkeypatch):
     monkeypatch.setattr(ocb, 'Order', FakeOrder)
-    monkeypatch.setattr(FakeOrder, 'find', staticmethod(lambda e: FakeQuery([])))
+    monkeypatch.setattr(FakeOrder, 'find', staticmethod(lambda e, **kw: FakeQuery([])))
 
     user = SimpleNamespace(id='user1')
     res = await ocb.get_order_history_context(user)
@@ -39,14 +39,13 @@ async def test_get_order_history_context_returns_lines(monkeypatch):
     order2 = SimpleNamespace(symbol='ETHUSDT', quantity=2.0, price=200.0)
 
     monkeypatch.setattr(ocb, 'Order', FakeOrder)
-    monkeypatch.setattr(FakeOrder, 'find', staticmethod(lambda e: FakeQuery([order1, order2])))
+    monkeypatch.setattr(FakeOrder, 'find', staticmethod(lambda e, **kw: FakeQuery([order1, order2])))
 
     user = SimpleNamespace(id='u')
     res = await ocb.get_order_history_context(user)
 
-    assert isinstance(res, list)
-    assert any('BTCUSDT' in s for s in res)
-    assert any('ETHUSDT' in s for s in res)
+    assert isinstance(res, str)
+    assert res.splitlines() == ['BTCUSDT | 1.23 @ 100.0', 'ETHUSDT | 2.0 @ 200.0']
 
 def test_is_order_history_request_positive():
     assert ocb.is_order_history_request('Can you show my order history?')
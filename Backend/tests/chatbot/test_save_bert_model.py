@@ -1,9 +1,13 @@
 import importlib
+import os
 import sys
 import types
 
+import pytest
 
-def test_save_bert_model_invokes_save_pretrained(monkeypatch):
+
+@pytest.fixture
+def save_bert_env(monkeypatch):
     fake_transformers = types.SimpleNamespace()
     fake_transformers.saved_paths = []
 
@@ -25,17 +29,23 @@ def test_save_bert_model_invokes_save_pretrained(monkeypatch):
             inst.save_pretrained = save_pretrained
             return inst
 
-    fake_transformers.BertTokenizer = FakeTokenizer
-    fake_transformers.BertForQuestionAnswering = FakeModel
+    fake_transformers.AutoTokenizer = FakeTokenizer
+    fake_transformers.AutoModelForQuestionAnswering = FakeModel
 
     monkeypatch.setitem(sys.modules, 'transformers', fake_transformers)
-
-    # Import the module under test (it will call save_pretrained at import time)
-    if 'chatbot.save_bert_model' in sys.modules:
-        importlib.reload(sys.modules['chatbot.save_bert_model'])
-    else:
-        importlib.import_module('chatbot.save_bert_model')
-
-    # Assert that save_pretrained was called twice (tokenizer and model)
-    assert ('tokenizer', './bert_squad_model') in fake_transformers.saved_paths
-    assert ('model', './bert_squad_model') in fake_transformers.saved_paths
+    # A None entry makes `from optimum.onnxruntime import ...` raise ImportError
+    monkeypatch.setitem(sys.modules, 'optimum.onnxruntime', None)
+
+    # Pop instead of reload so the module body runs fresh against the fakes exactly once
+    sys.modules.pop('chatbot.save_bert_model', None)
+    module = importlib.import_module('chatbot.save_bert_model')
+    module.main()
+    yield fake_transformers.saved_paths
+    sys.modules.pop('chatbot.save_bert_model', None)
+
+
+def test_save_bert_model_invokes_save_pretrained(save_bert_env):
+    out_dir = os.path.abspath('./bert_squad_model')
+    assert ('tokenizer', out_dir) in save_bert_env
+    assert ('model', out_dir) in save_bert_env
+    assert len(save_bert_env) == 2
@@ -26,3 +26,17 @@ def test_no_symbol_returns_none_symbol():
     symbol, date = extract_symbol_and_date(q)
     assert symbol is None
     assert date == datetime.date(2025,6,15)
+
+def test_month_name_with_explicit_year_overrides_default():
+    q = 'ETHUSDT on March 3 2024'
+    symbol, date = extract_symbol_and_date(q)
+    assert symbol == 'ETHUSDT'
+    assert date == datetime.date(2024,3,3)
+
+def test_symbol_found_when_lowercase_or_followed_by_punctuation():
+    assert extract_symbol_and_date('how did btcusdt do?')[0] == 'BTCUSDT'
+    assert extract_symbol_and_date('Compare BTCUSDT, ETHUSDT')[0] == 'BTCUSDT'
+
+def test_invalid_month_name_date_returns_none():
+    assert extract_symbol_and_date('BTCUSDT on Smarch 3')[1] is None
+    assert extract_symbol_and_date('BTCUSDT on February 30 2025')[1] is None
@@ -41,6 +41,17 @@ def base_mock_user(mock_object_id):
     return user
 
 
+_DEFAULT_BALANCES = [
+    {"asset": "BTC", "free": "1.0", "locked": "0.0"},
+    {"asset": "USDT", "free": "10000.0", "locked": "0.0"}
+]
+_DEFAULT_ORDER = {
+    "orderId": 12345,
+    "status": "FILLED",
+    "fills": [{"qty": "0.5", "price": "50000.00"}]
+}
+
+
 @pytest.fixture
 def mock_binance_client_factory():
     """
@@ -51,34 +62,15 @@ def mock_binance_client_factory():
         account_balances=None,
         order_response=None
     ):
+        # MagicMock creates the child mocks on first access; only set return values
         client = MagicMock()
-        
-        # Default ticker response
-        client.get_symbol_ticker = MagicMock(
-            return_value={"price": ticker_price}
-        )
-        
-        # Default account info
-        if account_balances is None:
-            account_balances = [
-                {"asset": "BTC", "free": "1.0", "locked": "0.0"},
-                {"asset": "USDT", "free": "10000.0", "locked": "0.0"}
-            ]
-        client.get_account = MagicMock(
-            return_value={"balances": account_balances}
-        )
-        
-        # Default order response
-        if order_response is None:
-            order_response = {
-                "orderId": 12345,
-                "status": "FILLED",
-                "fills": [{"qty": "0.5", "price": "50000.00"}]
-            }
-        client.create_order = MagicMock(return_value=order_response)
-        
+        client.get_symbol_ticker.return_value = {"price": ticker_price}
+        client.get_account.return_value = {
+            "balances": _DEFAULT_BALANCES if account_balances is None else account_balances
+        }
+        client.create_order.return_value = _DEFAULT_ORDER if order_response is None else order_response
         return client
-    
+
     return create_mock_client
 
 
@@ -101,6 +93,111 @@ def mock_database_query():
     return query
 
 
+@pytest.fixture(scope="session")
+def fake_qa_module():
+    """
+    Import ``chatbot.qa_utils`` once against fake ``transformers``/``torch``
+    modules so its import-time model loading runs without the real libraries.
+    The fakes are only in ``sys.modules`` for the import itself; the module keeps
+    its own references to them.
+    """
+    import importlib
+    import types
+    from types import SimpleNamespace
+
+    # Create a fake transformers module
+    fake_transformers = types.SimpleNamespace()
+
+    class FakeTokenizer:
+        @classmethod
+        def from_pretrained(cls, path, **kwargs):
+            inst = cls()
+            def encode_plus(question, context, return_tensors, truncation, max_length):
+                # return a mapping where each value has a .to(device) method
+                class T:
+                    def __init__(self, data):
+                        self._data = data
+                    def to(self, device):
+                        return self
+                    def __getitem__(self, i):
+                        return self._data[i]
+                return {"input_ids": T([[101, 102, 103, 104]])}
+            inst.encode_plus = encode_plus
+            vocab = {101: '[CLS]', 102: 'The', 103: 'answer', 104: 'is'}
+            # Decode the given id span, dropping special tokens like the real tokenizer
+            inst.decode = lambda ids, skip_special_tokens=False, **kwargs: ' '.join(
+                vocab[i] for i in ids if not (skip_special_tokens and vocab[i].startswith('['))
+            )
+            return inst
+
+    class FakeModel:
+        @classmethod
+        def from_pretrained(cls, path, **kwargs):
+            # return an instance of FakeModel which is callable via its class __call__
+            inst = cls()
+            # Provide .to() and .eval() used at module import time
+            inst.to = lambda device: inst
+            inst.eval = lambda: None
+            return inst
+
+        def __call__(self, **inputs):
+            # return an object with start_logits and end_logits that are iterable
+            return SimpleNamespace(start_logits=[0, 0, 10, 0], end_logits=[0, 0, 0, 10])
+
+    fake_transformers.BertTokenizerFast = FakeTokenizer
+    fake_transformers.BertForQuestionAnswering = FakeModel
+
+    # Create a fake torch module
+    fake_torch = types.SimpleNamespace()
+
+    def device(expr):
+        return 'cpu'
+    fake_torch.device = device
+
+    # Provide a simple `cuda` namespace with `is_available()` to match calls
+    fake_torch.cuda = types.SimpleNamespace(is_available=lambda: False)
+
+    class NoGrad:
+        def __enter__(self):
+            return None
+        def __exit__(self, exc_type, exc, tb):
+            return False
+    fake_torch.no_grad = lambda : NoGrad()
+    fake_torch.inference_mode = lambda : NoGrad()
+    fake_torch.float16 = 'float16'
+    fake_torch.float32 = 'float32'
+    fake_torch.qint8 = 'qint8'
+    fake_torch.nn = types.SimpleNamespace(Linear=object)
+    fake_torch.quantized = []
+
+    def quantize_dynamic(model, qconfig_spec, dtype):
+        fake_torch.quantized.append((qconfig_spec, dtype))
+        return model
+    fake_torch.ao = types.SimpleNamespace(quantization=types.SimpleNamespace(quantize_dynamic=quantize_dynamic))
+
+    def argmax(seq, dim=None):
+        # seq is an iterable (list); return object that has .item()
+        idx = list(seq).index(max(seq))
+        return SimpleNamespace(item=lambda: idx)
+    fake_torch.argmax = argmax
+
+    fakes = {'transformers': fake_transformers, 'torch': fake_torch}
+    saved = {name: sys.modules.get(name) for name in (*fakes, 'chatbot.qa_utils')}
+    # Drop any stub another test module installed so the real module body runs
+    sys.modules.pop('chatbot.qa_utils', None)
+    sys.modules.update(fakes)
+    try:
+        qa_utils = importlib.import_module('chatbot.qa_utils')
+    finally:
+        # Put the real entries back right away so later imports never see the fakes
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+    yield qa_utils
+
+
 # Pytest configuration
 def pytest_configure(config):
     """Configure pytest with custom markers."""
@@ -19,6 +19,13 @@ def test_decimal128_to_decimal_returns_decimal_for_other_values():
     assert str(res) == "5.5"
 
 
+def test_decimal128_to_decimal_passes_through_decimal_and_int():
+    d = Decimal("1.25")
+    assert background_jobs.decimal128_to_decimal(d) is d
+    assert background_jobs.decimal128_to_decimal(3) == Decimal(3)
+
+
+@patch("fetch_binance.background_jobs.User")
 @patch("fetch_binance.background_jobs.Order")
 @patch("fetch_binance.background_jobs.client")
 @patch("fetch_binance.background_jobs.Transaction")
@@ -27,7 +34,7 @@ def test_decimal128_to_decimal_returns_decimal_for_other_values():
 @patch("fetch_binance.background_jobs.update_portfolio_on_sell")
 @pytest.mark.asyncio
 async def test_settle_filled_limit_orders_handles_buy_and_records_transactions(
-    mock_update_sell, mock_update_buy, mock_credits, mock_transaction, mock_client, mock_order_class
+    mock_update_sell, mock_update_buy, mock_credits, mock_transaction, mock_client, mock_order_class, mock_user_class
 ):
     """When Binance reports a filled order with fills, transactions are created and portfolio updated."""
     # Prepare one order
@@ -38,8 +45,7 @@ async def test_settle_filled_limit_orders_handles_buy_and_records_transactions(
     order.side = "BUY"
     order.quantity = Decimal128("0.1")
     order.price = Decimal128("40000")
-    order.fetch_link = AsyncMock()
-    order.save = AsyncMock()
+    order.user_id = "user1"
 
     # User associated with order
     user = MagicMock()
@@ -47,36 +53,44 @@ async def test_settle_filled_limit_orders_handles_buy_and_records_transactions(
     user.credits = Decimal128("100000")
     user.save = AsyncMock()
 
-    order.user = user
-
     mock_query = MagicMock()
     mock_query.to_list = AsyncMock(return_value=[order])
     mock_order_class.find.return_value = mock_query
+    mock_order_class.find_one.return_value.update = AsyncMock()
+
+    mock_user_query = MagicMock()
+    mock_user_query.to_list = AsyncMock(return_value=[user])
+    mock_user_class.find.return_value = mock_user_query
 
     # Binance returns a filled order with fills
     binance_order = {
+        "orderId": 123,
         "status": "FILLED",
         "fills": [{"qty": "0.1", "price": "40000"}]
     }
-    mock_client.get_order.return_value = binance_order
+    mock_client.get_all_orders.return_value = [binance_order]
 
-    # Patch inserts
-    mock_transaction.insert = AsyncMock()
-    mock_credits.insert = AsyncMock()
+    # Patch batched inserts
+    mock_transaction.insert_many = AsyncMock()
+    mock_credits.insert_many = AsyncMock()
 
     await background_jobs.settle_filled_limit_orders()
 
-    # Ensure transaction insert was called
-    assert mock_transaction.insert.await_count >= 1
+    # Ensure fills were written in one batch and credits history flushed once
+    mock_transaction.insert_many.assert_awaited_once()
+    assert len(mock_transaction.insert_many.await_args[0][0]) == 1
+    mock_credits.insert_many.assert_awaited_once()
+    mock_client.get_all_orders.assert_called_once_with(symbol="BTCUSDT", orderId=123, limit=1000)
     mock_update_buy.assert_called_once()
-    order.save.assert_called_once()
+    mock_order_class.find_one.return_value.update.assert_awaited_once()
     user.save.assert_called_once()
 
 
+@patch("fetch_binance.background_jobs.User")
 @patch("fetch_binance.background_jobs.Order")
 @patch("fetch_binance.background_jobs.client")
 @pytest.mark.asyncio
-async def test_settle_filled_limit_orders_skips_if_insufficient_credits(mock_client, mock_order_class):
+async def test_settle_filled_limit_orders_skips_if_insufficient_credits(mock_client, mock_order_class, mock_user_class):
     """If user doesn't have enough credits, settlement should be skipped for BUY."""
     order = MagicMock()
     order.id = "ord2"
@@ -85,24 +99,61 @@ async def test_settle_filled_limit_orders_skips_if_insufficient_credits(mock_cli
     order.side = "BUY"
     order.quantity = Decimal128("1")
     order.price = Decimal128("50000")
-    order.fetch_link = AsyncMock()
-    order.save = AsyncMock()
+    order.user_id = "user2"
 
     user = MagicMock()
     user.id = "user2"
     user.credits = Decimal128("10")  # insufficient
     user.save = AsyncMock()
-    order.user = user
 
     mock_query = MagicMock()
     mock_query.to_list = AsyncMock(return_value=[order])
     mock_order_class.find.return_value = mock_query
+    mock_order_class.find_one.return_value.update = AsyncMock()
+
+    mock_user_query = MagicMock()
+    mock_user_query.to_list = AsyncMock(return_value=[user])
+    mock_user_class.find.return_value = mock_user_query
 
-    binance_order = {"status": "FILLED", "fills": [{"qty": "1", "price": "50000"}]}
-    mock_client.get_order.return_value = binance_order
+    binance_order = {"orderId": 456, "status": "FILLED", "fills": [{"qty": "1", "price": "50000"}]}
+    mock_client.get_all_orders.return_value = [binance_order]
 
     # Ensure function runs without raising and does not mark order FILLED
     await background_jobs.settle_filled_limit_orders()
 
-    # If credits insufficient, order.status should not be set to FILLED
-    assert order.status != "FILLED"
+    # If credits insufficient, the order should not be marked FILLED
+    mock_order_class.find_one.return_value.update.assert_not_awaited()
+    user.save.assert_not_called()
+
+
+def test_decimal128_to_decimal_reuses_cached_value_for_equal_bits():
+    first = background_jobs.decimal128_to_decimal(Decimal128("40000.5"))
+    second = background_jobs.decimal128_to_decimal(Decimal128("40000.5"))
+    assert first == Decimal("40000.5")
+    assert second is first
+
+
+@patch("fetch_binance.background_jobs.client")
+def test_fetch_binance_orders_pages_past_an_old_open_order(mock_client):
+    """An old unfilled order pins the start; later pages still reach the newer local ids."""
+    first_page = [{"orderId": i, "status": "FILLED"} for i in range(100, 1100)]
+    second_page = [{"orderId": 5000, "status": "NEW"}, {"orderId": 5001, "status": "FILLED"}]
+    mock_client.get_all_orders.side_effect = [first_page, second_page]
+
+    found = background_jobs._fetch_binance_orders("BTCUSDT", [100, 5001])
+
+    assert sorted(o["orderId"] for o in found) == [100, 5001]
+    calls = mock_client.get_all_orders.call_args_list
+    assert calls[0].kwargs == {"symbol": "BTCUSDT", "orderId": 100, "limit": 1000}
+    # The second page jumps straight to the next missing id instead of walking every order
+    assert calls[1].kwargs == {"symbol": "BTCUSDT", "orderId": 5001, "limit": 1000}
+
+
+@patch("fetch_binance.background_jobs.client")
+def test_fetch_binance_orders_stops_when_binance_runs_out(mock_client):
+    mock_client.get_all_orders.return_value = [{"orderId": 7, "status": "NEW"}]
+
+    found = background_jobs._fetch_binance_orders("ETHUSDT", [7, 9])
+
+    assert [o["orderId"] for o in found] == [7]
+    mock_client.get_all_orders.assert_called_once()
@@ -1,3 +1,4 @@
+import json
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from decimal import Decimal
@@ -23,12 +24,39 @@ def test_to_decimal128_converts_decimal_and_str():
     res2 = fetch_cryptoPair.to_decimal128("3.75")
     assert isinstance(res2, Decimal128)
 
+    res3 = fetch_cryptoPair.to_decimal128(4)
+    assert res3 == Decimal128("4")
+
+
+def test_filter_strings_are_memoized_but_prices_are_not():
+    fetch_cryptoPair._decimal128_from_str.cache_clear()
+    first = fetch_cryptoPair._decimal128_from_str("0.00001000")
+    assert first == Decimal128("0.00001000")
+    assert fetch_cryptoPair._decimal128_from_str("0.00001000") is first
+
+    fetch_cryptoPair.to_decimal128("50000.12")
+    assert fetch_cryptoPair._decimal128_from_str.cache_info().currsize == 1
+
+
+@pytest.fixture(autouse=True)
+def mock_redis():
+    """Start every test with an empty exchange-info cache."""
+    with patch("fetch_binance.fetch_cryptoPair.redis_client") as mock_redis:
+        mock_redis.get.return_value = None
+        yield mock_redis
+
+
+def _bulk_write_mock(mock_crypto_class):
+    bulk_write = AsyncMock()
+    mock_crypto_class.get_motor_collection.return_value.with_options.return_value.bulk_write = bulk_write
+    return bulk_write
+
 
 @patch("fetch_binance.fetch_cryptoPair.binance_client")
 @patch("fetch_binance.fetch_cryptoPair.CryptoPair")
 @pytest.mark.asyncio
-async def test_fetch_and_store_inserts_new_and_updates_existing(mock_crypto_class, mock_client):
-    """fetch_and_store_binance_symbols should insert new docs and update existing ones."""
+async def test_fetch_and_store_upserts_only_trading_usdt_pairs(mock_crypto_class, mock_client):
+    """fetch_and_store_binance_symbols should upsert eligible pairs in a single bulk_write."""
     # Build fake exchange info with a mix of symbols
     exchange_info = {
         "symbols": [
@@ -41,36 +69,97 @@ async def test_fetch_and_store_inserts_new_and_updates_existing(mock_crypto_clas
     }
 
     mock_client.get_exchange_info.return_value = exchange_info
-    mock_client.get_symbol_ticker.side_effect = lambda symbol: {"price": "50000"} if symbol == "BTCUSDT" else {}
+    mock_client.get_all_tickers.return_value = [{"symbol": "BTCUSDT", "price": "50000"}]
+    bulk_write = _bulk_write_mock(mock_crypto_class)
+
+    await fetch_cryptoPair.fetch_and_store_binance_symbols()
 
-    # No existing doc for BTCUSDT
-    mock_crypto_class.find_one = AsyncMock(return_value=None)
+    bulk_write.assert_awaited_once()
+    ops = bulk_write.await_args.args[0]
+    assert bulk_write.await_args.kwargs == {"ordered": False}
+    assert len(ops) == 1
+    assert ops[0]._filter == {"symbol": "BTCUSDT"}
+    assert ops[0]._upsert is True
+    [stage] = ops[0]._doc
+    fields = stage["$set"]
+    assert fields["last_price"] == Decimal128("50000")
+    assert fields["min_qty"] == Decimal128("0.001")
+    assert fields["base_asset"] == "BTC"
+    assert fields["created_at"]["$ifNull"][0] == "$created_at"
+    mock_client.get_all_tickers.assert_called_once()
+    # Prices come from the one bulk call, never a per-symbol ticker request
+    mock_client.get_symbol_ticker.assert_not_called()
 
-    mock_instance = MagicMock()
-    mock_instance.insert = AsyncMock()
-    mock_crypto_class.return_value = mock_instance
+
+@patch("fetch_binance.fetch_cryptoPair.binance_client")
+@patch("fetch_binance.fetch_cryptoPair.CryptoPair")
+@pytest.mark.asyncio
+async def test_fetch_and_store_skips_write_when_no_eligible_pairs(mock_crypto_class, mock_client):
+    """No bulk_write should be issued when nothing qualifies."""
+    exchange_info = {"symbols": [{"symbol": "ABCETH", "status": "TRADING", "isSpotTradingAllowed": True,
+                                    "baseAsset": "ABC", "quoteAsset": "ETH", "filters": []}]}
+    mock_client.get_exchange_info.return_value = exchange_info
+    mock_client.get_all_tickers.return_value = []
+    bulk_write = _bulk_write_mock(mock_crypto_class)
 
     await fetch_cryptoPair.fetch_and_store_binance_symbols()
 
-    # Should have attempted to insert the BTCUSDT document
-    mock_instance.insert.assert_called_once()
+    bulk_write.assert_not_awaited()
 
 
 @patch("fetch_binance.fetch_cryptoPair.binance_client")
 @patch("fetch_binance.fetch_cryptoPair.CryptoPair")
 @pytest.mark.asyncio
-async def test_fetch_and_store_updates_existing_doc(mock_crypto_class, mock_client):
-    """If a CryptoPair exists, it should call set/update on it."""
-    exchange_info = {"symbols": [{"symbol": "BTCUSDT", "status": "TRADING", "isSpotTradingAllowed": True,
-                                    "baseAsset": "BTC", "quoteAsset": "USDT", "filters": []}]}
-    mock_client.get_exchange_info.return_value = exchange_info
-    mock_client.get_symbol_ticker.return_value = {"price": "42000"}
+async def test_fetch_and_store_uses_cached_symbol_specs(mock_crypto_class, mock_client, mock_redis):
+    """A cached spec list skips get_exchange_info; a miss caches the trimmed specs."""
+    mock_client.get_exchange_info.return_value = {"symbols": [
+        {"symbol": "BTCUSDT", "status": "TRADING", "isSpotTradingAllowed": True,
+         "baseAsset": "BTC", "quoteAsset": "USDT", "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.01"}]},
+        {"symbol": "ABCETH", "status": "TRADING", "isSpotTradingAllowed": True, "baseAsset": "ABC", "quoteAsset": "ETH", "filters": []},
+    ]}
+    mock_client.get_all_tickers.return_value = []
+    _bulk_write_mock(mock_crypto_class)
+
+    await fetch_cryptoPair.fetch_and_store_binance_symbols()
 
-    existing = MagicMock()
-    existing.set = AsyncMock()
+    key, payload = mock_redis.set.call_args.args
+    assert key == fetch_cryptoPair.EXCHANGE_INFO_CACHE_KEY
+    assert mock_redis.set.call_args.kwargs == {"ex": fetch_cryptoPair.EXCHANGE_INFO_TTL_SECONDS}
+    specs = json.loads(payload)
+    assert [s["symbol"] for s in specs] == ["BTCUSDT"]
+    assert specs[0]["price_filter"]["tickSize"] == "0.01"
 
-    mock_crypto_class.find_one = AsyncMock(return_value=existing)
+    mock_client.get_exchange_info.reset_mock()
+    mock_redis.get.return_value = payload
+    bulk_write = _bulk_write_mock(mock_crypto_class)
 
     await fetch_cryptoPair.fetch_and_store_binance_symbols()
 
-    existing.set.assert_called_once()
+    mock_client.get_exchange_info.assert_not_called()
+    ops = bulk_write.await_args.args[0]
+    assert ops[0]._doc[0]["$set"]["tick_size"] == Decimal128("0.01")
+
+
+@patch("fetch_binance.fetch_cryptoPair.binance_client")
+@patch("fetch_binance.fetch_cryptoPair.CryptoPair")
+@pytest.mark.asyncio
+async def test_refresh_crypto_pair_prices_sets_only_price_fields(mock_crypto_class, mock_client, mock_redis):
+    """The fast path updates price fields of known pairs only, without upserting."""
+    mock_redis.get.return_value = json.dumps([
+        {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "status": "TRADING",
+         "lot_size": {}, "price_filter": {}}
+    ])
+    mock_client.get_all_tickers.return_value = [
+        {"symbol": "BTCUSDT", "price": "50000"},
+        {"symbol": "ABCETH", "price": "1"},
+    ]
+    bulk_write = _bulk_write_mock(mock_crypto_class)
+
+    await fetch_cryptoPair.refresh_crypto_pair_prices()
+
+    ops = bulk_write.await_args.args[0]
+    assert len(ops) == 1
+    assert ops[0]._filter == {"symbol": "BTCUSDT"}
+    assert set(ops[0]._doc["$set"]) == {"last_price", "last_price_time"}
+    assert not ops[0]._upsert
+    mock_client.get_exchange_info.assert_not_called()
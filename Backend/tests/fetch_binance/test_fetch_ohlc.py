@@ -3,6 +3,7 @@ import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timezone
 from decimal import Decimal
+from bson.decimal128 import Decimal128
 
 from fetch_binance import fetch_ohlc
 
@@ -29,24 +30,28 @@ async def test_fetch_historical_data_inserts_new_candles_and_updates_tracker():
          patch("fetch_binance.fetch_ohlc.client") as mock_client:
 
         mock_client.get_historical_klines.return_value = klines
-        # Create simple candle objects so .candle_time is available for max()
-        class DummyCandle:
-            def __init__(self, candle_time):
-                self.candle_time = candle_time
-
-        def candle_side_effect(*args, **kwargs):
-            return DummyCandle(kwargs.get("candle_time"))
-
-        mock_candle_class.side_effect = candle_side_effect
-        mock_candle_class.insert_many = AsyncMock()
-        mock_tracker_class.find_one = AsyncMock(return_value=None)
-        mock_tracker_class.return_value.insert = AsyncMock()
+        candles = mock_candle_class.get_motor_collection.return_value
+        candles.insert_many = AsyncMock()
+        mock_tracker_class.find_all.return_value.to_list = AsyncMock(return_value=[])
+        trackers = mock_tracker_class.get_motor_collection.return_value
+        trackers.bulk_write = AsyncMock()
 
         await fetch_ohlc.fetch_historical_data()
 
-        mock_client.get_historical_klines.assert_called()
-        mock_candle_class.insert_many.assert_called_once()
-        mock_tracker_class.return_value.insert.assert_called_once()
+        mock_client.get_historical_klines.assert_called_once()
+        candles.insert_many.assert_awaited_once()
+        docs = candles.insert_many.await_args.args[0]
+        assert len(docs) == 2
+        assert docs[1]["close"] == Decimal128("41500")
+        assert docs[1]["candle_time"] == datetime.fromtimestamp(now_ts / 1000, tz=timezone.utc)
+        # Raw dicts go straight to Motor; no Candle model is built per row
+        mock_candle_class.assert_not_called()
+
+        trackers.bulk_write.assert_awaited_once()
+        ops = trackers.bulk_write.await_args.args[0]
+        assert len(ops) == 1
+        assert ops[0]._filter == {"symbol": "BTCUSDT"}
+        assert ops[0]._doc["$max"]["last_fetched"] == docs[1]["candle_time"]
 
 
 @pytest.mark.asyncio
@@ -58,13 +63,173 @@ async def test_fetch_historical_data_handles_exceptions():
     mock_query.to_list = AsyncMock(return_value=[pair])
 
     with patch("fetch_binance.fetch_ohlc.CryptoPair.find_all", return_value=mock_query), \
+         patch("fetch_binance.fetch_ohlc.Candle") as mock_candle_class, \
          patch("fetch_binance.fetch_ohlc.CandleSyncTracker") as mock_tracker_class, \
          patch("fetch_binance.fetch_ohlc.client") as mock_client:
 
-        mock_tracker_class.find_one = AsyncMock(return_value=None)
+        mock_tracker_class.find_all.return_value.to_list = AsyncMock(return_value=[])
         mock_client.get_historical_klines.side_effect = Exception("API error")
 
         # Should not raise
         await fetch_ohlc.fetch_historical_data()
 
         mock_client.get_historical_klines.assert_called()
+        mock_candle_class.get_motor_collection.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_fetch_historical_data_keeps_candle_times_utc_to_the_millisecond():
+    """Open times are tz-aware UTC and keep their millisecond component."""
+    pair = MagicMock()
+    pair.symbol = "BTCUSDT"
+    mock_query = MagicMock()
+    mock_query.to_list = AsyncMock(return_value=[pair])
+    klines = [[1718409600123, "1", "1", "1", "1", "1"]]
+
+    with patch("fetch_binance.fetch_ohlc.CryptoPair.find_all", return_value=mock_query), \
+         patch("fetch_binance.fetch_ohlc.Candle") as mock_candle_class, \
+         patch("fetch_binance.fetch_ohlc.CandleSyncTracker") as mock_tracker_class, \
+         patch("fetch_binance.fetch_ohlc.client") as mock_client:
+
+        mock_client.get_historical_klines.return_value = klines
+        candles = mock_candle_class.get_motor_collection.return_value
+        candles.insert_many = AsyncMock()
+        mock_tracker_class.find_all.return_value.to_list = AsyncMock(return_value=[])
+        mock_tracker_class.get_motor_collection.return_value.bulk_write = AsyncMock()
+
+        await fetch_ohlc.fetch_historical_data()
+
+        candle_time = candles.insert_many.await_args.args[0][0]["candle_time"]
+        assert candle_time == datetime(2024, 6, 15, 0, 0, 0, 123000, tzinfo=timezone.utc)
+        assert candle_time.utcoffset().total_seconds() == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_historical_data_advances_each_tracker_to_its_newest_candle():
+    """Each symbol's tracker moves to the latest open time within its own klines."""
+    pairs = [MagicMock(symbol="BTCUSDT"), MagicMock(symbol="ETHUSDT")]
+    mock_query = MagicMock()
+    mock_query.to_list = AsyncMock(return_value=pairs)
+    klines_by_symbol = {
+        "BTCUSDT": [[3000, "1", "1", "1", "1", "1"], [1000, "1", "1", "1", "1", "1"]],
+        "ETHUSDT": [[2000, "1", "1", "1", "1", "1"], [5000, "1", "1", "1", "1", "1"]],
+    }
+
+    with patch("fetch_binance.fetch_ohlc.CryptoPair.find_all", return_value=mock_query), \
+         patch("fetch_binance.fetch_ohlc.Candle") as mock_candle_class, \
+         patch("fetch_binance.fetch_ohlc.CandleSyncTracker") as mock_tracker_class, \
+         patch("fetch_binance.fetch_ohlc.client") as mock_client:
+
+        mock_client.get_historical_klines.side_effect = lambda symbol, **kwargs: klines_by_symbol[symbol]
+        mock_candle_class.get_motor_collection.return_value.insert_many = AsyncMock()
+        mock_tracker_class.find_all.return_value.to_list = AsyncMock(return_value=[])
+        trackers = mock_tracker_class.get_motor_collection.return_value
+        trackers.bulk_write = AsyncMock()
+
+        await fetch_ohlc.fetch_historical_data()
+
+        ops = trackers.bulk_write.await_args.args[0]
+        latest = {op._filter["symbol"]: op._doc["$max"]["last_fetched"] for op in ops}
+        assert latest == {
+            "BTCUSDT": datetime.fromtimestamp(3, tz=timezone.utc),
+            "ETHUSDT": datetime.fromtimestamp(5, tz=timezone.utc),
+        }
+
+
+@pytest.mark.asyncio
+async def test_dedupe_candle_sync_trackers_keeps_newest_per_symbol():
+    """Duplicate trackers are deleted except the first (newest last_fetched) id per symbol."""
+    async def groups():
+        yield {"_id": "BTCUSDT", "ids": ["newest", "older", "oldest"]}
+        yield {"_id": "ETHUSDT", "ids": ["newest-eth", "older-eth"]}
+
+    trackers = MagicMock()
+    trackers.aggregate = MagicMock(return_value=groups())
+    trackers.delete_many = AsyncMock()
+    db = {"candle_sync_tracker": trackers}
+
+    removed = await fetch_ohlc.dedupe_candle_sync_trackers(db)
+
+    pipeline = trackers.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$sort": {"last_fetched": -1}}
+    trackers.delete_many.assert_awaited_once_with({"_id": {"$in": ["older", "oldest", "older-eth"]}})
+    assert removed == 3
+
+
+@pytest.mark.asyncio
+async def test_dedupe_candle_sync_trackers_noop_without_duplicates():
+    async def groups():
+        return
+        yield
+
+    trackers = MagicMock()
+    trackers.aggregate = MagicMock(return_value=groups())
+    trackers.delete_many = AsyncMock()
+
+    assert await fetch_ohlc.dedupe_candle_sync_trackers({"candle_sync_tracker": trackers}) == 0
+    trackers.delete_many.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_fetch_historical_data_isolates_a_malformed_pair():
+    """One pair's bad kline is skipped; the other pairs are still stored and tracked."""
+    pairs = [MagicMock(symbol="BTCUSDT"), MagicMock(symbol="ETHUSDT")]
+    mock_query = MagicMock()
+    mock_query.to_list = AsyncMock(return_value=pairs)
+    klines_by_symbol = {
+        "BTCUSDT": [[1000, "1", "1", "1", "1", "1"], ["not-a-time", "1", "1", "1", "1", "1"]],
+        "ETHUSDT": [[2000, "2", "2", "2", "2", "2"]],
+    }
+
+    with patch("fetch_binance.fetch_ohlc.CryptoPair.find_all", return_value=mock_query), \
+         patch("fetch_binance.fetch_ohlc.Candle") as mock_candle_class, \
+         patch("fetch_binance.fetch_ohlc.CandleSyncTracker") as mock_tracker_class, \
+         patch("fetch_binance.fetch_ohlc.client") as mock_client:
+
+        mock_client.get_historical_klines.side_effect = lambda symbol, **kwargs: klines_by_symbol[symbol]
+        candles = mock_candle_class.get_motor_collection.return_value
+        candles.insert_many = AsyncMock()
+        mock_tracker_class.find_all.return_value.to_list = AsyncMock(return_value=[])
+        trackers = mock_tracker_class.get_motor_collection.return_value
+        trackers.bulk_write = AsyncMock()
+
+        await fetch_ohlc.fetch_historical_data()
+
+        docs = candles.insert_many.await_args.args[0]
+        assert [d["symbol"] for d in docs] == ["ETHUSDT"]
+        ops = trackers.bulk_write.await_args.args[0]
+        assert [op._filter["symbol"] for op in ops] == ["ETHUSDT"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_historical_data_keeps_tracker_of_pairs_with_rejected_rows():
+    """A partially failed unordered insert only holds back the trackers of the rejected rows."""
+    from pymongo.errors import BulkWriteError
+
+    pairs = [MagicMock(symbol="BTCUSDT"), MagicMock(symbol="ETHUSDT")]
+    mock_query = MagicMock()
+    mock_query.to_list = AsyncMock(return_value=pairs)
+    klines_by_symbol = {
+        "BTCUSDT": [[1000, "1", "1", "1", "1", "1"]],
+        "ETHUSDT": [[2000, "2", "2", "2", "2", "2"]],
+    }
+
+    with patch("fetch_binance.fetch_ohlc.CryptoPair.find_all", return_value=mock_query), \
+         patch("fetch_binance.fetch_ohlc.Candle") as mock_candle_class, \
+         patch("fetch_binance.fetch_ohlc.CandleSyncTracker") as mock_tracker_class, \
+         patch("fetch_binance.fetch_ohlc.client") as mock_client:
+
+        mock_client.get_historical_klines.side_effect = lambda symbol, **kwargs: klines_by_symbol[symbol]
+        candles = mock_candle_class.get_motor_collection.return_value
+        candles.insert_many = AsyncMock(side_effect=BulkWriteError({
+            "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate"}],
+            "writeConcernErrors": [],
+        }))
+        mock_tracker_class.find_all.return_value.to_list = AsyncMock(return_value=[])
+        trackers = mock_tracker_class.get_motor_collection.return_value
+        trackers.bulk_write = AsyncMock()
+
+        await fetch_ohlc.fetch_historical_data()
+
+        ops = trackers.bulk_write.await_args.args[0]
+        assert [op._filter["symbol"] for op in ops] == ["BTCUSDT"]
@@ -2,6 +2,7 @@
 Unit tests for auth_routes.py
 Tests all authentication-related endpoints with mocked dependencies.
 """
+import orjson
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
@@ -98,10 +99,10 @@ class TestLoginEndpoint:
     async def test_login_success_with_json(self, mock_user):
         """Test successful login with JSON payload."""
         mock_request = MagicMock()
-        mock_request.json = AsyncMock(return_value={
+        mock_request.body = AsyncMock(return_value=orjson.dumps({
             "username": MOCK_USERNAME,
             "password": MOCK_PASSWORD
-        })
+        }))
         
         with patch("routes.auth_routes.User.find_one", new_callable=AsyncMock) as mock_find, \
              patch("routes.auth_routes.pwd_context.verify", return_value=True), \
@@ -111,11 +112,12 @@ class TestLoginEndpoint:
             
             mock_find.return_value = mock_user
             
-            from routes.auth_routes import login
+            from routes.auth_routes import login, UserCredentials
             result = await login(mock_request, None, None)
             
             assert result.access_token == MOCK_ACCESS_TOKEN
             assert result.refresh_token == MOCK_REFRESH_TOKEN
+            assert mock_find.call_args.kwargs == {"projection_model": UserCredentials}
 
     @pytest.mark.asyncio
     async def test_login_success_with_form_data(self, mock_user):
@@ -140,10 +142,10 @@ class TestLoginEndpoint:
     async def test_login_invalid_credentials_wrong_password(self, mock_user):
         """Test login fails with incorrect password."""
         mock_request = MagicMock()
-        mock_request.json = AsyncMock(return_value={
+        mock_request.body = AsyncMock(return_value=orjson.dumps({
             "username": MOCK_USERNAME,
             "password": "WrongPassword"
-        })
+        }))
         
         with patch("routes.auth_routes.User.find_one", new_callable=AsyncMock) as mock_find, \
              patch("routes.auth_routes.pwd_context.verify", return_value=False):
@@ -160,10 +162,10 @@ class TestLoginEndpoint:
     async def test_login_user_not_found(self):
         """Test login fails when user doesn't exist."""
         mock_request = MagicMock()
-        mock_request.json = AsyncMock(return_value={
+        mock_request.body = AsyncMock(return_value=orjson.dumps({
             "username": "nonexistent@example.com",
             "password": MOCK_PASSWORD
-        })
+        }))
         
         with patch("routes.auth_routes.User.find_one", new_callable=AsyncMock) as mock_find:
             mock_find.return_value = None
@@ -177,13 +179,68 @@ class TestLoginEndpoint:
     async def test_login_missing_credentials(self):
         """Test login fails when credentials are missing."""
         mock_request = MagicMock()
-        mock_request.json = AsyncMock(return_value={})
+        mock_request.body = AsyncMock(return_value=orjson.dumps({}))
         
         from routes.auth_routes import login
         result = await login(mock_request, None, None)
         
         assert result.status_code == 422
 
+    @pytest.mark.asyncio
+    async def test_login_uses_cached_verification(self, mock_user):
+        """A recently verified password skips bcrypt."""
+        mock_request = MagicMock()
+        mock_request.body = AsyncMock(return_value=orjson.dumps({
+            "username": MOCK_USERNAME,
+            "password": MOCK_PASSWORD
+        }))
+        mock_redis = AsyncMock()
+        mock_redis.get.return_value = "1"
+
+        with patch("routes.auth_routes.User.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.auth_routes.redis_client", mock_redis), \
+             patch("routes.auth_routes.pwd_context.verify") as mock_verify, \
+             patch("routes.auth_routes.create_access_token", return_value=MOCK_ACCESS_TOKEN), \
+             patch("routes.auth_routes.create_refresh_token", return_value=MOCK_REFRESH_TOKEN), \
+             patch("routes.auth_routes.store_session", new_callable=AsyncMock):
+
+            mock_find.return_value = mock_user
+
+            from routes.auth_routes import login
+            result = await login(mock_request, None, None)
+
+            assert result.access_token == MOCK_ACCESS_TOKEN
+            mock_verify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_login_caches_successful_verification(self, mock_user):
+        """A successful bcrypt check is remembered briefly; the password itself is not stored."""
+        mock_request = MagicMock()
+        mock_request.body = AsyncMock(return_value=orjson.dumps({
+            "username": MOCK_USERNAME,
+            "password": MOCK_PASSWORD
+        }))
+        mock_redis = AsyncMock()
+        mock_redis.get.return_value = None
+
+        with patch("routes.auth_routes.User.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.auth_routes.redis_client", mock_redis), \
+             patch("routes.auth_routes.pwd_context.verify", return_value=True), \
+             patch("routes.auth_routes.create_access_token", return_value=MOCK_ACCESS_TOKEN), \
+             patch("routes.auth_routes.create_refresh_token", return_value=MOCK_REFRESH_TOKEN), \
+             patch("routes.auth_routes.store_session", new_callable=AsyncMock):
+
+            mock_find.return_value = mock_user
+
+            from routes.auth_routes import login, LOGIN_CACHE_TTL_SECONDS
+            await login(mock_request, None, None)
+
+            mock_redis.set.assert_called_once()
+            key = mock_redis.set.call_args.args[0]
+            assert key.startswith("login_verified:")
+            assert MOCK_PASSWORD not in key
+            assert mock_redis.set.call_args.kwargs == {"ex": LOGIN_CACHE_TTL_SECONDS}
+
 
 class TestRefreshTokenEndpoint:
     """Test cases for /refresh endpoint."""
@@ -233,7 +290,7 @@ class TestLogoutEndpoint:
     @pytest.mark.asyncio
     async def test_logout_success(self, mock_user):
         """Test successful logout."""
-        mock_redis = MagicMock()
+        mock_redis = AsyncMock()
         mock_cache_query = MagicMock()
         mock_cache_query.delete = AsyncMock()
         
@@ -249,7 +306,7 @@ class TestLogoutEndpoint:
     @pytest.mark.asyncio
     async def test_logout_clears_redis_session(self, mock_user):
         """Test that logout clears Redis session."""
-        mock_redis = MagicMock()
+        mock_redis = AsyncMock()
         mock_cache_query = MagicMock()
         mock_cache_query.delete = AsyncMock()
         
@@ -265,7 +322,7 @@ class TestLogoutEndpoint:
     @pytest.mark.asyncio
     async def test_logout_clears_database_cache(self, mock_user):
         """Test that logout clears database cache."""
-        mock_redis = MagicMock()
+        mock_redis = AsyncMock()
         mock_cache_query = MagicMock()
         mock_cache_query.delete = AsyncMock()
         
@@ -276,3 +333,72 @@ class TestLogoutEndpoint:
             await logout(mock_user)
             
             mock_cache_query.delete.assert_called_once()
+
+
+class TestDecodeAccessTokenCache:
+    """Test cases for the decoded token cache in auth.py."""
+
+    def test_decode_access_token_reuses_verified_payload(self):
+        """Test a token is only verified once while cached."""
+        import auth
+        auth._decoded_tokens.clear()
+        token = auth.create_access_token({"sub": MOCK_USER_ID})
+
+        with patch("auth.jwt.decode", wraps=auth.jwt.decode) as mock_decode:
+            first = auth.decode_access_token(token)
+            second = auth.decode_access_token(token)
+
+        assert first["sub"] == second["sub"] == MOCK_USER_ID
+        mock_decode.assert_called_once()
+
+    def test_decode_access_token_cache_respects_token_expiry(self):
+        """Test cached payloads are not served past the token's exp."""
+        import auth
+        auth._decoded_tokens.clear()
+        token = auth.create_access_token({"sub": MOCK_USER_ID})
+        auth.decode_access_token(token)
+
+        (expires_at, payload), = auth._decoded_tokens.values()
+        assert expires_at <= payload["exp"]
+
+    def test_decode_access_token_does_not_cache_invalid_tokens(self):
+        """Test invalid tokens return None and are not cached."""
+        import auth
+        auth._decoded_tokens.clear()
+
+        assert auth.decode_access_token("not-a-jwt") is None
+        assert auth._decoded_tokens == {}
+
+
+class TestGetCurrentUser:
+    """Test cases for the get_current_user dependency."""
+
+    @pytest.mark.asyncio
+    async def test_returns_user_when_session_is_live(self):
+        """Session check and user load both run and the user is returned."""
+        from db import get_current_user
+        user_id = ObjectId()
+        user = MagicMock(spec=User)
+
+        with patch("db.decode_access_token", return_value={"sub": str(user_id)}), \
+             patch("db.get_session", new_callable=AsyncMock, return_value={"user_id": str(user_id)}) as mock_session, \
+             patch("db.User.get", new_callable=AsyncMock, return_value=user) as mock_get:
+            result = await get_current_user("token")
+
+        assert result is user
+        mock_session.assert_awaited_once_with(str(user_id))
+        mock_get.assert_awaited_once_with(user_id)
+
+    @pytest.mark.asyncio
+    async def test_rejects_missing_session_even_if_user_exists(self):
+        """A loaded user is not returned once the session is gone."""
+        from db import get_current_user
+        user_id = ObjectId()
+
+        with patch("db.decode_access_token", return_value={"sub": str(user_id)}), \
+             patch("db.get_session", new_callable=AsyncMock, return_value=None), \
+             patch("db.User.get", new_callable=AsyncMock, return_value=MagicMock(spec=User)):
+            with pytest.raises(HTTPException) as exc_info:
+                await get_current_user("token")
+
+        assert exc_info.value.status_code == 401
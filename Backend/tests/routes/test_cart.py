@@ -2,12 +2,14 @@
 Unit tests for cart.py
 Tests all cart-related endpoints with mocked dependencies.
 """
+import asyncio
 import pytest
 from fastapi import HTTPException
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timezone
 from decimal import Decimal
 from bson import ObjectId
+from bson.decimal128 import Decimal128
 
 from routes.cart import router
 from models import (
@@ -24,6 +26,17 @@ MOCK_QUANTITY = Decimal("0.5")
 MOCK_PRICE = Decimal("50000.00")
 
 
+@pytest.fixture(autouse=True)
+def clear_ticker_cache():
+    """Keep cached market prices from leaking between tests."""
+    import routes.cart as cart_routes
+    cart_routes._ticker_cache.clear()
+    cart_routes._order_starts.clear()
+    yield
+    cart_routes._ticker_cache.clear()
+    cart_routes._order_starts.clear()
+
+
 @pytest.fixture
 def mock_user():
     """Create a mock user object."""
@@ -50,6 +63,38 @@ def mock_cart(mock_user):
     return cart
 
 
+def _update_result(matched):
+    """Build a pymongo UpdateResult stand-in."""
+    result = MagicMock()
+    result.matched_count = matched
+    return result
+
+
+@pytest.fixture
+def mock_carts():
+    """Mock the carts motor collection; by default every update matches."""
+    carts = MagicMock()
+    carts.update_one = AsyncMock(return_value=_update_result(1))
+    carts.count_documents = AsyncMock(return_value=1)
+    return carts
+
+
+@pytest.fixture
+def mock_users(mock_user):
+    """Mock the users motor collection; a guarded $inc applies to mock_user's balance."""
+    async def find_one_and_update(query, update, **kwargs):
+        floor = query.get("credits", {}).get("$gte")
+        if floor is not None and mock_user.credits < floor.to_decimal():
+            return None
+        credits = mock_user.credits + update["$inc"]["credits"].to_decimal()
+        return {"_id": query["_id"], "credits": Decimal128(credits)}
+
+    users = MagicMock()
+    users.find_one_and_update = AsyncMock(side_effect=find_one_and_update)
+    with patch("routes.cart.User.get_motor_collection", return_value=users):
+        yield users
+
+
 @pytest.fixture
 def mock_binance_client():
     """Create a mock Binance client."""
@@ -70,11 +115,10 @@ class TestAddToCartEndpoint:
     """Test cases for /cart/add endpoint."""
 
     @pytest.mark.asyncio
-    async def test_add_to_cart_success_market_order(self, mock_user, mock_cart, mock_binance_client):
+    async def test_add_to_cart_success_market_order(self, mock_user, mock_carts, mock_binance_client):
         """Test adding a market order item to cart successfully."""
         with patch("routes.cart.client", mock_binance_client), \
-             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_cart
+             patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
 
             from routes.cart import add_to_cart, AddToCartRequest
             request = AddToCartRequest(
@@ -88,14 +132,32 @@ class TestAddToCartEndpoint:
             assert result["message"] == "Item added to cart (or quantity updated)"
             assert "unit_price" in result
             assert "total_price" in result
-            mock_cart.save.assert_called_once()
+            mock_carts.update_one.assert_awaited_once()
 
     @pytest.mark.asyncio
-    async def test_add_to_cart_success_limit_order(self, mock_user, mock_cart):
-        """Test adding a limit order item to cart successfully."""
-        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_cart
-            
+    async def test_add_to_cart_reuses_recent_market_price(self, mock_user, mock_carts, mock_binance_client):
+        """Test repeated market adds within the cache TTL hit Binance once."""
+        with patch("routes.cart.client", mock_binance_client), \
+             patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
+
+            from routes.cart import add_to_cart, AddToCartRequest
+            request = AddToCartRequest(
+                symbol=MOCK_SYMBOL,
+                order_type=OrderTypeEnum.MARKET,
+                quantity=MOCK_QUANTITY
+            )
+
+            await add_to_cart(request, mock_user)
+            await add_to_cart(request, mock_user)
+
+            mock_binance_client.get_symbol_ticker.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_add_to_cart_success_limit_order(self, mock_user, mock_carts):
+        """Test adding a new limit order line pushes it onto the active cart."""
+        mock_carts.update_one.side_effect = [_update_result(0), _update_result(1)]
+
+        with patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
             from routes.cart import add_to_cart, AddToCartRequest
             request = AddToCartRequest(
                 symbol=MOCK_SYMBOL,
@@ -107,15 +169,21 @@ class TestAddToCartEndpoint:
             result = await add_to_cart(request, mock_user)
             
             assert "total_price" in result
-            assert len(mock_cart.items) == 1
+            merge_filter = mock_carts.update_one.await_args_list[0][0][0]
+            assert merge_filter["items"]["$elemMatch"]["price"] == Decimal128(MOCK_PRICE * MOCK_QUANTITY)
+            push_update = mock_carts.update_one.await_args_list[1][0][1]
+            assert push_update["$push"]["items"]["symbol"] == MOCK_SYMBOL
+            assert push_update["$push"]["items"]["quantity"] == Decimal128(MOCK_QUANTITY)
 
     @pytest.mark.asyncio
-    async def test_add_to_cart_creates_new_cart(self, mock_user, mock_cart, mock_binance_client):
+    async def test_add_to_cart_creates_new_cart(self, mock_user, mock_carts, mock_binance_client):
         """Test creating a new cart when none exists."""
+        mock_carts.update_one.return_value = _update_result(0)
+        mock_carts.count_documents.return_value = 0
+
         with patch("routes.cart.client", mock_binance_client), \
-             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts), \
              patch("routes.cart.Cart.insert", new_callable=AsyncMock) as mock_insert:
-            mock_find.return_value = None  # No existing cart
 
             from routes.cart import add_to_cart, AddToCartRequest
             request = AddToCartRequest(
@@ -127,23 +195,15 @@ class TestAddToCartEndpoint:
             result = await add_to_cart(request, mock_user)
             
             assert result["message"] == "Item added to cart (or quantity updated)"
-            mock_insert.assert_awaited()
+            mock_insert.assert_awaited_once()
+            assert len(mock_insert.await_args[0][0].items) == 1
 
     @pytest.mark.asyncio
-    async def test_add_to_cart_updates_existing_item(self, mock_user, mock_cart, mock_binance_client):
-        """Test updating quantity of existing cart item."""
-        existing_item = MagicMock(spec=CartItemEmbed)
-        existing_item.symbol = MOCK_SYMBOL
-        existing_item.order_type = OrderTypeEnum.MARKET
-        existing_item.quantity = MOCK_QUANTITY
-        existing_item.price = Decimal("25000.00")
-        mock_cart.items = [existing_item]
-        
+    async def test_add_to_cart_updates_existing_item(self, mock_user, mock_carts, mock_binance_client):
+        """Test an existing market line is incremented atomically."""
         with patch("routes.cart.client", mock_binance_client), \
-             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            
-            mock_find.return_value = mock_cart
-            
+             patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
+
             from routes.cart import add_to_cart, AddToCartRequest
             request = AddToCartRequest(
                 symbol=MOCK_SYMBOL,
@@ -151,20 +211,24 @@ class TestAddToCartEndpoint:
                 quantity=MOCK_QUANTITY
             )
             
-            result = await add_to_cart(request, mock_user)
+            await add_to_cart(request, mock_user)
             
-            assert existing_item.quantity == MOCK_QUANTITY * 2
+            query, update = mock_carts.update_one.await_args[0]
+            assert query["user.$id"] == MOCK_USER_ID
+            assert query["items"]["$elemMatch"] == {"symbol": MOCK_SYMBOL, "order_type": "MARKET"}
+            assert update["$inc"] == {
+                "items.$.quantity": Decimal128(MOCK_QUANTITY),
+                "items.$.price": Decimal128(Decimal("50000.00") * MOCK_QUANTITY),
+            }
 
     @pytest.mark.asyncio
-    async def test_add_to_cart_binance_error(self, mock_user, mock_cart, mock_binance_client):
+    async def test_add_to_cart_binance_error(self, mock_user, mock_carts, mock_binance_client):
         """Test handling Binance API error."""
         mock_binance_client.get_symbol_ticker.side_effect = Exception("Binance API error")
         
         with patch("routes.cart.client", mock_binance_client), \
-             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            
-            mock_find.return_value = mock_cart
-            
+             patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
+
             from routes.cart import add_to_cart, AddToCartRequest
             request = AddToCartRequest(
                 symbol="INVALID",
@@ -177,6 +241,7 @@ class TestAddToCartEndpoint:
             
             assert exc_info.value.status_code == 400
             assert "Could not fetch market price" in exc_info.value.detail
+            mock_carts.update_one.assert_not_called()
 
 
 class TestViewCartEndpoint:
@@ -217,30 +282,93 @@ class TestViewCartEndpoint:
             assert "Active cart not found" in exc_info.value.detail
 
 
+class TestViewCartFullEndpoint:
+    """Test cases for /cart/view_full endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_view_cart_full_combines_resources(self, mock_user, mock_cart):
+        """Test cart, credits history and portfolio come back in one response."""
+        mock_cart.items = [MagicMock(spec=CartItemEmbed)]
+        history_row = MagicMock(change_amount=Decimal("-25000"), reason=CreditReasonEnum.trade, balance_after=None, metadata={"symbol": MOCK_SYMBOL})
+        history_query = MagicMock()
+        history_query.sort = MagicMock(return_value=history_query)
+        history_query.skip = MagicMock(return_value=history_query)
+        history_query.limit = MagicMock(return_value=history_query)
+        history_query.to_list = AsyncMock(return_value=[history_row])
+        holdings = [
+            MagicMock(symbol=MOCK_SYMBOL, quantity=Decimal("0.5"), avg_buy_price=Decimal("50000")),
+            MagicMock(symbol="ETHUSDT", quantity=Decimal("2"), avg_buy_price=Decimal("3000")),
+        ]
+        portfolio_query = MagicMock()
+        portfolio_query.to_list = AsyncMock(return_value=holdings)
+
+        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock, return_value=mock_cart), \
+             patch("routes.cart.CreditsHistory.find", return_value=history_query), \
+             patch("routes.cart.Portfolio.find", return_value=portfolio_query) as mock_portfolio_find:
+            from routes.cart import view_cart_full
+            result = await view_cart_full(current_user=mock_user, history_skip=0, history_limit=20)
+
+            assert result["cart_id"] == str(mock_cart.id)
+            assert len(result["items"]) == 1
+            assert result["credits"] == 10000.0
+            assert result["credits_history"] == [{
+                "change_amount": -25000.0,
+                "reason": CreditReasonEnum.trade,
+                "balance_after": None,
+                "metadata": {"symbol": MOCK_SYMBOL},
+                "created_at": history_row.created_at,
+            }]
+            assert [row["symbol"] for row in result["portfolio"]] == [MOCK_SYMBOL, "ETHUSDT"]
+            assert result["portfolio"][1]["quantity"] == 2.0
+            assert "user" not in result["portfolio"][0]
+            history_query.sort.assert_called_once_with("-created_at")
+            # Only one page of history is read, never the whole collection
+            history_query.skip.assert_called_once_with(0)
+            history_query.limit.assert_called_once_with(20)
+            assert mock_portfolio_find.call_args[0][0] == {"user.$id": MOCK_USER_ID}
+
+    @pytest.mark.asyncio
+    async def test_view_cart_full_without_active_cart(self, mock_user):
+        """Test a missing cart yields an empty item list instead of a 404."""
+        history_query = MagicMock()
+        history_query.sort = MagicMock(return_value=history_query)
+        history_query.skip = MagicMock(return_value=history_query)
+        history_query.limit = MagicMock(return_value=history_query)
+        history_query.to_list = AsyncMock(return_value=[])
+        portfolio_query = MagicMock()
+        portfolio_query.to_list = AsyncMock(return_value=[])
+
+        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock, return_value=None), \
+             patch("routes.cart.CreditsHistory.find", return_value=history_query), \
+             patch("routes.cart.Portfolio.find", return_value=portfolio_query):
+            from routes.cart import view_cart_full
+            result = await view_cart_full(current_user=mock_user, history_skip=0, history_limit=20)
+
+            assert result["cart_id"] is None
+            assert result["items"] == []
+
+
 class TestClearCartEndpoint:
     """Test cases for /cart/clear endpoint."""
 
     @pytest.mark.asyncio
-    async def test_clear_cart_success(self, mock_user, mock_cart):
+    async def test_clear_cart_success(self, mock_user, mock_carts):
         """Test clearing cart successfully."""
-        mock_cart.items = [MagicMock(), MagicMock()]
-        
-        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_cart
-            
+        with patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
             from routes.cart import clear_cart
             result = await clear_cart(mock_user)
             
             assert result["message"] == "Cart cleared"
-            assert len(mock_cart.items) == 0
-            mock_cart.save.assert_called_once()
+            query, update = mock_carts.update_one.await_args[0]
+            assert query == {"user.$id": MOCK_USER_ID, "status": StatusEnum.active.value}
+            assert update["$set"]["items"] == []
 
     @pytest.mark.asyncio
-    async def test_clear_cart_not_found(self, mock_user):
+    async def test_clear_cart_not_found(self, mock_user, mock_carts):
         """Test clearing cart when no active cart exists."""
-        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = None
-            
+        mock_carts.update_one.return_value = _update_result(0)
+
+        with patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
             from routes.cart import clear_cart
             
             with pytest.raises(HTTPException) as exc_info:
@@ -253,32 +381,24 @@ class TestRemoveItemFromCartEndpoint:
     """Test cases for /cart/remove endpoint."""
 
     @pytest.mark.asyncio
-    async def test_remove_item_success(self, mock_user, mock_cart):
+    async def test_remove_item_success(self, mock_user, mock_carts):
         """Test removing an item from cart successfully."""
-        item1 = MagicMock(spec=CartItemEmbed)
-        item1.symbol = "BTCUSDT"
-        item2 = MagicMock(spec=CartItemEmbed)
-        item2.symbol = "ETHUSDT"
-        mock_cart.items = [item1, item2]
-        
-        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_cart
-            
+        with patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
             from routes.cart import remove_item_from_cart
-            result = await remove_item_from_cart("BTCUSDT", mock_user)
+            result = await remove_item_from_cart("btcusdt", mock_user)
             
             assert "removed from cart" in result["message"]
-            assert len(mock_cart.items) == 1
-            mock_cart.save.assert_called_once()
+            query, update = mock_carts.update_one.await_args[0]
+            assert query["items.symbol"] == "BTCUSDT"
+            assert update["$pull"] == {"items": {"symbol": "BTCUSDT"}}
+            mock_carts.count_documents.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_remove_item_not_in_cart(self, mock_user, mock_cart):
+    async def test_remove_item_not_in_cart(self, mock_user, mock_carts):
         """Test removing an item that doesn't exist in cart."""
-        mock_cart.items = []
-        
-        with patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_cart
-            
+        mock_carts.update_one.return_value = _update_result(0)
+
+        with patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
             from routes.cart import remove_item_from_cart
             
             with pytest.raises(HTTPException) as exc_info:
@@ -287,13 +407,47 @@ class TestRemoveItemFromCartEndpoint:
             assert exc_info.value.status_code == 404
             assert "not found in cart" in exc_info.value.detail
 
+    @pytest.mark.asyncio
+    async def test_remove_item_no_active_cart(self, mock_user, mock_carts):
+        """Test removing an item when the user has no active cart."""
+        mock_carts.update_one.return_value = _update_result(0)
+        mock_carts.count_documents.return_value = 0
+
+        with patch("routes.cart.Cart.get_motor_collection", return_value=mock_carts):
+            from routes.cart import remove_item_from_cart
+
+            with pytest.raises(HTTPException) as exc_info:
+                await remove_item_from_cart("BTCUSDT", mock_user)
+
+            assert exc_info.value.status_code == 404
+            assert "Active cart not found" in exc_info.value.detail
+
+
+class TestOrderRateLimit:
+    """Test cases for the per-second order start limit."""
+
+    @pytest.mark.asyncio
+    async def test_ninth_order_in_a_second_waits_for_the_window(self):
+        """Test at most ORDERS_PER_SECOND orders start inside any one-second window."""
+        import routes.cart as cart_routes
+
+        with patch("routes.cart.time.monotonic", return_value=100.0), \
+             patch("routes.cart.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            for _ in range(cart_routes.ORDERS_PER_SECOND):
+                await cart_routes._wait_for_order_slot()
+            mock_sleep.assert_not_awaited()
+
+            await cart_routes._wait_for_order_slot()
+            mock_sleep.assert_awaited_once_with(1.0)
+
 
 class TestCheckoutCartEndpoint:
     """Test cases for /cart/checkout endpoint."""
 
     @pytest.mark.asyncio
-    async def test_checkout_cart_success(self, mock_user, mock_cart, mock_binance_client):
+    async def test_checkout_cart_success(self, mock_user, mock_cart, mock_binance_client, mock_users):
         """Test checking out cart successfully."""
+        mock_user.credits = Decimal("100000.00")
         cart_item = MagicMock(spec=CartItemEmbed)
         cart_item.symbol = MOCK_SYMBOL
         cart_item.order_type = OrderTypeEnum.MARKET
@@ -306,14 +460,14 @@ class TestCheckoutCartEndpoint:
              patch("routes.cart.Order") as mock_order_cls, \
              patch("routes.cart.Transaction") as mock_tx_cls, \
              patch("routes.cart.update_or_create_portfolio", new_callable=AsyncMock), \
-             patch("routes.cart.CreditsHistory.insert", new_callable=AsyncMock):
+             patch("routes.cart.CreditsHistory.insert_many", new_callable=AsyncMock):
             
             mock_find.return_value = mock_cart
             mock_order_instance = MagicMock()
             mock_order_instance.id = ObjectId()
             mock_order_cls.return_value = mock_order_instance
             mock_order_cls.insert = AsyncMock(return_value=mock_order_instance)
-            mock_tx_cls.insert = AsyncMock()
+            mock_tx_cls.insert_many = AsyncMock()
             
             from routes.cart import checkout_cart
             result = await checkout_cart(mock_user)
@@ -321,9 +475,211 @@ class TestCheckoutCartEndpoint:
             assert "Cart checked out successfully" in result["message"]
             assert "total_spent" in result
             assert "num_trades" in result
+            assert mock_binance_client.create_order.call_args.kwargs["recvWindow"] == 5000
+            # The cart price is reserved first, then the unused part is refunded from the fills
+            reserve, settle = mock_users.find_one_and_update.await_args_list
+            assert reserve.args[0]["credits"]["$gte"].to_decimal() == Decimal("50000")
+            assert reserve.args[1]["$inc"]["credits"].to_decimal() == Decimal("-50000")
+            assert settle.args[1]["$inc"]["credits"].to_decimal() == Decimal("25000")
+            assert mock_user.credits == Decimal("75000.00")
+            # The balance only changes through the atomic updates, never a full-document save
+            mock_user.save.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_checkout_cart_places_every_item(self, mock_user, mock_cart, mock_binance_client, mock_users):
+        """Test checkout places one order per item and sums their fills."""
+        mock_user.credits = Decimal("200000.00")
+        items = []
+        for symbol in (MOCK_SYMBOL, "ETHUSDT"):
+            cart_item = MagicMock(spec=CartItemEmbed)
+            cart_item.symbol = symbol
+            cart_item.order_type = OrderTypeEnum.MARKET
+            cart_item.quantity = MOCK_QUANTITY
+            cart_item.price = MOCK_PRICE
+            items.append(cart_item)
+        mock_cart.items = items
+
+        with patch("routes.cart.client", mock_binance_client), \
+             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.cart.Order") as mock_order_cls, \
+             patch("routes.cart.Transaction") as mock_tx_cls, \
+             patch("routes.cart.update_or_create_portfolio", new_callable=AsyncMock), \
+             patch("routes.cart.CreditsHistory.insert_many", new_callable=AsyncMock) as mock_credits_insert:
+
+            mock_find.return_value = mock_cart
+            mock_order_cls.insert = AsyncMock(return_value=MagicMock(id=ObjectId()))
+            mock_tx_cls.insert_many = AsyncMock()
+
+            from routes.cart import checkout_cart
+            result = await checkout_cart(mock_user)
+
+            assert mock_binance_client.create_order.call_count == 2
+            assert {c.kwargs["symbol"] for c in mock_binance_client.create_order.call_args_list} == {"BTCUSDT", "ETHUSDT"}
+            assert result["total_spent"] == 50000.0
+            assert result["num_trades"] == 2
+            mock_tx_cls.insert_many.assert_awaited_once()
+            assert len(mock_tx_cls.insert_many.await_args[0][0]) == 2
+            mock_credits_insert.assert_awaited_once()
+            assert len(mock_credits_insert.await_args[0][0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_checkout_cart_records_fills_of_placed_items_when_one_fails(self, mock_user, mock_cart, mock_binance_client, mock_users):
+        """Test a failed item still leaves transaction and credit rows for the items that filled."""
+        mock_user.credits = Decimal("200000.00")
+        items = []
+        for symbol in (MOCK_SYMBOL, "ETHUSDT"):
+            cart_item = MagicMock(spec=CartItemEmbed)
+            cart_item.symbol = symbol
+            cart_item.order_type = OrderTypeEnum.MARKET
+            cart_item.quantity = MOCK_QUANTITY
+            cart_item.price = MOCK_PRICE
+            items.append(cart_item)
+        mock_cart.items = items
+        filled = mock_binance_client.create_order.return_value
+
+        def create_order(**payload):
+            if payload["symbol"] == "ETHUSDT":
+                raise Exception("Binance API error")
+            return filled
+        mock_binance_client.create_order.side_effect = create_order
+
+        with patch("routes.cart.client", mock_binance_client), \
+             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.cart.Order") as mock_order_cls, \
+             patch("routes.cart.Transaction") as mock_tx_cls, \
+             patch("routes.cart.update_or_create_portfolio", new_callable=AsyncMock), \
+             patch("routes.cart.CreditsHistory.insert_many", new_callable=AsyncMock) as mock_credits_insert:
+
+            mock_find.return_value = mock_cart
+            mock_order_cls.insert = AsyncMock(return_value=MagicMock(id=ObjectId()))
+            mock_tx_cls.insert_many = AsyncMock()
+
+            from routes.cart import checkout_cart
+            with pytest.raises(HTTPException) as exc_info:
+                await checkout_cart(mock_user)
+
+            assert exc_info.value.status_code == 400
+            assert len(mock_tx_cls.insert_many.await_args[0][0]) == 1
+            assert mock_tx_cls.call_args.kwargs["symbol"] == MOCK_SYMBOL
+            history = mock_credits_insert.await_args[0][0]
+            assert [h.metadata["symbol"] for h in history] == [MOCK_SYMBOL]
+
+            # The filled item is charged and leaves the cart; the failed one stays for a retry
+            detail = exc_info.value.detail
+            assert "Binance error on ETHUSDT" in detail["message"]
+            assert detail["placed"] == [MOCK_SYMBOL]
+            assert detail["not_placed"] == ["ETHUSDT"]
+            assert mock_cart.items == [items[1]]
+            assert mock_cart.status == StatusEnum.active
+            # Only the filled item is charged: 100000 reserved, 75000 of it refunded
+            assert mock_user.credits == Decimal("200000.00") - Decimal("25000.00")
+            mock_cart.save.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_checkout_cart_stops_placing_after_first_failure(self, mock_user, mock_cart, mock_binance_client, mock_users):
+        """Test items not yet sent to Binance are skipped once an earlier item fails."""
+        mock_user.credits = Decimal("200000.00")
+        items = []
+        for symbol in ("ETHUSDT", MOCK_SYMBOL):
+            cart_item = MagicMock(spec=CartItemEmbed)
+            cart_item.symbol = symbol
+            cart_item.order_type = OrderTypeEnum.MARKET
+            cart_item.quantity = MOCK_QUANTITY
+            cart_item.price = MOCK_PRICE
+            items.append(cart_item)
+        mock_cart.items = items
+        mock_binance_client.create_order.side_effect = Exception("Binance API error")
+        slots = []
+
+        async def wait_for_order_slot():
+            # Only the first order starts right away; the next waits for the rate limit
+            slots.append(None)
+            if len(slots) > 1:
+                await asyncio.sleep(0.05)
+
+        with patch("routes.cart.client", mock_binance_client), \
+             patch("routes.cart._wait_for_order_slot", wait_for_order_slot), \
+             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find:
+
+            mock_find.return_value = mock_cart
+
+            from routes.cart import checkout_cart
+            with pytest.raises(HTTPException) as exc_info:
+                await checkout_cart(mock_user)
+
+            mock_binance_client.create_order.assert_called_once()
+            assert exc_info.value.detail["placed"] == []
+            assert exc_info.value.detail["not_placed"] == ["ETHUSDT", MOCK_SYMBOL]
+            assert mock_cart.items == items
+            # Nothing was bought, so the whole reservation comes back
+            assert mock_user.credits == Decimal("200000.00")
+
+    @pytest.mark.asyncio
+    async def test_checkout_cart_fill_costs_are_exact(self, mock_user, mock_cart, mock_binance_client, mock_users):
+        """Test fill costs keep full Binance precision with no float or scaling rounding."""
+        mock_user.credits = Decimal("100000.00")
+        cart_item = MagicMock(spec=CartItemEmbed)
+        cart_item.symbol = MOCK_SYMBOL
+        cart_item.order_type = OrderTypeEnum.MARKET
+        cart_item.quantity = Decimal("0.30000003")
+        cart_item.price = MOCK_PRICE
+        mock_cart.items = [cart_item]
+        mock_binance_client.create_order.return_value = {
+            "orderId": 12345,
+            "status": "FILLED",
+            "fills": [
+                {"qty": "0.10000001", "price": "43210.12345678"},
+                {"qty": "0.20000002", "price": "43210.12345679"},
+            ],
+        }
+
+        with patch("routes.cart.client", mock_binance_client), \
+             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.cart.Order") as mock_order_cls, \
+             patch("routes.cart.Transaction") as mock_tx_cls, \
+             patch("routes.cart.update_or_create_portfolio", new_callable=AsyncMock), \
+             patch("routes.cart.CreditsHistory.insert_many", new_callable=AsyncMock) as mock_credits_insert:
+
+            mock_find.return_value = mock_cart
+            mock_order_cls.insert = AsyncMock(return_value=MagicMock(id=ObjectId()))
+            mock_tx_cls.insert_many = AsyncMock()
+
+            from routes.cart import checkout_cart
+            await checkout_cart(mock_user)
+
+            expected = (Decimal("0.10000001") * Decimal("43210.12345678")
+                        + Decimal("0.20000002") * Decimal("43210.12345679"))
+            history = mock_credits_insert.await_args[0][0]
+            assert -sum(h.change_amount for h in history) == expected
+            assert mock_user.credits == Decimal("100000.00") - expected
+
+    @pytest.mark.asyncio
+    async def test_checkout_cart_does_not_reserve_limit_orders(self, mock_user, mock_cart, mock_binance_client, mock_users):
+        """Test limit lines are left for the settlement job to charge when they fill."""
+        cart_item = MagicMock(spec=CartItemEmbed)
+        cart_item.symbol = MOCK_SYMBOL
+        cart_item.order_type = OrderTypeEnum.LIMIT
+        cart_item.quantity = MOCK_QUANTITY
+        cart_item.price = MOCK_PRICE
+        mock_cart.items = [cart_item]
+        mock_binance_client.create_order.return_value = {"orderId": 12345, "status": "NEW", "fills": []}
+
+        with patch("routes.cart.client", mock_binance_client), \
+             patch("routes.cart.Cart.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.cart.Order") as mock_order_cls:
+
+            mock_find.return_value = mock_cart
+            mock_order_cls.insert = AsyncMock(return_value=MagicMock(id=ObjectId()))
+
+            from routes.cart import checkout_cart
+            result = await checkout_cart(mock_user)
+
+            assert result["total_spent"] == 0.0
+            mock_users.find_one_and_update.assert_not_awaited()
+            assert mock_user.credits == Decimal("10000.00")
 
     @pytest.mark.asyncio
-    async def test_checkout_cart_insufficient_credits(self, mock_user, mock_cart):
+    async def test_checkout_cart_insufficient_credits(self, mock_user, mock_cart, mock_users):
         """Test checkout fails with insufficient credits."""
         mock_user.credits = Decimal("100.00")  # Not enough
         cart_item = MagicMock(spec=CartItemEmbed)
@@ -338,18 +694,18 @@ class TestCheckoutCartEndpoint:
                  "orderId": 12345,
                  "status": "FILLED",
                  "fills": [{"qty": "0.5", "price": "10000.00"}]
-             }), \
+             }) as mock_create_order, \
              patch("routes.cart.Order") as mock_order_cls, \
              patch("routes.cart.Transaction") as mock_tx_cls, \
              patch("routes.cart.update_or_create_portfolio", new_callable=AsyncMock), \
-             patch("routes.cart.CreditsHistory.insert", new_callable=AsyncMock):
+             patch("routes.cart.CreditsHistory.insert_many", new_callable=AsyncMock):
             
             mock_find.return_value = mock_cart
             mock_order_instance = MagicMock()
             mock_order_instance.id = ObjectId()
             mock_order_cls.return_value = mock_order_instance
             mock_order_cls.insert = AsyncMock(return_value=mock_order_instance)
-            mock_tx_cls.insert = AsyncMock()
+            mock_tx_cls.insert_many = AsyncMock()
             
             from routes.cart import checkout_cart
             
@@ -358,6 +714,8 @@ class TestCheckoutCartEndpoint:
             
             assert exc_info.value.status_code == 400
             assert "Insufficient credits" in exc_info.value.detail
+            # The check runs before anything is sent to Binance
+            mock_create_order.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_checkout_cart_empty_cart(self, mock_user, mock_cart):
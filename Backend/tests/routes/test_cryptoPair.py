@@ -61,19 +61,32 @@ class TestSyncBinanceSymbolsEndpoint:
         assert "current_user" in sig.parameters
 
 
+def _mock_aggregate(pairs, total):
+    """Mock the motor collection for both the $facet and the unfiltered listing paths."""
+    items = [{"symbol": p.symbol, "base_asset": p.base_asset} for p in pairs]
+    facet = {"items": items, "total": [{"n": total}] if total else []}
+
+    def aggregate(pipeline):
+        cursor = MagicMock()
+        is_facet = any("$facet" in stage for stage in pipeline)
+        cursor.to_list = AsyncMock(return_value=[facet] if is_facet else items)
+        return cursor
+
+    collection = MagicMock()
+    collection.aggregate = MagicMock(side_effect=aggregate)
+    collection.estimated_document_count = AsyncMock(return_value=total)
+    return collection
+
+
 class TestGetCryptosEndpoint:
     """Test cases for /cryptos endpoint."""
 
     @pytest.mark.asyncio
     async def test_get_cryptos_success_default_params(self, mock_crypto_pairs):
         """Test getting cryptos with default parameters."""
-        mock_query = MagicMock()
-        mock_query.skip = MagicMock(return_value=mock_query)
-        mock_query.limit = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
-        mock_query.count = AsyncMock(return_value=len(mock_crypto_pairs))
-        
-        with patch("routes.cryptoPair.CryptoPair.find", return_value=mock_query):
+        collection = _mock_aggregate(mock_crypto_pairs, len(mock_crypto_pairs))
+
+        with patch("routes.cryptoPair.CryptoPair.get_motor_collection", return_value=collection):
             from routes.cryptoPair import get_cryptos
             
             result = await get_cryptos()
@@ -82,56 +95,62 @@ class TestGetCryptosEndpoint:
             assert "total" in result
             assert len(result["items"]) == 3
             assert result["total"] == 3
+            collection.estimated_document_count.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_get_cryptos_with_pagination(self, mock_crypto_pairs):
         """Test getting cryptos with pagination parameters."""
-        mock_query = MagicMock()
-        mock_query.skip = MagicMock(return_value=mock_query)
-        mock_query.limit = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs[:2])
-        mock_query.count = AsyncMock(return_value=len(mock_crypto_pairs))
-        
-        with patch("routes.cryptoPair.CryptoPair.find", return_value=mock_query):
+        collection = _mock_aggregate(mock_crypto_pairs[:2], len(mock_crypto_pairs))
+
+        with patch("routes.cryptoPair.CryptoPair.get_motor_collection", return_value=collection):
             from routes.cryptoPair import get_cryptos
             
             result = await get_cryptos(skip=0, limit=2)
             
-            mock_query.skip.assert_called_once_with(0)
-            mock_query.limit.assert_called_once_with(2)
+            items_stage = collection.aggregate.call_args[0][0]
+            assert {"$skip": 0} in items_stage
+            assert {"$limit": 2} in items_stage
             assert len(result["items"]) == 2
+            assert result["total"] == 3
+
+    @pytest.mark.asyncio
+    async def test_get_cryptos_projects_listing_fields(self, mock_crypto_pairs):
+        """Test the page only carries symbol and base_asset."""
+        collection = _mock_aggregate(mock_crypto_pairs, len(mock_crypto_pairs))
+
+        with patch("routes.cryptoPair.CryptoPair.get_motor_collection", return_value=collection):
+            from routes.cryptoPair import get_cryptos
+
+            await get_cryptos()
+
+            items_stage = collection.aggregate.call_args[0][0]
+            assert {"$project": {"symbol": 1, "base_asset": 1, "_id": 0}} in items_stage
 
     @pytest.mark.asyncio
     async def test_get_cryptos_with_search_symbol(self, mock_crypto_pairs):
         """Test searching cryptos by symbol."""
         btc_pairs = [p for p in mock_crypto_pairs if "BTC" in p.symbol]
-        mock_query = MagicMock()
-        mock_query.skip = MagicMock(return_value=mock_query)
-        mock_query.limit = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=btc_pairs)
-        mock_query.count = AsyncMock(return_value=len(btc_pairs))
-        
-        with patch("routes.cryptoPair.CryptoPair.find", return_value=mock_query) as mock_find:
+        collection = _mock_aggregate(btc_pairs, len(btc_pairs))
+
+        with patch("routes.cryptoPair.CryptoPair.get_motor_collection", return_value=collection):
             from routes.cryptoPair import get_cryptos
             
             result = await get_cryptos(search="BTC")
             
-            # Verify regex search was applied
-            call_args = mock_find.call_args[0][0]
-            assert "$or" in call_args
+            # Verify regex search was applied and counted in the same pipeline
+            pipeline = collection.aggregate.call_args[0][0]
+            assert "$or" in pipeline[0]["$match"]
+            assert pipeline[1]["$facet"]["total"] == [{"$count": "n"}]
+            collection.estimated_document_count.assert_not_called()
             assert len(result["items"]) == 1
 
     @pytest.mark.asyncio
     async def test_get_cryptos_with_search_base_asset(self, mock_crypto_pairs):
         """Test searching cryptos by base asset."""
         eth_pairs = [p for p in mock_crypto_pairs if "ETH" in p.base_asset]
-        mock_query = MagicMock()
-        mock_query.skip = MagicMock(return_value=mock_query)
-        mock_query.limit = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=eth_pairs)
-        mock_query.count = AsyncMock(return_value=len(eth_pairs))
-        
-        with patch("routes.cryptoPair.CryptoPair.find", return_value=mock_query):
+        collection = _mock_aggregate(eth_pairs, len(eth_pairs))
+
+        with patch("routes.cryptoPair.CryptoPair.get_motor_collection", return_value=collection):
             from routes.cryptoPair import get_cryptos
             
             result = await get_cryptos(search="ETH")
@@ -141,13 +160,9 @@ class TestGetCryptosEndpoint:
     @pytest.mark.asyncio
     async def test_get_cryptos_empty_results(self):
         """Test getting cryptos when no results found."""
-        mock_query = MagicMock()
-        mock_query.skip = MagicMock(return_value=mock_query)
-        mock_query.limit = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=[])
-        mock_query.count = AsyncMock(return_value=0)
-        
-        with patch("routes.cryptoPair.CryptoPair.find", return_value=mock_query):
+        collection = _mock_aggregate([], 0)
+
+        with patch("routes.cryptoPair.CryptoPair.get_motor_collection", return_value=collection):
             from routes.cryptoPair import get_cryptos
             
             result = await get_cryptos(search="NONEXISTENT")
@@ -184,12 +199,26 @@ class TestSearchCryptosEndpoint:
             
             await search_cryptos(query="btc")
             
-            # Verify regex with case-insensitive option was used
+            # Verify the term is upper-cased into an anchored prefix
             call_args = mock_find.call_args[0][0]
             assert "$or" in call_args
             for condition in call_args["$or"]:
                 for field, regex in condition.items():
-                    assert regex["$options"] == "i"
+                    assert regex == {"$regex": "^BTC"}
+
+    @pytest.mark.asyncio
+    async def test_search_cryptos_escapes_regex_characters(self):
+        """Test that user input is matched literally."""
+        mock_query = MagicMock()
+        mock_query.to_list = AsyncMock(return_value=[])
+
+        with patch("routes.cryptoPair.CryptoPair.find", return_value=mock_query) as mock_find:
+            from routes.cryptoPair import search_cryptos
+
+            await search_cryptos(query="btc.*")
+
+            condition = mock_find.call_args[0][0]["$or"][0]
+            assert condition["symbol"]["$regex"] == r"^BTC\.\*"
 
     @pytest.mark.asyncio
     async def test_search_cryptos_empty_results(self):
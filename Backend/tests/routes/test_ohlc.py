@@ -2,6 +2,7 @@
 Unit tests for ohlc.py
 Tests all candle/OHLC data endpoints with mocked dependencies.
 """
+import orjson
 import pytest
 from fastapi import HTTPException
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -122,20 +123,45 @@ class TestTriggerCandleFetchEndpoint:
         assert "current_user" in sig.parameters
 
 
+def _candle_rows(candles):
+    """Rows as the $project stage returns them."""
+    return [
+        {
+            "symbol": c.symbol,
+            "interval": c.interval,
+            "time": c.candle_time,
+            "open": float(c.open),
+            "high": float(c.high),
+            "low": float(c.low),
+            "close": float(c.close),
+            "volume": float(c.volume),
+        }
+        for c in candles
+    ]
+
+
+def _mock_aggregate(rows):
+    """Mock Candle.aggregate as a cursor yielding the given rows."""
+    mock_query = MagicMock()
+    mock_query.__aiter__.return_value = rows
+    return mock_query
+
+
+async def _read_json(response):
+    """Drain a StreamingResponse and decode its JSON body."""
+    return orjson.loads(b"".join([chunk async for chunk in response.body_iterator]))
+
+
 class TestGetOhlcDataEndpoint:
     """Test cases for /candles/{symbol} endpoint."""
 
     @pytest.mark.asyncio
     async def test_get_ohlc_data_success(self, mock_candles):
         """Test getting OHLC data successfully."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles)
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query):
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate(_candle_rows(mock_candles))):
             from routes.ohlc import get_ohlc_data
             
-            result = await get_ohlc_data(MOCK_SYMBOL)
+            result = await _read_json(await get_ohlc_data(MOCK_SYMBOL))
             
             assert len(result) == 5
             assert all("symbol" in candle for candle in result)
@@ -148,76 +174,58 @@ class TestGetOhlcDataEndpoint:
     @pytest.mark.asyncio
     async def test_get_ohlc_data_symbol_case_insensitive(self, mock_candles):
         """Test that symbol search is case-insensitive."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles)
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query) as mock_find:
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate([])) as mock_agg:
             from routes.ohlc import get_ohlc_data
             
             await get_ohlc_data("btcusdt")
             
             # Verify the symbol was converted to uppercase
-            call_args = mock_find.call_args[0][0]
-            assert call_args["symbol"] == "BTCUSDT"
+            match = mock_agg.call_args[0][0][0]["$match"]
+            assert match["symbol"] == "BTCUSDT"
 
     @pytest.mark.asyncio
     async def test_get_ohlc_data_custom_days_back(self, mock_candles):
         """Test getting OHLC data with custom days_back parameter."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles[:3])
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query) as mock_find:
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate(_candle_rows(mock_candles[:3]))) as mock_agg:
             from routes.ohlc import get_ohlc_data
             
-            result = await get_ohlc_data(MOCK_SYMBOL, days_back=7)
+            result = await _read_json(await get_ohlc_data(MOCK_SYMBOL, days_back=7))
             
             # Verify date range was applied
-            call_args = mock_find.call_args[0][0]
-            assert "candle_time" in call_args
-            assert "$gte" in call_args["candle_time"]
-            assert "$lte" in call_args["candle_time"]
+            match = mock_agg.call_args[0][0][0]["$match"]
+            assert "candle_time" in match
+            assert "$gte" in match["candle_time"]
+            assert "$lte" in match["candle_time"]
+            assert len(result) == 3
 
     @pytest.mark.asyncio
-    async def test_get_ohlc_data_sorted_by_time(self, mock_candles):
-        """Test that results are sorted by candle_time."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles)
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query):
+    async def test_get_ohlc_data_sorted_by_time(self):
+        """Test that results are sorted by candle_time before shaping."""
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate([])) as mock_agg:
             from routes.ohlc import get_ohlc_data
             
             await get_ohlc_data(MOCK_SYMBOL)
             
-            mock_query.sort.assert_called_once_with("candle_time")
+            pipeline = mock_agg.call_args[0][0]
+            assert pipeline[1] == {"$sort": {"candle_time": 1}}
 
     @pytest.mark.asyncio
     async def test_get_ohlc_data_no_results(self):
         """Test getting OHLC data when no candles found."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=[])
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query):
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate([])):
             from routes.ohlc import get_ohlc_data
             
-            result = await get_ohlc_data("NONEXISTENT")
+            result = await _read_json(await get_ohlc_data("NONEXISTENT"))
             
             assert result == []
 
     @pytest.mark.asyncio
     async def test_get_ohlc_data_correct_structure(self, mock_candles):
         """Test that OHLC data has correct structure."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles[:1])
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query):
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate(_candle_rows(mock_candles[:1]))):
             from routes.ohlc import get_ohlc_data
             
-            result = await get_ohlc_data(MOCK_SYMBOL)
+            result = await _read_json(await get_ohlc_data(MOCK_SYMBOL))
             
             candle = result[0]
             assert candle["symbol"] == MOCK_SYMBOL
@@ -229,57 +237,58 @@ class TestGetOhlcDataEndpoint:
             assert isinstance(candle["volume"], float)
 
     @pytest.mark.asyncio
-    async def test_get_ohlc_data_decimal_conversion(self, mock_candles):
-        """Test that Decimal values are converted to floats."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles[:1])
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query):
+    async def test_get_ohlc_data_decimal_conversion(self):
+        """Test that Decimal128 columns are cast to doubles server-side."""
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate([])) as mock_agg:
             from routes.ohlc import get_ohlc_data
             
-            result = await get_ohlc_data(MOCK_SYMBOL)
+            await get_ohlc_data(MOCK_SYMBOL)
             
-            candle = result[0]
-            # Verify values match the mock data (converted to float)
-            assert candle["open"] == 50000.0
-            assert candle["high"] == 51000.0
-            assert candle["low"] == 49000.0
-            assert candle["close"] == 50500.0
-            assert candle["volume"] == 1000.0
+            projection = mock_agg.call_args[0][0][-1]["$project"]
+            for field in ("open", "high", "low", "close", "volume"):
+                assert projection[field] == {"$toDouble": f"${field}"}
+            assert projection["time"] == "$candle_time"
+            assert projection["_id"] == 0
 
     @pytest.mark.asyncio
     async def test_get_ohlc_data_days_back_minimum_value(self, mock_candles):
         """Test that days_back parameter respects minimum value."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=mock_candles)
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query):
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate(_candle_rows(mock_candles))):
             from routes.ohlc import get_ohlc_data
             
             # days_back has ge=1 constraint
-            result = await get_ohlc_data(MOCK_SYMBOL, days_back=1)
+            result = await _read_json(await get_ohlc_data(MOCK_SYMBOL, days_back=1))
             
             assert len(result) == 5
 
     @pytest.mark.asyncio
     async def test_get_ohlc_data_time_range_calculation(self):
         """Test that time range is calculated correctly."""
-        mock_query = MagicMock()
-        mock_query.sort = MagicMock(return_value=mock_query)
-        mock_query.to_list = AsyncMock(return_value=[])
-        
-        with patch("routes.ohlc.Candle.find", return_value=mock_query) as mock_find:
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate([])) as mock_agg:
             from routes.ohlc import get_ohlc_data
             
             await get_ohlc_data(MOCK_SYMBOL, days_back=10)
             
-            call_args = mock_find.call_args[0][0]
-            time_range = call_args["candle_time"]
+            time_range = mock_agg.call_args[0][0][0]["$match"]["candle_time"]
             start_time = time_range["$gte"]
             end_time = time_range["$lte"]
             
             # Verify the time difference is approximately 10 days
             time_diff = (end_time - start_time).days
             assert time_diff == 10
+
+    @pytest.mark.asyncio
+    async def test_get_ohlc_data_streams_in_batches(self, mock_candles):
+        """Test rows are streamed as a valid JSON array across several chunks."""
+        rows = _candle_rows(mock_candles) * 3
+        with patch("routes.ohlc.Candle.aggregate", return_value=_mock_aggregate(rows)), \
+             patch("routes.ohlc.STREAM_BATCH_SIZE", 4):
+            from routes.ohlc import get_ohlc_data
+
+            response = await get_ohlc_data(MOCK_SYMBOL)
+            chunks = [chunk async for chunk in response.body_iterator]
+
+            assert response.media_type == "application/json"
+            # "[", four batches of at most 4 rows, "]"
+            assert len(chunks) == 6
+            assert len(orjson.loads(b"".join(chunks))) == 15
@@ -8,6 +8,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timezone
 from decimal import Decimal
 from bson import ObjectId
+from bson.decimal128 import Decimal128
 
 from routes.trading import router, quantize_decimal, to_decimal128
 from models import (
@@ -75,7 +76,7 @@ class TestPlaceTradeEndpoint:
     @pytest.mark.asyncio
     async def test_place_trade_buy_success(self, mock_user):
         """Test placing a buy order successfully."""
-        with patch("routes.trading.process_trade_task") as mock_task:
+        with patch("routes.trading._enqueue_trade") as mock_enqueue:
             from routes.trading import place_trade
             
             request = OrderRequest(
@@ -90,13 +91,13 @@ class TestPlaceTradeEndpoint:
             assert result["status"] == "success"
             assert "BUY" in result["message"]
             assert MOCK_SYMBOL in result["message"]
-            mock_task.send.assert_called_once()
+            mock_enqueue.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_place_trade_sell_success(self, mock_user, mock_portfolio):
         """Test placing a sell order successfully with sufficient holdings."""
         with patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find, \
-             patch("routes.trading.process_trade_task") as mock_task:
+             patch("routes.trading._enqueue_trade") as mock_enqueue:
             
             mock_find.return_value = mock_portfolio
             
@@ -161,7 +162,7 @@ class TestPlaceTradeEndpoint:
     @pytest.mark.asyncio
     async def test_place_trade_limit_order(self, mock_user):
         """Test placing a limit order."""
-        with patch("routes.trading.process_trade_task") as mock_task:
+        with patch("routes.trading._enqueue_trade") as mock_enqueue:
             from routes.trading import place_trade
             
             request = OrderRequest(
@@ -174,14 +175,14 @@ class TestPlaceTradeEndpoint:
             
             result = await place_trade(request, mock_user)
             
-            call_args = mock_task.send.call_args[0][0]
+            call_args = mock_enqueue.call_args[0][0]
             assert call_args["order_type"] == "LIMIT"
             assert call_args["price"] == str(MOCK_PRICE)
 
     @pytest.mark.asyncio
     async def test_place_trade_normalizes_inputs(self, mock_user):
         """Test that trade inputs are normalized (uppercase, quantized)."""
-        with patch("routes.trading.process_trade_task") as mock_task:
+        with patch("routes.trading._enqueue_trade") as mock_enqueue:
             from routes.trading import place_trade
             
             request = OrderRequest(
@@ -193,7 +194,7 @@ class TestPlaceTradeEndpoint:
             
             await place_trade(request, mock_user)
             
-            call_args = mock_task.send.call_args[0][0]
+            call_args = mock_enqueue.call_args[0][0]
             assert call_args["symbol"] == "BTCUSDT"
             assert call_args["side"] == "BUY"
             # Quantity should be quantized
@@ -202,7 +203,7 @@ class TestPlaceTradeEndpoint:
     @pytest.mark.asyncio
     async def test_place_trade_enqueues_task(self, mock_user):
         """Test that trade is enqueued as a background task."""
-        with patch("routes.trading.process_trade_task") as mock_task:
+        with patch("routes.trading._enqueue_trade") as mock_enqueue:
             from routes.trading import place_trade
             
             request = OrderRequest(
@@ -214,114 +215,175 @@ class TestPlaceTradeEndpoint:
             
             await place_trade(request, mock_user)
             
-            mock_task.send.assert_called_once()
-            call_args = mock_task.send.call_args[0][0]
+            mock_enqueue.assert_called_once()
+            call_args = mock_enqueue.call_args[0][0]
             assert call_args["user_id"] == str(MOCK_USER_ID)
 
 
+def _matched(count):
+    result = MagicMock()
+    result.matched_count = count
+    return result
+
+
+def _receiver():
+    receiver = MagicMock(spec=User)
+    receiver.id = ObjectId()
+    receiver.username = "receiver@example.com"
+    receiver.credits = Decimal("5000.00")
+    return receiver
+
+
+@pytest.fixture
+def transfer_db(mock_user):
+    """Patch the collections /transfer writes to and run its writes without a session."""
+    db = MagicMock()
+    db.portfolios.update_one = AsyncMock(return_value=_matched(1))
+    db.portfolios.delete_one = AsyncMock()
+    db.portfolios.insert_one = AsyncMock()
+    db.transfers.insert_one = AsyncMock()
+    db.users.find_one_and_update = AsyncMock(
+        return_value={"_id": MOCK_USER_ID, "credits": Decimal128(mock_user.credits - Decimal("1"))}
+    )
+    db.users.update_one = AsyncMock()
+    db.history.insert_many = AsyncMock()
+
+    async def run_without_session(work):
+        return await work(None)
+
+    with patch("routes.trading.User.get_motor_collection", return_value=db.users), \
+         patch("routes.trading.Portfolio.get_motor_collection", return_value=db.portfolios), \
+         patch("routes.trading.Transfer.get_motor_collection", return_value=db.transfers), \
+         patch("routes.trading.CreditsHistory.get_motor_collection", return_value=db.history), \
+         patch("routes.trading._run_in_transaction", side_effect=run_without_session) as mock_txn:
+        db.run_in_transaction = mock_txn
+        yield db
+
+
 class TestTransferEndpoint:
     """Test cases for /transfer endpoint."""
 
     @pytest.mark.asyncio
-    async def test_transfer_success(self, mock_user, mock_portfolio):
+    async def test_transfer_success(self, mock_user, mock_portfolio, transfer_db):
         """Test successful transfer between users."""
-        receiver = MagicMock(spec=User)
-        receiver.id = ObjectId()
-        receiver.username = "receiver@example.com"
-        receiver.credits = Decimal("5000.00")
-        receiver.save = AsyncMock()
-        
-        receiver_portfolio = MagicMock(spec=Portfolio)
-        receiver_portfolio.quantity = Decimal("1.0")
-        receiver_portfolio.save = AsyncMock()
-        
+        receiver = _receiver()
+
         with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
-             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio, \
-             patch("routes.trading.Portfolio.insert", new_callable=AsyncMock), \
-             patch("routes.trading.Transfer.insert", new_callable=AsyncMock), \
-             patch("routes.trading.CreditsHistory.insert_many", new_callable=AsyncMock):
-            
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
+
             mock_find_user.return_value = receiver
-            mock_find_portfolio.side_effect = [mock_portfolio, receiver_portfolio]
-            
+            mock_find_portfolio.return_value = mock_portfolio
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username=receiver.username,
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             result = await transfer(request, mock_user)
-            
+
             assert result["message"] == "Transfer successful"
             assert result["to"] == receiver.username
             assert result["symbol"] == MOCK_SYMBOL
+            transfer_db.run_in_transaction.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_transfer_writes_record_users_and_history(self, mock_user, mock_portfolio, transfer_db):
+        """Transfer record, both users and both history rows are written in the same unit of work."""
+        receiver = _receiver()
+
+        with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
+
+            mock_find_user.return_value = receiver
+            mock_find_portfolio.return_value = mock_portfolio
+
+            from routes.trading import transfer, TransferRequest
+
+            request = TransferRequest(
+                to_username=receiver.username,
+                symbol=MOCK_SYMBOL,
+                amount=Decimal("0.5")
+            )
+
+            result = await transfer(request, mock_user)
+
+            transfer_doc = transfer_db.transfers.insert_one.await_args[0][0]
+            assert str(transfer_doc["_id"]) == result["transfer_id"]
+            assert transfer_doc["from_user"].id == MOCK_USER_ID
+            assert transfer_doc["to_user"].id == receiver.id
+            assert transfer_doc["amount"] == Decimal128("0.5")
+            transfer_db.users.find_one_and_update.assert_awaited_once()
+            transfer_db.users.update_one.assert_awaited_once()
+            history = transfer_db.history.insert_many.await_args[0][0]
+            assert [h["reason"] for h in history] == [CreditReasonEnum.fee.value, CreditReasonEnum.reward.value]
 
     @pytest.mark.asyncio
     async def test_transfer_receiver_not_found(self, mock_user):
         """Test transfer fails when receiver doesn't exist."""
-        with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find:
+        with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock):
             mock_find.return_value = None
-            
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username="nonexistent@example.com",
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             with pytest.raises(HTTPException) as exc_info:
                 await transfer(request, mock_user)
-            
+
             assert exc_info.value.status_code == 404
             assert "Receiver username not found" in exc_info.value.detail
 
     @pytest.mark.asyncio
     async def test_transfer_to_self(self, mock_user):
         """Test transfer fails when trying to transfer to self."""
-        with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find:
+        with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find, \
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock):
             mock_find.return_value = mock_user
-            
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username=mock_user.username,
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             with pytest.raises(HTTPException) as exc_info:
                 await transfer(request, mock_user)
-            
+
             assert exc_info.value.status_code == 400
             assert "Cannot transfer to self" in exc_info.value.detail
 
     @pytest.mark.asyncio
     async def test_transfer_no_portfolio(self, mock_user):
         """Test transfer fails when sender has no portfolio."""
-        receiver = MagicMock(spec=User)
-        receiver.id = ObjectId()
-        receiver.username = "receiver@example.com"
-        
+        receiver = _receiver()
+
         with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
              patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
-            
+
             mock_find_user.return_value = receiver
             mock_find_portfolio.return_value = None
-            
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username=receiver.username,
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             with pytest.raises(HTTPException) as exc_info:
                 await transfer(request, mock_user)
-            
+
             assert exc_info.value.status_code == 400
             assert "Portfolio not found" in exc_info.value.detail
 
@@ -329,87 +391,168 @@ class TestTransferEndpoint:
     async def test_transfer_insufficient_balance(self, mock_user, mock_portfolio):
         """Test transfer fails with insufficient balance."""
         mock_portfolio.quantity = Decimal("0.1")
-        receiver = MagicMock(spec=User)
-        receiver.id = ObjectId()
-        receiver.username = "receiver@example.com"
-        
+        receiver = _receiver()
+
         with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
              patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
-            
+
             mock_find_user.return_value = receiver
             mock_find_portfolio.return_value = mock_portfolio
-            
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username=receiver.username,
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             with pytest.raises(HTTPException) as exc_info:
                 await transfer(request, mock_user)
-            
+
             assert exc_info.value.status_code == 400
             assert "Insufficient balance" in exc_info.value.detail
 
     @pytest.mark.asyncio
-    async def test_transfer_deducts_fee(self, mock_user, mock_portfolio):
+    async def test_transfer_rejects_holding_spent_concurrently(self, mock_user, mock_portfolio, transfer_db):
+        """If the guarded decrement misses, nothing else is written."""
+        receiver = _receiver()
+        transfer_db.portfolios.update_one.return_value = _matched(0)
+
+        with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
+
+            mock_find_user.return_value = receiver
+            mock_find_portfolio.return_value = mock_portfolio
+
+            from routes.trading import transfer, TransferRequest
+
+            request = TransferRequest(
+                to_username=receiver.username,
+                symbol=MOCK_SYMBOL,
+                amount=Decimal("0.5")
+            )
+
+            with pytest.raises(HTTPException) as exc_info:
+                await transfer(request, mock_user)
+
+            assert exc_info.value.status_code == 400
+            decrement_filter = transfer_db.portfolios.update_one.await_args[0][0]
+            assert decrement_filter["quantity"] == {"$gte": Decimal128("0.5")}
+            transfer_db.transfers.insert_one.assert_not_awaited()
+            transfer_db.users.find_one_and_update.assert_not_awaited()
+            transfer_db.history.insert_many.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_transfer_deducts_fee(self, mock_user, mock_portfolio, transfer_db):
         """Test that transfer deducts 1 credit fee from sender."""
-        receiver = MagicMock(spec=User)
-        receiver.id = ObjectId()
-        receiver.username = "receiver@example.com"
-        receiver.credits = Decimal("5000.00")
-        receiver.save = AsyncMock()
-        
+        receiver = _receiver()
         initial_credits = mock_user.credits
-        
+
         with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
-             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio, \
-             patch("routes.trading.Transfer.insert", new_callable=AsyncMock), \
-             patch("routes.trading.CreditsHistory.insert_many", new_callable=AsyncMock):
-            
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
+
             mock_find_user.return_value = receiver
-            mock_find_portfolio.side_effect = [mock_portfolio, None]
-            
+            mock_find_portfolio.return_value = mock_portfolio
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username=receiver.username,
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             await transfer(request, mock_user)
-            
+
+            update = transfer_db.users.find_one_and_update.await_args[0][1]
+            assert update["$inc"] == {"credits": Decimal128("-1")}
             assert mock_user.credits == initial_credits - Decimal("1")
 
     @pytest.mark.asyncio
-    async def test_transfer_creates_receiver_portfolio(self, mock_user, mock_portfolio):
+    async def test_transfer_creates_receiver_portfolio(self, mock_user, mock_portfolio, transfer_db):
         """Test that transfer creates portfolio for receiver if not exists."""
-        receiver = MagicMock(spec=User)
-        receiver.id = ObjectId()
-        receiver.username = "receiver@example.com"
-        receiver.credits = Decimal("5000.00")
-        receiver.save = AsyncMock()
-        
+        receiver = _receiver()
+        # Sender decrement matches, receiver increment finds no holding
+        transfer_db.portfolios.update_one.side_effect = [_matched(1), _matched(0)]
+
         with patch("routes.trading.User.find_one", new_callable=AsyncMock) as mock_find_user, \
-             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio, \
-             patch("routes.trading.Portfolio.insert", new_callable=AsyncMock) as mock_insert, \
-             patch("routes.trading.Transfer.insert", new_callable=AsyncMock), \
-             patch("routes.trading.CreditsHistory.insert_many", new_callable=AsyncMock):
-            
+             patch("routes.trading.Portfolio.find_one", new_callable=AsyncMock) as mock_find_portfolio:
+
             mock_find_user.return_value = receiver
-            mock_find_portfolio.side_effect = [mock_portfolio, None]  # Receiver has no portfolio
-            
+            mock_find_portfolio.return_value = mock_portfolio
+
             from routes.trading import transfer, TransferRequest
-            
+
             request = TransferRequest(
                 to_username=receiver.username,
                 symbol=MOCK_SYMBOL,
                 amount=Decimal("0.5")
             )
-            
+
             await transfer(request, mock_user)
-            
-            mock_insert.assert_called_once()
+
+            transfer_db.portfolios.insert_one.assert_awaited_once()
+            new_holding = transfer_db.portfolios.insert_one.await_args[0][0]
+            assert new_holding["user"].id == receiver.id
+            assert new_holding["quantity"] == Decimal128("0.5")
+
+
+class TestRunInTransaction:
+    """Test cases for the _run_in_transaction helper."""
+
+    @staticmethod
+    def _mock_client():
+        session = MagicMock()
+        session.__aenter__ = AsyncMock(return_value=session)
+        session.__aexit__ = AsyncMock(return_value=False)
+
+        async def with_transaction(coro):
+            return await coro(session)
+        session.with_transaction = AsyncMock(side_effect=with_transaction)
+        users = MagicMock()
+        users.database.client.start_session = AsyncMock(return_value=session)
+        return users, session
+
+    @pytest.mark.asyncio
+    async def test_runs_work_inside_transaction(self):
+        """The work receives the session while a transaction is open."""
+        from routes.trading import _run_in_transaction
+        users, session = self._mock_client()
+        work = AsyncMock(return_value="done")
+
+        with patch("routes.trading.User.get_motor_collection", return_value=users):
+            result = await _run_in_transaction(work)
+
+        assert result == "done"
+        # with_transaction owns the commit and the transient-error retry loop
+        session.with_transaction.assert_awaited_once_with(work)
+        work.assert_awaited_once_with(session)
+
+    @pytest.mark.asyncio
+    async def test_falls_back_without_session_on_standalone_server(self):
+        """A server without transaction support runs the work unsessioned."""
+        from pymongo.errors import OperationFailure
+        from routes.trading import _run_in_transaction
+        users, session = self._mock_client()
+        work = AsyncMock(side_effect=[OperationFailure("Transaction numbers are only allowed on a replica set member", code=20), "done"])
+
+        with patch("routes.trading.User.get_motor_collection", return_value=users):
+            result = await _run_in_transaction(work)
+
+        assert result == "done"
+        assert work.await_args_list[1].args == (None,)
+
+    @pytest.mark.asyncio
+    async def test_reraises_other_database_errors(self):
+        """Unrelated failures abort the transaction and propagate."""
+        from pymongo.errors import OperationFailure
+        from routes.trading import _run_in_transaction
+        users, session = self._mock_client()
+        work = AsyncMock(side_effect=OperationFailure("write conflict", code=112))
+
+        with patch("routes.trading.User.get_motor_collection", return_value=users):
+            with pytest.raises(OperationFailure):
+                await _run_in_transaction(work)
+
+        work.assert_awaited_once()
@@ -28,7 +28,7 @@ class TestWebSocketPriceEndpoint:
         from fastapi import WebSocketDisconnect
         mock_websocket.receive_text.side_effect = WebSocketDisconnect()
 
-        with patch("routes.websocket_routes.clients", []):
+        with patch("routes.websocket_routes.clients", set()):
             from routes.websocket_routes import websocket_price
 
             await websocket_price(mock_websocket)
@@ -37,7 +37,7 @@ class TestWebSocketPriceEndpoint:
 
     @pytest.mark.asyncio
     async def test_websocket_adds_client_to_list(self, mock_websocket):
-        """Test that client is added and later removed from clients list."""
+        """Test that the client's queue is registered and later removed."""
         from fastapi import WebSocketDisconnect
         clients_mock = MagicMock()
         mock_websocket.receive_text.side_effect = WebSocketDisconnect()
@@ -47,34 +47,22 @@ class TestWebSocketPriceEndpoint:
 
             await websocket_price(mock_websocket)
 
-            clients_mock.append.assert_called_once_with(mock_websocket)
-            clients_mock.remove.assert_called_once_with(mock_websocket)
+            queue = clients_mock.add.call_args[0][0]
+            assert isinstance(queue, asyncio.Queue)
+            clients_mock.discard.assert_called_once_with(queue)
 
     @pytest.mark.asyncio
     async def test_websocket_ping_pong(self, mock_websocket):
         """Test WebSocket ping-pong mechanism."""
         mock_websocket.receive_text.side_effect = ["ping", __import__("fastapi").WebSocketDisconnect()]
 
-        with patch("routes.websocket_routes.clients", []):
+        with patch("routes.websocket_routes.clients", set()):
             from routes.websocket_routes import websocket_price
 
             await websocket_price(mock_websocket)
 
             mock_websocket.send_text.assert_called_with("pong")
 
-    @pytest.mark.asyncio
-    async def test_websocket_timeout_handling(self, mock_websocket):
-        """Test that WebSocket handles timeout gracefully."""
-        from fastapi import WebSocketDisconnect
-        mock_websocket.receive_text.side_effect = [asyncio.TimeoutError(), WebSocketDisconnect()]
-
-        with patch("routes.websocket_routes.clients", []):
-            from routes.websocket_routes import websocket_price
-
-            await websocket_price(mock_websocket)
-
-            mock_websocket.accept.assert_called_once()
-
     @pytest.mark.asyncio
     async def test_websocket_disconnect_removes_client(self, mock_websocket):
         """Test that disconnected client is removed from list."""
@@ -88,7 +76,7 @@ class TestWebSocketPriceEndpoint:
 
             await websocket_price(mock_websocket)
 
-            clients_mock.remove.assert_called_once_with(mock_websocket)
+            clients_mock.discard.assert_called_once_with(clients_mock.add.call_args[0][0])
 
     @pytest.mark.asyncio
     async def test_websocket_multiple_messages(self, mock_websocket):
@@ -102,7 +90,7 @@ class TestWebSocketPriceEndpoint:
             WebSocketDisconnect()
         ]
         
-        with patch("routes.websocket_routes.clients", []):
+        with patch("routes.websocket_routes.clients", set()):
             from routes.websocket_routes import websocket_price
 
             await websocket_price(mock_websocket)
@@ -121,7 +109,7 @@ class TestWebSocketPriceEndpoint:
             WebSocketDisconnect()
         ]
         
-        with patch("routes.websocket_routes.clients", []):
+        with patch("routes.websocket_routes.clients", set()):
             from routes.websocket_routes import websocket_price
 
             await websocket_price(mock_websocket)
@@ -143,8 +131,9 @@ class TestWebSocketPriceEndpoint:
             await websocket_price(mock_websocket)
             
             mock_websocket.accept.assert_called_once()
-            clients_mock.append.assert_called_once_with(mock_websocket)
-            clients_mock.remove.assert_called_once_with(mock_websocket)
+            queue = clients_mock.add.call_args[0][0]
+            assert isinstance(queue, asyncio.Queue)
+            clients_mock.discard.assert_called_once_with(queue)
 
     @pytest.mark.asyncio
     async def test_websocket_concurrent_clients(self):
@@ -159,7 +148,7 @@ class TestWebSocketPriceEndpoint:
         client2.accept = AsyncMock()
         client2.receive_text = AsyncMock(side_effect=WebSocketDisconnect())
         
-        clients_list = []
+        clients_list = set()
         
         with patch("routes.websocket_routes.clients", clients_list):
             from routes.websocket_routes import websocket_price
@@ -177,23 +166,33 @@ class TestWebSocketPriceEndpoint:
             client1.accept.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_websocket_timeout_value(self, mock_websocket):
-        """Test that WebSocket uses 30-second timeout by asserting call arguments."""
+    async def test_websocket_receive_has_no_python_timer(self, mock_websocket):
+        """Keepalive is left to protocol ping frames, so receive is not wrapped in wait_for."""
         from fastapi import WebSocketDisconnect
-        # Ensure the loop ends: first a timeout, then disconnect
-        mock_websocket.receive_text.side_effect = [asyncio.TimeoutError(), WebSocketDisconnect()]
+        mock_websocket.receive_text.side_effect = ["ping", WebSocketDisconnect()]
 
-        async def fake_wait_for(coro, timeout):
-            # Immediately await the underlying coroutine to trigger its side effects
-            assert timeout == 30
-            return await coro
+        with patch("routes.websocket_routes.clients", set()), \
+             patch("asyncio.wait_for") as mock_wait_for:
 
-        with patch("routes.websocket_routes.clients", []), \
-             patch("asyncio.wait_for", side_effect=fake_wait_for) as mock_wait_for:
+            from routes.websocket_routes import websocket_price
+
+            await websocket_price(mock_websocket)
+
+            mock_wait_for.assert_not_called()
+            assert mock_websocket.receive_text.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_websocket_binary_format_opt_in(self, mock_websocket):
+        """?format=binary makes the sender use binary frames."""
+        from fastapi import WebSocketDisconnect
+        mock_websocket.query_params = {"format": "binary"}
+        mock_websocket.receive_text.side_effect = WebSocketDisconnect()
+
+        with patch("routes.websocket_routes.clients", set()), \
+             patch("routes.websocket_routes.drain_to_client", new_callable=AsyncMock) as mock_drain:
 
             from routes.websocket_routes import websocket_price
 
             await websocket_price(mock_websocket)
 
-            # verify accept
-            mock_websocket.accept.assert_called_once()
+            assert mock_drain.call_args[0][2] is True
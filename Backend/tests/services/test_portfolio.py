@@ -7,6 +7,9 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from decimal import Decimal
 from datetime import datetime, timezone
 from bson import ObjectId
+from bson.dbref import DBRef
+from bson.decimal128 import Decimal128
+from pymongo.errors import DuplicateKeyError
 
 from services.portfolio import (
     update_or_create_portfolio,
@@ -48,21 +51,24 @@ def mock_portfolio():
     return portfolio
 
 
+def _mock_portfolios(matched):
+    """Mock the portfolios motor collection; `matched` sets update_one's matched_count."""
+    collection = MagicMock()
+    result = MagicMock()
+    result.matched_count = matched
+    collection.update_one = AsyncMock(return_value=result)
+    collection.insert_one = AsyncMock()
+    return collection
+
+
 class TestUpdateOrCreatePortfolio:
     """Test cases for update_or_create_portfolio function."""
 
     @pytest.mark.asyncio
     async def test_create_new_portfolio(self, mock_user):
         """Test creating a new portfolio entry when user has no existing holdings."""
-        with patch("services.portfolio.Portfolio") as mock_portfolio_class:
-            # Mock find_one to return None
-            mock_portfolio_class.find_one = AsyncMock(return_value=None)
-            
-            # Mock the Portfolio instance that will be created
-            mock_portfolio_instance = MagicMock()
-            mock_portfolio_instance.insert = AsyncMock()
-            mock_portfolio_class.return_value = mock_portfolio_instance
-            
+        collection = _mock_portfolios(matched=0)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             await update_or_create_portfolio(
                 user_link=mock_user,
                 symbol=MOCK_SYMBOL,
@@ -70,15 +76,18 @@ class TestUpdateOrCreatePortfolio:
                 price=MOCK_PRICE
             )
             
-            mock_portfolio_class.find_one.assert_called_once()
-            mock_portfolio_instance.insert.assert_called_once()
+            collection.update_one.assert_awaited_once()
+            collection.insert_one.assert_awaited_once()
+            doc = collection.insert_one.await_args[0][0]
+            assert doc["user"] == DBRef("users", MOCK_USER_ID)
+            assert doc["quantity"] == Decimal128(MOCK_QUANTITY)
+            assert doc["avg_buy_price"] == Decimal128(MOCK_PRICE)
 
     @pytest.mark.asyncio
-    async def test_update_existing_portfolio(self, mock_user, mock_portfolio):
+    async def test_update_existing_portfolio(self, mock_user):
         """Test updating existing portfolio when user already has holdings."""
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_portfolios(matched=1)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             await update_or_create_portfolio(
                 user_link=mock_user,
                 symbol=MOCK_SYMBOL,
@@ -86,24 +95,18 @@ class TestUpdateOrCreatePortfolio:
                 price=MOCK_PRICE
             )
             
-            mock_find.assert_called_once()
-            mock_portfolio.save.assert_called_once()
-            assert mock_portfolio.quantity > Decimal("2.0")
+            query = collection.update_one.await_args[0][0]
+            assert query == {"user.$id": MOCK_USER_ID, "symbol": MOCK_SYMBOL}
+            collection.insert_one.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_update_calculates_weighted_average_price(self, mock_user, mock_portfolio):
-        """Test that updating portfolio correctly calculates weighted average buy price."""
-        original_quantity = Decimal("2.0")
-        original_price = Decimal("48000.00")
+    async def test_update_calculates_weighted_average_price(self, mock_user):
+        """Test the update computes the weighted average from the stored holding."""
         new_quantity = Decimal("1.5")
         new_price = Decimal("50000.00")
-        
-        mock_portfolio.quantity = original_quantity
-        mock_portfolio.avg_buy_price = original_price
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_portfolios(matched=1)
+
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             await update_or_create_portfolio(
                 user_link=mock_user,
                 symbol=MOCK_SYMBOL,
@@ -111,20 +114,19 @@ class TestUpdateOrCreatePortfolio:
                 price=new_price
             )
             
-            expected_total_quantity = original_quantity + new_quantity
-            expected_total_cost = (original_quantity * original_price) + (new_quantity * new_price)
-            expected_avg_price = expected_total_cost / expected_total_quantity
-            
-            assert mock_portfolio.quantity == expected_total_quantity
-            assert mock_portfolio.avg_buy_price == expected_avg_price
-            mock_portfolio.save.assert_called_once()
+            stage = collection.update_one.await_args[0][1][0]["$set"]
+            expected_quantity = {"$add": ["$quantity", Decimal128(new_quantity)]}
+            assert stage["quantity"] == expected_quantity
+            assert stage["avg_buy_price"] == {"$divide": [
+                {"$add": [{"$multiply": ["$quantity", "$avg_buy_price"]}, Decimal128(new_quantity * new_price)]},
+                expected_quantity,
+            ]}
 
     @pytest.mark.asyncio
-    async def test_update_sets_timestamp(self, mock_user, mock_portfolio):
+    async def test_update_sets_timestamp(self, mock_user):
         """Test that update sets updated_at timestamp."""
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_portfolios(matched=1)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             before_update = datetime.now(timezone.utc)
             
             await update_or_create_portfolio(
@@ -134,20 +136,14 @@ class TestUpdateOrCreatePortfolio:
                 price=MOCK_PRICE
             )
             
-            assert mock_portfolio.updated_at >= before_update
-            mock_portfolio.save.assert_called_once()
+            stage = collection.update_one.await_args[0][1][0]["$set"]
+            assert stage["updated_at"] >= before_update
 
     @pytest.mark.asyncio
     async def test_handles_string_quantity_and_price(self, mock_user):
         """Test that function correctly converts string inputs to Decimal."""
-        with patch("services.portfolio.Portfolio") as mock_portfolio_class:
-            # Mock find_one to return None
-            mock_portfolio_class.find_one = AsyncMock(return_value=None)
-            
-            mock_portfolio_instance = MagicMock()
-            mock_portfolio_instance.insert = AsyncMock()
-            mock_portfolio_class.return_value = mock_portfolio_instance
-            
+        collection = _mock_portfolios(matched=0)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             await update_or_create_portfolio(
                 user_link=mock_user,
                 symbol=MOCK_SYMBOL,
@@ -155,137 +151,179 @@ class TestUpdateOrCreatePortfolio:
                 price="50000.00"  # String input
             )
             
-            mock_portfolio_class.find_one.assert_called_once()
+            doc = collection.insert_one.await_args[0][0]
+            assert doc["quantity"] == Decimal128("1.5")
+            assert doc["avg_buy_price"] == Decimal128("50000.00")
+
+    @pytest.mark.asyncio
+    async def test_accepts_bare_user_id(self):
+        """Test callers may pass the user's id instead of the document."""
+        collection = _mock_portfolios(matched=1)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
+            await update_or_create_portfolio(MOCK_USER_ID, MOCK_SYMBOL, MOCK_QUANTITY, MOCK_PRICE)
+
+            assert collection.update_one.await_args[0][0]["user.$id"] == MOCK_USER_ID
+
+    @pytest.mark.asyncio
+    async def test_concurrent_create_folds_into_existing_holding(self, mock_user):
+        """Test a duplicate-key insert retries as an update."""
+        collection = _mock_portfolios(matched=0)
+        hit = MagicMock()
+        hit.matched_count = 1
+        collection.update_one.side_effect = [collection.update_one.return_value, hit]
+        collection.insert_one.side_effect = DuplicateKeyError("dup")
+
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
+            await update_or_create_portfolio(mock_user, MOCK_SYMBOL, MOCK_QUANTITY, MOCK_PRICE)
+
+            assert collection.update_one.await_count == 2
+            collection.insert_one.assert_awaited_once()
+
+
+def _mock_sell_collection(after=None, existing=None):
+    """Mock the portfolios collection for sells; `after` is the post-decrement doc."""
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(return_value=after)
+    collection.find_one = AsyncMock(return_value=existing)
+    collection.delete_one = AsyncMock()
+    return collection
+
+
+def _holding(quantity):
+    return {"_id": ObjectId(), "symbol": MOCK_SYMBOL, "quantity": Decimal128(quantity)}
 
 
 class TestUpdatePortfolioOnSell:
     """Test cases for update_portfolio_on_sell function."""
 
     @pytest.mark.asyncio
-    async def test_sell_partial_quantity(self, mock_portfolio):
+    async def test_sell_partial_quantity(self):
         """Test selling partial quantity updates portfolio correctly."""
-        mock_portfolio.quantity = Decimal("2.0")
-        quantity_to_sell = Decimal("0.5")
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_sell_collection(after=_holding("1.5"))
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             result = await update_portfolio_on_sell(
                 user_id=MOCK_USER_ID,
                 symbol=MOCK_SYMBOL,
-                quantity_sold=quantity_to_sell
+                quantity_sold=Decimal("0.5")
             )
-            
-            assert result["status"] == "updated"
-            assert result["symbol"] == MOCK_SYMBOL
-            assert Decimal(result["remaining_quantity"]) == Decimal("1.5")
-            mock_portfolio.save.assert_called_once()
+
+        assert result["status"] == "updated"
+        assert result["symbol"] == MOCK_SYMBOL
+        assert Decimal(result["remaining_quantity"]) == Decimal("1.5")
+        collection.delete_one.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_sell_is_a_single_guarded_decrement(self):
+        """The decrement only matches holdings with enough quantity."""
+        collection = _mock_sell_collection(after=_holding("1.5"))
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
+            await update_portfolio_on_sell(
+                user_id=MOCK_USER_ID,
+                symbol=MOCK_SYMBOL,
+                quantity_sold=Decimal("0.5")
+            )
+
+        collection.find_one_and_update.assert_awaited_once()
+        filter_, update = collection.find_one_and_update.await_args[0]
+        assert filter_["user.$id"] == MOCK_USER_ID
+        assert filter_["symbol"] == MOCK_SYMBOL
+        assert filter_["quantity"] == {"$gte": Decimal128("0.50000000")}
+        assert update["$inc"] == {"quantity": Decimal128("-0.50000000")}
+        assert collection.find_one_and_update.await_args[1]["projection"] == {"quantity": 1}
+        collection.find_one.assert_not_awaited()
 
     @pytest.mark.asyncio
-    async def test_sell_all_quantity_deletes_portfolio(self, mock_portfolio):
+    async def test_sell_all_quantity_deletes_portfolio(self):
         """Test selling all quantity deletes the portfolio entry."""
-        mock_portfolio.quantity = Decimal("1.5")
-        quantity_to_sell = Decimal("1.5")
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        after = _holding("0E-8")
+        collection = _mock_sell_collection(after=after)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             result = await update_portfolio_on_sell(
                 user_id=MOCK_USER_ID,
                 symbol=MOCK_SYMBOL,
-                quantity_sold=quantity_to_sell
+                quantity_sold=Decimal("1.5")
             )
-            
-            assert result["status"] == "deleted"
-            assert result["symbol"] == MOCK_SYMBOL
-            mock_portfolio.delete.assert_called_once()
-            mock_portfolio.save.assert_not_called()
+
+        assert result["status"] == "deleted"
+        assert result["symbol"] == MOCK_SYMBOL
+        collection.delete_one.assert_awaited_once()
+        delete_filter = collection.delete_one.await_args[0][0]
+        assert delete_filter["_id"] == after["_id"]
+        assert delete_filter["quantity"] == {"$lte": Decimal128("0")}
 
     @pytest.mark.asyncio
     async def test_sell_no_holdings_raises_error(self):
         """Test selling when no holdings exist raises ValueError."""
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = None
-            
+        collection = _mock_sell_collection(after=None, existing=None)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             with pytest.raises(ValueError) as exc_info:
                 await update_portfolio_on_sell(
                     user_id=MOCK_USER_ID,
                     symbol=MOCK_SYMBOL,
                     quantity_sold=Decimal("1.0")
                 )
-            
-            assert "No holdings found" in str(exc_info.value)
+
+        assert "No holdings found" in str(exc_info.value)
 
     @pytest.mark.asyncio
-    async def test_sell_insufficient_quantity_raises_error(self, mock_portfolio):
+    async def test_sell_insufficient_quantity_raises_error(self):
         """Test selling more than available quantity raises ValueError."""
-        mock_portfolio.quantity = Decimal("0.5")
-        quantity_to_sell = Decimal("1.0")
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_sell_collection(after=None, existing=_holding("0.5"))
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             with pytest.raises(ValueError) as exc_info:
                 await update_portfolio_on_sell(
                     user_id=MOCK_USER_ID,
                     symbol=MOCK_SYMBOL,
-                    quantity_sold=quantity_to_sell
+                    quantity_sold=Decimal("1.0")
                 )
-            
-            assert "Insufficient quantity" in str(exc_info.value)
+
+        assert "Insufficient quantity" in str(exc_info.value)
+        assert "have 0.5" in str(exc_info.value)
+        collection.delete_one.assert_not_awaited()
 
     @pytest.mark.asyncio
-    async def test_sell_quantizes_to_8_decimals(self, mock_portfolio):
+    async def test_sell_quantizes_to_8_decimals(self):
         """Test that sell quantity is quantized to 8 decimal places."""
-        mock_portfolio.quantity = Decimal("1.123456789")
-        quantity_to_sell = Decimal("0.123456789")
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_sell_collection(after=_holding("1.00000000"))
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             result = await update_portfolio_on_sell(
                 user_id=MOCK_USER_ID,
                 symbol=MOCK_SYMBOL,
-                quantity_sold=quantity_to_sell
+                quantity_sold=Decimal("0.123456789")
             )
-            
-            remaining = Decimal(result["remaining_quantity"])
-            # Check it's quantized to 8 decimals
-            assert len(str(remaining).split('.')[-1]) <= 8
+
+        assert result["sold"] == "0.12345679"
+        remaining = Decimal(result["remaining_quantity"])
+        # Check it's quantized to 8 decimals
+        assert len(str(remaining).split('.')[-1]) <= 8
 
     @pytest.mark.asyncio
-    async def test_sell_updates_timestamp(self, mock_portfolio):
+    async def test_sell_updates_timestamp(self):
         """Test that sell operation updates the timestamp."""
-        mock_portfolio.quantity = Decimal("2.0")
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
-            before_sell = datetime.now(timezone.utc)
-            
+        collection = _mock_sell_collection(after=_holding("1.5"))
+        before_sell = datetime.now(timezone.utc)
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             await update_portfolio_on_sell(
                 user_id=MOCK_USER_ID,
                 symbol=MOCK_SYMBOL,
                 quantity_sold=Decimal("0.5")
             )
-            
-            assert mock_portfolio.updated_at >= before_sell
+
+        update = collection.find_one_and_update.await_args[0][1]
+        assert update["$set"]["updated_at"] >= before_sell
 
     @pytest.mark.asyncio
-    async def test_sell_handles_string_input(self, mock_portfolio):
+    async def test_sell_handles_string_input(self):
         """Test that function converts string input to Decimal."""
-        mock_portfolio.quantity = Decimal("2.0")
-        
-        with patch("services.portfolio.Portfolio.find_one", new_callable=AsyncMock) as mock_find:
-            mock_find.return_value = mock_portfolio
-            
+        collection = _mock_sell_collection(after=_holding("1.5"))
+        with patch("services.portfolio.Portfolio.get_motor_collection", return_value=collection):
             result = await update_portfolio_on_sell(
                 user_id=MOCK_USER_ID,
                 symbol=MOCK_SYMBOL,
                 quantity_sold="0.5"  # String input
             )
-            
-            assert result["status"] == "updated"
+
+        assert result["status"] == "updated"
 
 
 class TestGetUserById:
@@ -318,22 +356,55 @@ class TestGetUserByIdSync:
 
     def test_get_user_by_id_sync_success(self, mock_user):
         """Test successfully fetching user synchronously."""
-        with patch("services.portfolio.asyncio.run") as mock_run, \
-             patch("services.portfolio.get_user_by_id", new_callable=AsyncMock) as mock_async_get:
-            
+        with patch("services.portfolio.get_user_by_id", new_callable=AsyncMock) as mock_async_get:
             mock_async_get.return_value = mock_user
-            mock_run.return_value = mock_user
-            
+
             result = get_user_by_id_sync(str(MOCK_USER_ID))
-            
+
             assert result == mock_user
-            mock_run.assert_called_once()
+            mock_async_get.assert_awaited_once_with(str(MOCK_USER_ID))
 
-    def test_get_user_by_id_sync_uses_asyncio_run(self):
-        """Test that sync function uses asyncio.run to execute async function."""
-        with patch("services.portfolio.asyncio.run") as mock_run:
-            mock_run.return_value = None
-            
+    def test_get_user_by_id_sync_reuses_background_loop(self):
+        """Sync calls run on one persistent loop instead of a new loop per call."""
+        import services.portfolio as portfolio_module
+
+        with patch("services.portfolio.asyncio.run") as mock_run, \
+             patch("services.portfolio.get_user_by_id", new_callable=AsyncMock):
             get_user_by_id_sync(str(MOCK_USER_ID))
-            
-            mock_run.assert_called_once()
+            loop = portfolio_module._sync_loop
+            get_user_by_id_sync(str(MOCK_USER_ID))
+
+            assert loop is not None and loop.is_running()
+            assert portfolio_module._sync_loop is loop
+            mock_run.assert_not_called()
+
+    def test_concurrent_first_calls_start_a_single_loop(self):
+        """Threads racing on the first sync call share one loop and one runner thread."""
+        import asyncio
+        import threading
+        import services.portfolio as portfolio_module
+
+        barrier = threading.Barrier(8)
+        loops = []
+        real_new_event_loop = asyncio.new_event_loop
+
+        def new_event_loop():
+            loop = real_new_event_loop()
+            loops.append(loop)
+            return loop
+
+        def first_call():
+            barrier.wait()
+            portfolio_module._ensure_sync_loop()
+
+        with patch.object(portfolio_module, "_sync_loop", None), \
+             patch("services.portfolio.asyncio.new_event_loop", side_effect=new_event_loop):
+            threads = [threading.Thread(target=first_call) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert len(loops) == 1
+            assert portfolio_module._sync_loop is loops[0]
+        loops[0].call_soon_threadsafe(loops[0].stop)
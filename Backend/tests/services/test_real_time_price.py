@@ -10,6 +10,8 @@ from unittest.mock import AsyncMock, MagicMock, patch, call
 from services.real_time_price import (
     build_stream_url,
     binance_stream,
+    broadcast,
+    drain_to_client,
     clients
 )
 from models import CryptoPair
@@ -17,18 +19,34 @@ from models import CryptoPair
 
 # Mock data
 MOCK_CRYPTO_PAIRS = [
-    MagicMock(symbol="BTCUSDT"),
-    MagicMock(symbol="ETHUSDT"),
-    MagicMock(symbol="ADAUSDT")
+    {"symbol": "BTCUSDT"},
+    {"symbol": "ETHUSDT"},
+    {"symbol": "ADAUSDT"}
 ]
 
 
+def _pairs_collection(pairs):
+    """Mock the crypto_pairs collection; find().to_list() returns `pairs`."""
+    collection = MagicMock()
+    collection.find.return_value.to_list = AsyncMock(return_value=pairs)
+    return collection
+
+
+@pytest.fixture(autouse=True)
+def clear_stream_url_cache():
+    """Each test builds the stream URL from its own mocked pairs."""
+    from services import real_time_price
+    real_time_price.invalidate_stream_url()
+    yield
+    real_time_price.invalidate_stream_url()
+
+
 @pytest.fixture
 def mock_crypto_pairs():
     """Create mock crypto pairs."""
     return [
-        MagicMock(symbol="BTCUSDT"),
-        MagicMock(symbol="ETHUSDT"),
+        {"symbol": "BTCUSDT"},
+        {"symbol": "ETHUSDT"},
     ]
 
 
@@ -53,24 +71,23 @@ class TestBuildStreamUrl:
     @pytest.mark.asyncio
     async def test_build_stream_url_with_symbols(self, mock_crypto_pairs):
         """Test building stream URL with valid symbols."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query):
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
             url = await build_stream_url()
             
             assert url is not None
             assert "wss://stream.binance.com:9443/stream?streams=" in url
             assert "btcusdt@ticker" in url
             assert "ethusdt@ticker" in url
+            pairs_collection.find.assert_called_once_with({}, {"symbol": 1, "_id": 0})
 
     @pytest.mark.asyncio
     async def test_build_stream_url_lowercase_conversion(self, mock_crypto_pairs):
         """Test that symbols are converted to lowercase."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query):
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
             url = await build_stream_url()
             
             # Ensure all symbols are lowercase in URL
@@ -80,10 +97,9 @@ class TestBuildStreamUrl:
     @pytest.mark.asyncio
     async def test_build_stream_url_no_symbols(self):
         """Test building stream URL when no symbols exist in database."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=[])
+        pairs_collection = _pairs_collection([])
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query):
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
             url = await build_stream_url()
             
             assert url is None
@@ -91,11 +107,10 @@ class TestBuildStreamUrl:
     @pytest.mark.asyncio
     async def test_build_stream_url_single_symbol(self):
         """Test building stream URL with a single symbol."""
-        single_pair = [MagicMock(symbol="BTCUSDT")]
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=single_pair)
+        single_pair = [{"symbol": "BTCUSDT"}]
+        pairs_collection = _pairs_collection(single_pair)
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query):
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
             url = await build_stream_url()
             
             assert url == "wss://stream.binance.com:9443/stream?streams=btcusdt@ticker"
@@ -104,34 +119,126 @@ class TestBuildStreamUrl:
     async def test_build_stream_url_multiple_symbols(self):
         """Test building stream URL with multiple symbols joined correctly."""
         pairs = [
-            MagicMock(symbol="BTCUSDT"),
-            MagicMock(symbol="ETHUSDT"),
-            MagicMock(symbol="ADAUSDT")
+            {"symbol": "BTCUSDT"},
+            {"symbol": "ETHUSDT"},
+            {"symbol": "ADAUSDT"}
         ]
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=pairs)
+        pairs_collection = _pairs_collection(pairs)
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query):
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
             url = await build_stream_url()
             
             assert "btcusdt@ticker/ethusdt@ticker/adausdt@ticker" in url
 
 
+    @pytest.mark.asyncio
+    async def test_build_stream_url_is_cached(self, mock_crypto_pairs):
+        """Reconnects within the TTL reuse the URL without querying pairs."""
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
+
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
+            first = await build_stream_url()
+            second = await build_stream_url()
+
+            assert first == second
+            pairs_collection.find.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_build_stream_url_refetches_after_invalidation(self, mock_crypto_pairs):
+        """Invalidating the cache makes the next call rebuild from the database."""
+        from services.real_time_price import invalidate_stream_url
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
+
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection):
+            await build_stream_url()
+            invalidate_stream_url()
+            await build_stream_url()
+
+            assert pairs_collection.find.call_count == 2
+
+
+class TestBroadcast:
+    """Test cases for broadcast and drain_to_client functions."""
+
+    def test_broadcast_queues_message_for_every_client(self):
+        """Each connected client's queue receives the message."""
+        first, second = asyncio.Queue(maxsize=5), asyncio.Queue(maxsize=5)
+
+        with patch("services.real_time_price.clients", {first, second}):
+            broadcast(b'{"s": "BTCUSDT"}')
+
+        assert first.get_nowait() == ('{"s": "BTCUSDT"}', b'{"s": "BTCUSDT"}')
+        assert second.get_nowait() == ('{"s": "BTCUSDT"}', b'{"s": "BTCUSDT"}')
+
+    def test_broadcast_drops_oldest_when_client_queue_is_full(self):
+        """A backed-up client loses its oldest tick instead of blocking the stream."""
+        queue = asyncio.Queue(maxsize=2)
+        queue.put_nowait(("old", b"old"))
+        queue.put_nowait(("newer", b"newer"))
+
+        with patch("services.real_time_price.clients", {queue}):
+            broadcast(b"newest")
+
+        assert [queue.get_nowait()[0], queue.get_nowait()[0]] == ["newer", "newest"]
+
+    @pytest.mark.asyncio
+    async def test_drain_to_client_sends_queued_messages(self):
+        """The per-client sender forwards queued messages to its websocket."""
+        queue = asyncio.Queue()
+        queue.put_nowait(("tick", b"tick"))
+        websocket = MagicMock()
+        websocket.send_text = AsyncMock()
+
+        sender = asyncio.create_task(drain_to_client(queue, websocket))
+        await asyncio.sleep(0)
+        sender.cancel()
+
+        websocket.send_text.assert_awaited_once_with("tick")
+
+    @pytest.mark.asyncio
+    async def test_drain_to_client_sends_raw_bytes_to_binary_clients(self):
+        """Binary clients get the pre-encoded frame without a text round trip."""
+        queue = asyncio.Queue()
+        queue.put_nowait(("tick", b"tick"))
+        websocket = MagicMock()
+        websocket.send_bytes = AsyncMock()
+        websocket.send_text = AsyncMock()
+
+        sender = asyncio.create_task(drain_to_client(queue, websocket, binary=True))
+        await asyncio.sleep(0)
+        sender.cancel()
+
+        websocket.send_bytes.assert_awaited_once_with(b"tick")
+        websocket.send_text.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_drain_to_client_unregisters_failed_client(self):
+        """A failed send stops the sender and removes the client's queue."""
+        queue = asyncio.Queue()
+        queue.put_nowait(("tick", b"tick"))
+        websocket = MagicMock()
+        websocket.send_text = AsyncMock(side_effect=Exception("Connection lost"))
+
+        with patch("services.real_time_price.clients", {queue}) as patched:
+            await drain_to_client(queue, websocket)
+
+            assert queue not in patched
+
+
 class TestBinanceStream:
     """Test cases for binance_stream function."""
 
     @pytest.mark.asyncio
     async def test_binance_stream_connects_successfully(self, mock_crypto_pairs):
         """Test that binance_stream establishes connection successfully."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
         
         mock_websocket = MagicMock()
         # First recv() raises exception to break the inner loop and trigger reconnect
         # Second exception breaks the outer while True loop
         mock_websocket.recv = AsyncMock(side_effect=Exception("Test exception"))
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query), \
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection), \
              patch("services.real_time_price.websockets.connect") as mock_connect, \
              patch("services.real_time_price.build_stream_url", new_callable=AsyncMock) as mock_build_url, \
              patch("services.real_time_price.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
@@ -155,58 +262,15 @@ class TestBinanceStream:
     @pytest.mark.asyncio
     async def test_binance_stream_sends_message_to_clients(self, mock_crypto_pairs, mock_websocket_message):
         """Test that messages are sent to connected clients."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
-        
-        mock_client = MagicMock()
-        mock_client.send_text = AsyncMock()
-        
-        # Temporarily add mock client to the module-level clients list
-        from services import real_time_price
-        original_clients = real_time_price.clients.copy()
-        real_time_price.clients.clear()
-        real_time_price.clients.append(mock_client)
-        
-        mock_websocket = MagicMock()
-        mock_websocket.recv = AsyncMock(side_effect=[
-            json.dumps(mock_websocket_message),
-            asyncio.CancelledError
-        ])
-        
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query), \
-             patch("services.real_time_price.websockets.connect") as mock_connect, \
-             patch("services.real_time_price.build_stream_url", new_callable=AsyncMock) as mock_build_url, \
-             patch("services.real_time_price.asyncio.sleep", new_callable=AsyncMock):
-            
-            mock_build_url.return_value = "wss://stream.binance.com:9443/stream?streams=btcusdt@ticker"
-            mock_connect.return_value.__aenter__.return_value = mock_websocket
-            mock_connect.return_value.__aexit__ = AsyncMock(return_value=False)
-            
-            try:
-                await binance_stream()
-            except asyncio.CancelledError:
-                pass
-            
-            # Verify client received message
-            mock_client.send_text.assert_called()
-        
-        # Restore original clients list
-        real_time_price.clients.clear()
-        real_time_price.clients.extend(original_clients)
-
-    @pytest.mark.asyncio
-    async def test_binance_stream_removes_failed_client(self, mock_crypto_pairs, mock_websocket_message):
-        """Test that clients are removed when send fails."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
         
-        mock_client = MagicMock()
-        mock_client.send_text = AsyncMock(side_effect=Exception("Connection lost"))
+        client_queue = asyncio.Queue()
         
+        # Temporarily register a client queue in the module-level clients set
         from services import real_time_price
         original_clients = real_time_price.clients.copy()
         real_time_price.clients.clear()
-        real_time_price.clients.append(mock_client)
+        real_time_price.clients.add(client_queue)
         
         mock_websocket = MagicMock()
         mock_websocket.recv = AsyncMock(side_effect=[
@@ -214,7 +278,7 @@ class TestBinanceStream:
             asyncio.CancelledError
         ])
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query), \
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection), \
              patch("services.real_time_price.websockets.connect") as mock_connect, \
              patch("services.real_time_price.build_stream_url", new_callable=AsyncMock) as mock_build_url, \
              patch("services.real_time_price.asyncio.sleep", new_callable=AsyncMock):
@@ -228,19 +292,21 @@ class TestBinanceStream:
             except asyncio.CancelledError:
                 pass
             
-            # Client should be removed after error
-            assert mock_client not in real_time_price.clients
+            # Verify the client's queue received the payload
+            text, raw = client_queue.get_nowait()
+            assert json.loads(text) == mock_websocket_message["data"]
+            assert raw == text.encode()
         
+        # Restore original clients set
         real_time_price.clients.clear()
-        real_time_price.clients.extend(original_clients)
+        real_time_price.clients.update(original_clients)
 
     @pytest.mark.asyncio
     async def test_binance_stream_retries_on_no_symbols(self):
         """Test that stream retries when no symbols are found."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=[])
+        pairs_collection = _pairs_collection([])
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query), \
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection), \
              patch("services.real_time_price.build_stream_url", new_callable=AsyncMock) as mock_build_url, \
              patch("services.real_time_price.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
             
@@ -257,10 +323,9 @@ class TestBinanceStream:
     @pytest.mark.asyncio
     async def test_binance_stream_reconnects_on_error(self, mock_crypto_pairs):
         """Test that stream reconnects after connection error."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query), \
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection), \
              patch("services.real_time_price.websockets.connect") as mock_connect, \
              patch("services.real_time_price.build_stream_url", new_callable=AsyncMock) as mock_build_url, \
              patch("services.real_time_price.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
@@ -282,16 +347,14 @@ class TestBinanceStream:
     @pytest.mark.asyncio
     async def test_binance_stream_handles_message_without_data(self, mock_crypto_pairs):
         """Test that stream ignores messages without 'data' field."""
-        mock_query = MagicMock()
-        mock_query.to_list = AsyncMock(return_value=mock_crypto_pairs)
+        pairs_collection = _pairs_collection(mock_crypto_pairs)
         
-        mock_client = MagicMock()
-        mock_client.send_text = AsyncMock()
+        client_queue = asyncio.Queue()
         
         from services import real_time_price
         original_clients = real_time_price.clients.copy()
         real_time_price.clients.clear()
-        real_time_price.clients.append(mock_client)
+        real_time_price.clients.add(client_queue)
         
         message_without_data = {"stream": "btcusdt@ticker"}
         
@@ -301,7 +364,7 @@ class TestBinanceStream:
             asyncio.CancelledError
         ])
         
-        with patch("services.real_time_price.CryptoPair.find_all", return_value=mock_query), \
+        with patch("services.real_time_price.CryptoPair.get_motor_collection", return_value=pairs_collection), \
              patch("services.real_time_price.websockets.connect") as mock_connect, \
              patch("services.real_time_price.build_stream_url", new_callable=AsyncMock) as mock_build_url, \
              patch("services.real_time_price.asyncio.sleep", new_callable=AsyncMock):
@@ -316,7 +379,7 @@ class TestBinanceStream:
                 pass
             
             # Client should not receive message
-            mock_client.send_text.assert_not_called()
+            assert client_queue.empty()
         
         real_time_price.clients.clear()
-        real_time_price.clients.extend(original_clients)
+        real_time_price.clients.update(original_clients)
@@ -78,3 +78,11 @@ class TestRedisClient:
         
         assert hasattr(module, "redis_client")
         assert module.redis_client is not None
+
+    def test_redis_client_is_async(self):
+        """The shared client is redis.asyncio; no second (sync) pool is opened."""
+        import redis.asyncio as aioredis
+        from services import redis_client as module
+
+        assert isinstance(module.redis_client, aioredis.Redis)
+        assert not hasattr(module, "sync_redis_client")
@@ -3,6 +3,7 @@ Unit tests for services/session_store.py
 Tests session management functions with mocked Redis and database dependencies.
 """
 import pytest
+import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timedelta, timezone
@@ -28,8 +29,8 @@ MOCK_EXPIRY_MINUTES = 60
 def mock_redis_client():
     """Create a mock Redis client."""
     redis_mock = MagicMock()
-    redis_mock.setex = MagicMock()
-    redis_mock.get = MagicMock()
+    redis_mock.setex = AsyncMock()
+    redis_mock.get = AsyncMock()
     return redis_mock
 
 
@@ -258,8 +259,25 @@ class TestGetSession:
             mock_cache_class.key = MagicMock()
             
             await get_session(MOCK_USER_ID)
+            await asyncio.sleep(0)  # let the background refill run
             
-            mock_redis_client.setex.assert_called_once()
+            mock_redis_client.setex.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_get_session_returns_cached_value_when_refill_fails(self, mock_redis_client, mock_cache_doc):
+        """A failed Redis refill does not fail the session lookup."""
+        with patch("services.session_store.redis_client", mock_redis_client), \
+             patch("services.session_store.Cache") as mock_cache_class:
+
+            mock_redis_client.get.return_value = None
+            mock_redis_client.setex.side_effect = ConnectionError("redis down")
+            mock_cache_class.find_one = AsyncMock(return_value=mock_cache_doc)
+            mock_cache_class.key = MagicMock()
+
+            result = await get_session(MOCK_USER_ID)
+            await asyncio.sleep(0)
+
+            assert result == MOCK_SESSION_DATA
 
     @pytest.mark.asyncio
     async def test_get_session_returns_none_when_not_found(self, mock_redis_client):
@@ -331,6 +349,7 @@ class TestGetSession:
             mock_cache_class.find_one = AsyncMock(return_value=mock_cache_doc)
             
             await get_session(MOCK_USER_ID)
+            await asyncio.sleep(0)
             
             # TTL should be approximately 30 minutes (1800 seconds)
             call_args = mock_redis_client.setex.call_args[0]
@@ -29,6 +29,7 @@ logger = logging.getLogger(__name__)
 
 # Trading fee constant
 TRADING_FEE_RATE = Decimal("0.001")
+_EIGHT_DP = Decimal("0.00000001")
 
 
 _worker_loop = None
@@ -285,7 +286,7 @@ async def handle_filled_order(current_user, order_doc, symbol, side, quantity, f
         qty = quantity
 
     total = qty * fill_price
-    trading_fee = (total * TRADING_FEE_RATE).quantize(Decimal("0.00000001"))
+    trading_fee = (total * TRADING_FEE_RATE).quantize(_EIGHT_DP)
     total_with_fee = total + trading_fee if side == "BUY" else total - trading_fee
 
     # ✅ Record Transaction